@@ -33,6 +33,17 @@ def create_app(config_name='default'):
     # 初始化扩展
     db.init_app(app)
     
+    # 响应钩子按注册的相反顺序执行，压缩最先注册以便最后执行
+    from app.utils.compression import compressor
+    compressor.init_app(app)
+    
+    # 准入控制最先执行，被拒绝的请求不再经过其他钩子
+    from app.utils.admission import admission
+    admission.init_app(app)
+    
+    from app.utils.profiler import sql_profiler
+    sql_profiler.init_app(app)
+    
     # 配置CORS
     CORS(app, resources={
         r"/api/*": {
@@ -43,14 +54,56 @@ def create_app(config_name='default'):
     })
     
     # 注册蓝图
-    from app.routes import health, categories, prompts, backup, config as config_routes
+    from app.routes import health, categories, prompts, tags, changes, backup, libraries, config as config_routes
     
     app.register_blueprint(health.bp)
     app.register_blueprint(categories.bp)
     app.register_blueprint(prompts.bp)
+    app.register_blueprint(tags.bp)
+    app.register_blueprint(changes.bp)
     app.register_blueprint(backup.bp)
+    app.register_blueprint(libraries.bp)
     app.register_blueprint(config_routes.bp)
     
+    # 创建缺失的表并检查派生索引
+    with app.app_context():
+        from app.utils.migrate import prepare_database
+        from app.utils.tags import ensure_prompt_tags
+        from app.utils.duplicates import ensure_signatures
+        prepare_database()
+        ensure_prompt_tags()
+        ensure_signatures()
+    
+    # 内存索引
+    from app.utils.suggest import suggest_index
+    from app.utils.changes import change_feed
+    from app.utils.fragment_cache import fragment_cache
+    from app.utils.sampler import prompt_sampler
+    suggest_index.init_app(app)
+    change_feed.init_app(app)
+    fragment_cache.init_app(app)
+    prompt_sampler.init_app(app)
+    
+    # 单写线程需在订阅者注册后启动，清理线程依赖它
+    from app.utils.write_queue import write_queue
+    write_queue.init_app(app)
+    
+    # 快照存储与后台任务
+    from app.utils.background import task_lock
+    from app.utils.snapshot_store import snapshot_store
+    from app.utils.auto_backup import backup_scheduler
+    from app.utils.bulk_delete import purge_worker
+    from app.utils.maintenance import maintenance
+    from app.utils.libraries import libraries as library_registry
+    from app.utils.export_cache import export_cache
+    task_lock.init_app(app)
+    snapshot_store.init_app(app)
+    backup_scheduler.init_app(app)
+    purge_worker.init_app(app)
+    maintenance.init_app(app)
+    library_registry.init_app(app)
+    export_cache.init_app(app)
+    
     # 注册静态文件路由
     @app.route('/')
     def index():
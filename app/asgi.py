@@ -0,0 +1,394 @@
+"""
+ASGI入口（可选）
+请求在事件循环中接收和发送：请求体先异步读完（较大时暂存到临时文件），变更订阅的长轮询在事件循环中等待，
+Flask应用和流式响应的每一块都在有界线程池中执行。等待中的长轮询、慢速上传和下载的客户端不占用线程。
+NDJSON导入是例外：请求体边接收边交给Flask，每批的确认行在上传过程中就能发出。
+
+启动: python run.py --asgi（需要安装 uvicorn，见 requirements-asgi.txt），或 uvicorn --factory app.asgi:create_asgi_app
+"""
+import sys
+import asyncio
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.wsgi import FileWrapper
+from app import create_app
+from app.config import Config
+from app.utils.changes import change_feed
+from app.utils.response import error_response
+
+CHANGES_PATH = '/api/v1/changes'
+STREAM_IMPORT_PATH = '/api/v1/prompts/stream'
+# 发送文件时每次从线程池读取的块大小
+FILE_BLOCK_SIZE = 64 * 1024
+# 流式请求体在内存中缓冲的上限，应用读取跟不上时暂停接收，由TCP流量控制让客户端放慢
+STREAM_BUFFER_BYTES = 1024 * 1024
+
+_END = object()
+
+
+class _Disconnected(Exception):
+    """客户端已断开"""
+
+
+class _TooLarge(Exception):
+    """请求体超过上限"""
+
+
+class _FileWrapper(FileWrapper):
+    """wsgi.file_wrapper：按较大的块读取文件，减少线程池往返"""
+
+    def __init__(self, file, buffer_size=8192):
+        super().__init__(file, max(buffer_size, FILE_BLOCK_SIZE))
+
+
+class _StreamingInput:
+    """
+    流式请求体的 wsgi.input：事件循环把收到的数据块放入队列，Flask线程读取时等待下一块
+
+    缓冲超过 STREAM_BUFFER_BYTES 时 put 等待应用读取后再继续接收
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._chunks = deque()
+        self._buffered = 0
+        self._pending = b''
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    async def put(self, chunk):
+        """事件循环中调用：加入一块数据，缓冲已满时等待"""
+        with self._cond:
+            self._chunks.append(chunk)
+            self._buffered += len(chunk)
+            if self._buffered >= STREAM_BUFFER_BYTES:
+                self._space.clear()
+            self._cond.notify_all()
+        await self._space.wait()
+
+    def finish(self, error=None):
+        """事件循环中调用：请求体结束；error 不为None时读完已缓冲的数据后抛出"""
+        with self._cond:
+            if not self._done:
+                self._done = True
+                self._error = error
+            self._cond.notify_all()
+
+    def _take(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._chunks or self._done)
+            if not self._chunks:
+                if self._error is not None:
+                    raise self._error
+                return b''
+            chunk = self._chunks.popleft()
+            self._buffered -= len(chunk)
+            if self._buffered < STREAM_BUFFER_BYTES and not self._space.is_set():
+                self._loop.call_soon_threadsafe(self._space.set)
+            return chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            parts = [self._pending]
+            self._pending = b''
+            while True:
+                chunk = self._take()
+                if not chunk:
+                    return b''.join(parts)
+                parts.append(chunk)
+        while not self._pending:
+            self._pending = self._take()
+            if not self._pending:
+                return b''
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self, size=-1):
+        parts = []
+        while size is None or size < 0 or size > 0:
+            if not self._pending:
+                self._pending = self._take()
+                if not self._pending:
+                    break
+            end = self._pending.find(b'\n') + 1 or len(self._pending)
+            if size is not None and size >= 0:
+                end = min(end, size)
+                size -= end
+            parts.append(self._pending[:end])
+            self._pending = self._pending[end:]
+            if parts[-1].endswith(b'\n'):
+                break
+        return b''.join(parts)
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def close(self):
+        pass
+
+
+class AsgiApp:
+    """把Flask应用包装为ASGI应用"""
+
+    def __init__(self, app, threads=None):
+        self.app = app
+        self.threads = threads or Config.SERVER_THREADS
+        self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='asgi')
+        app.extensions['asgi'] = self
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await receive()
+            await send({'type': 'websocket.close'})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _body_limit(self, path):
+        # NDJSON导入不受上传大小限制，由 stream.max_body_size 控制
+        if path == STREAM_IMPORT_PATH:
+            return Config.STREAM_MAX_BODY_SIZE or None
+        return self.app.config.get('MAX_CONTENT_LENGTH') or None
+
+    def _check_declared_length(self, scope, limit):
+        for name, value in scope['headers']:
+            if name == b'content-length' and limit and int(value) > limit:
+                raise _TooLarge()
+
+    async def _read_body(self, scope, receive):
+        """异步读完请求体，超过 ASGI_SPOOL_BYTES 的部分写入临时文件"""
+        limit = self._body_limit(scope['path'])
+        self._check_declared_length(scope, limit)
+
+        body = tempfile.SpooledTemporaryFile(max_size=Config.ASGI_SPOOL_BYTES)
+        size = 0
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise _Disconnected()
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if limit and size > limit:
+                    raise _TooLarge()
+                body.write(chunk)
+                if not message.get('more_body', False):
+                    break
+        except BaseException:
+            body.close()
+            raise
+        body.seek(0)
+        return body, size
+
+    @staticmethod
+    async def _pump(receive, body):
+        """把请求体逐块交给流式的 wsgi.input（大小上限由Flask按 max_content_length 检查）"""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.finish(ClientDisconnected())
+                return
+            chunk = message.get('body', b'')
+            if chunk:
+                await body.put(chunk)
+            if not message.get('more_body', False):
+                body.finish()
+                return
+
+    @staticmethod
+    def _environ(scope, body, size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': _FileWrapper,
+        }
+        if size is None:
+            # 流式请求体由 wsgi.input 在结束处返回空，分块传输时也能读到结尾
+            environ['wsgi.input_terminated'] = True
+        else:
+            environ['CONTENT_LENGTH'] = str(size)
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'TRANSFER_ENCODING' or (name == 'CONTENT_LENGTH' and size is not None):
+                # 请求体已读完，长度以实际读到的为准
+                continue
+            key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    def _error_app(self, message, code):
+        """按统一错误格式响应的WSGI应用（请求未交给Flask处理时使用）"""
+        def app(environ, start_response):
+            with self.app.request_context(environ):
+                response, status = error_response(message, code)
+            response.status_code = status
+            return response(environ, start_response)
+        return app
+
+    async def _wait_changes(self, environ, receive):
+        """
+        变更订阅的长轮询在事件循环中等待，之后交给Flask时不再阻塞
+
+        Returns:
+            客户端在等待期间断开时为False
+        """
+        args = parse_qsl(environ['QUERY_STRING'], keep_blank_values=True)
+        params = dict(args)
+        try:
+            since = max(int(params.get('since', 0)), 0)
+            timeout = min(max(float(params.get('timeout', 0)), 0), Config.CHANGE_FEED_MAX_WAIT)
+        except ValueError:
+            # 参数错误由Flask返回400
+            return True
+        if timeout <= 0 or change_feed.version > since:
+            return True
+
+        waiter = asyncio.ensure_future(change_feed.wait_async(since, timeout))
+        # 请求体已读完，再次receive只会在客户端断开时返回
+        disconnect = asyncio.ensure_future(receive())
+        done, pending = await asyncio.wait({waiter, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if waiter not in done:
+            return False
+
+        environ['QUERY_STRING'] = urlencode([(k, v) for k, v in args if k != 'timeout'] + [('timeout', '0')])
+        return True
+
+    async def _run_wsgi(self, wsgi_app, environ, send):
+        """在线程池中执行WSGI应用并逐块发送响应"""
+        loop = asyncio.get_running_loop()
+        # 同一请求的各步骤可能在不同线程中执行，共用一个上下文，流式响应中的应用上下文才能跨块保持
+        context = contextvars.copy_context()
+
+        def run(func, *args):
+            return loop.run_in_executor(self.executor, context.run, func, *args)
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+            return lambda data: None
+
+        async def send_start():
+            if not started.get('sent'):
+                started['sent'] = True
+                await send({
+                    'type': 'http.response.start',
+                    'status': started['status'],
+                    'headers': started['headers']
+                })
+
+        iterable = await run(wsgi_app, environ, start_response)
+        try:
+            iterator = iter(iterable)
+            while True:
+                chunk = await run(next, iterator, _END)
+                if chunk is _END:
+                    break
+                if chunk:
+                    await send_start()
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send_start()
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            if hasattr(iterable, 'close'):
+                await run(iterable.close)
+
+    async def _http_streaming(self, scope, receive, send):
+        """NDJSON导入：请求体边接收边交给Flask，确认行在上传过程中逐批发出"""
+        try:
+            self._check_declared_length(scope, self._body_limit(scope['path']))
+        except _TooLarge:
+            body = tempfile.SpooledTemporaryFile()
+            try:
+                await self._run_wsgi(self._error_app('上传文件过大', 413), self._environ(scope, body, 0), send)
+            finally:
+                body.close()
+            return
+
+        body = _StreamingInput(asyncio.get_running_loop())
+        pump = asyncio.ensure_future(self._pump(receive, body))
+        try:
+            await self._run_wsgi(self.app, self._environ(scope, body, None), send)
+        finally:
+            pump.cancel()
+            # 响应提前结束（例如发送失败）时让仍在读取的线程退出
+            body.finish(ClientDisconnected())
+
+    async def _http(self, scope, receive, send):
+        if scope['method'] == 'POST' and scope['path'] == STREAM_IMPORT_PATH:
+            await self._http_streaming(scope, receive, send)
+            return
+
+        wsgi_app = self.app
+        try:
+            body, size = await self._read_body(scope, receive)
+        except _Disconnected:
+            return
+        except _TooLarge:
+            body, size = tempfile.SpooledTemporaryFile(), 0
+            wsgi_app = self._error_app('上传文件过大', 413)
+
+        try:
+            environ = self._environ(scope, body, size)
+            if wsgi_app is self.app and scope['method'] == 'GET' and scope['path'] == CHANGES_PATH:
+                if not await self._wait_changes(environ, receive):
+                    return
+            await self._run_wsgi(wsgi_app, environ, send)
+        finally:
+            body.close()
+
+
+def create_asgi_app(config_name='production', threads=None):
+    """
+    创建ASGI应用
+
+    Args:
+        config_name: 配置名称
+        threads: 执行Flask应用和数据库操作的线程数，默认为 server.threads
+    """
+    return AsgiApp(create_app(config_name), threads)
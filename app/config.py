@@ -39,6 +39,7 @@ class Config:
     
     SERVER_HOST = _config['server']['host']
     SERVER_PORT = _config['server']['port']
+    SERVER_THREADS = _config['server'].get('threads', 8)
     DEBUG = _config['server']['debug']
     
     LOG_LEVEL = _config['logging']['level']
@@ -54,6 +55,72 @@ class Config:
     BACKUP_RETENTION_DAYS = _config['backup']['retention_days']
     AUTO_BACKUP = _config['backup']['auto_backup']
     BACKUP_HISTORY_LIMIT = _config['backup'].get('history_limit', 50)
+    BACKUP_INTERVAL_HOURS = _config['backup'].get('interval_hours', 24)
+    BACKUP_MAX_COUNT = _config['backup'].get('max_count', 10)
+    BACKUP_STEP_PAGES = _config['backup'].get('step_pages', 100)
+    BACKUP_STEP_PAUSE = _config['backup'].get('step_pause', 0.05)
+    BACKUP_SNAPSHOT_DIR = _resolve_path(_config['backup'].get('snapshot_dir', './temp/snapshots'))
+    BACKUP_SNAPSHOT_CHUNK_PAGES = _config['backup'].get('snapshot_chunk_pages', 16)
+    BACKUP_PREVIEW_CHUNK_ROWS = _config['backup'].get('preview_chunk_rows', 100000)
+    
+    CHANGE_LOG_RETENTION = _config.get('changes', {}).get('retention', 100000)
+    CHANGE_FEED_MAX_WAIT = _config.get('changes', {}).get('max_wait', 30)
+    
+    DELETE_CHUNK_SIZE = _config.get('delete', {}).get('chunk_size', 500)
+    DELETE_PURGE_INTERVAL = _config.get('delete', {}).get('purge_interval', 60)
+    
+    MAINTENANCE_ENABLED = _config.get('maintenance', {}).get('enabled', True)
+    MAINTENANCE_INTERVAL_MINUTES = _config.get('maintenance', {}).get('interval_minutes', 60)
+    MAINTENANCE_IDLE_SECONDS = _config.get('maintenance', {}).get('idle_seconds', 30)
+    MAINTENANCE_TIME_BUDGET = _config.get('maintenance', {}).get('time_budget', 5)
+    MAINTENANCE_VACUUM_STEP_PAGES = _config.get('maintenance', {}).get('vacuum_step_pages', 256)
+    
+    COMPRESSION_ENABLED = _config.get('compression', {}).get('enabled', True)
+    COMPRESSION_MIN_SIZE = _config.get('compression', {}).get('min_size', 1024)
+    COMPRESSION_LEVEL = _config.get('compression', {}).get('level', 6)
+    
+    STREAM_BATCH_SIZE = _config.get('stream', {}).get('batch_size', 500)
+    STREAM_MAX_BODY_SIZE = _config.get('stream', {}).get('max_body_size', 0)
+    STREAM_MAX_LINE_SIZE = _config.get('stream', {}).get('max_line_size', 1048576)
+    
+    ADMISSION_ENABLED = _config.get('admission', {}).get('enabled', True)
+    ADMISSION_CLASSES = _config.get('admission', {}).get('classes', {})
+    
+    WRITE_QUEUE_ENABLED = _config.get('write_queue', {}).get('enabled', True)
+    WRITE_QUEUE_SIZE = _config.get('write_queue', {}).get('queue_size', 1024)
+    WRITE_QUEUE_MAX_BATCH = _config.get('write_queue', {}).get('max_batch', 64)
+    WRITE_QUEUE_MAX_DELAY_MS = _config.get('write_queue', {}).get('max_delay_ms', 2)
+    
+    LIBRARY_DIR = _resolve_path(_config.get('libraries', {}).get('dir', './database/libraries'))
+    LIBRARY_MAX_OPEN = _config.get('libraries', {}).get('max_open', 16)
+    LIBRARY_IDLE_SECONDS = _config.get('libraries', {}).get('idle_seconds', 300)
+    
+    # 导出文件缓存，任一上限为0时不缓存（每次导出重新生成）
+    EXPORT_CACHE_DIR = _resolve_path(_config.get('export_cache', {}).get('dir', './temp/exports'))
+    EXPORT_CACHE_MAX_BYTES = _config.get('export_cache', {}).get('max_bytes', 268435456)
+    EXPORT_CACHE_MAX_FILES = _config.get('export_cache', {}).get('max_files', 32)
+    
+    # 近似重复检测：创建词条时是否检查相似词条，以及检查使用的相似度阈值
+    DUPLICATE_CHECK_ON_CREATE = _config.get('duplicates', {}).get('check_on_create', False)
+    DUPLICATE_CREATE_THRESHOLD = _config.get('duplicates', {}).get('create_threshold', 0.9)
+    
+    # ASGI模式（run.py --asgi）：请求体超过该大小时暂存到临时文件
+    ASGI_SPOOL_BYTES = _config.get('asgi', {}).get('spool_bytes', 1048576)
+    
+    # 监督模式（run.py --supervise），上限为0时不按该条件替换工作进程
+    SUPERVISOR_MAX_REQUESTS = _config.get('supervisor', {}).get('max_requests', 100000)
+    SUPERVISOR_MAX_RSS_MB = _config.get('supervisor', {}).get('max_rss_mb', 512)
+    SUPERVISOR_CHECK_INTERVAL = _config.get('supervisor', {}).get('check_interval', 5)
+    SUPERVISOR_DRAIN_TIMEOUT = _config.get('supervisor', {}).get('drain_timeout', 30)
+    
+    # 词条JSON片段缓存，任一上限为0时不缓存
+    FRAGMENT_CACHE_MAX_ENTRIES = _config.get('fragment_cache', {}).get('max_entries', 20000)
+    FRAGMENT_CACHE_MAX_BYTES = _config.get('fragment_cache', {}).get('max_bytes', 33554432)
+    
+    PROFILING_ENABLED = _config.get('profiling', {}).get('enabled', False)
+    PROFILING_SLOW_QUERY_MS = _config.get('profiling', {}).get('slow_query_ms', 100)
+    PROFILING_N_PLUS_ONE_THRESHOLD = _config.get('profiling', {}).get('n_plus_one_threshold', 5)
+    PROFILING_HISTORY = _config.get('profiling', {}).get('history', 50)
     
     @staticmethod
     def init_app(app):
@@ -3,6 +3,10 @@
 """
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.hybrid import hybrid_property, Comparator
+from sqlalchemy.orm import Session, with_loader_criteria
 
 db = SQLAlchemy()
 
@@ -11,17 +15,98 @@ def _utcnow():
     return datetime.now(timezone.utc)
 
 
+class Category(db.Model):
+    """分类模型，词条通过整数外键引用"""
+    __tablename__ = 'categories'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
+    
+    @classmethod
+    def resolve(cls, name):
+        """按名称获取分类，不存在时创建（在当前事务中）"""
+        # 批量写入时同一分类会被反复解析，按会话缓存；回滚或删除后对象离开会话，缓存随之失效
+        cache = db.session.info.setdefault('category_cache', {})
+        category = cache.get(name)
+        if category is not None and category in db.session and category.name == name:
+            return category
+        
+        # 通常在给尚未完整赋值的词条设置分类时调用，不能触发自动flush
+        with db.session.no_autoflush:
+            category = cls.query.filter_by(name=name).first()
+            if category is None:
+                db.session.execute(
+                    sqlite_insert(cls).values(name=name, created_at=_utcnow())
+                    .on_conflict_do_nothing(index_elements=['name'])
+                )
+                category = cls.query.filter_by(name=name).one()
+        cache[name] = category
+        return category
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'created_at': self.created_at.isoformat() + 'Z' if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<Category {self.id}: {self.name}>'
+
+
+class CategoryNameComparator(Comparator):
+    """按分类名称比较时改为比较整数外键，走 category_id 索引"""
+    
+    def __init__(self, prompt_cls):
+        self.prompt_cls = prompt_cls
+        super().__init__(
+            select(Category.name).where(Category.id == prompt_cls.category_id).scalar_subquery()
+        )
+    
+    def __eq__(self, other):
+        return self.prompt_cls.category_id == \
+            select(Category.id).where(Category.name == other).scalar_subquery()
+    
+    def __ne__(self, other):
+        return self.prompt_cls.category_id != \
+            select(Category.id).where(Category.name == other).scalar_subquery()
+    
+    def in_(self, other):
+        return self.prompt_cls.category_id.in_(
+            select(Category.id).where(Category.name.in_(other))
+        )
+
+
 class Prompt(db.Model):
     """词条模型"""
     __tablename__ = 'prompts'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    category = db.Column(db.String(50), nullable=False, index=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
+    category_ref = db.relationship(Category, lazy='joined')
     name = db.Column(db.String(100), nullable=False, index=True)
     translation = db.Column(db.Text, nullable=False)
     comment = db.Column(db.Text, default='')
     created_at = db.Column(db.DateTime, default=_utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=_utcnow, onupdate=_utcnow, nullable=False)
+    # 软删除标记，非空的记录对查询不可见，由后台任务清理
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    @hybrid_property
+    def category(self):
+        """分类名称"""
+        return self.category_ref.name if self.category_ref is not None else None
+    
+    @category.inplace.setter
+    def _category_setter(self, name):
+        self.category_ref = Category.resolve(name)
+    
+    @category.inplace.comparator
+    @classmethod
+    def _category_comparator(cls):
+        return CategoryNameComparator(cls)
     
     def to_dict(self):
         """转换为字典"""
@@ -39,6 +124,76 @@ class Prompt(db.Model):
         return f'<Prompt {self.id}: {self.name}>'
 
 
+@event.listens_for(Session, 'do_orm_execute')
+def _hide_soft_deleted(execute_state):
+    """ORM查询默认排除已软删除的词条，传入 execution_options(include_deleted=True) 可包含"""
+    if execute_state.is_select and not execute_state.execution_options.get('include_deleted', False):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(Prompt, Prompt.deleted_at.is_(None), include_aliases=True)
+        )
+
+
+class PromptTag(db.Model):
+    """词条标签倒排索引"""
+    __tablename__ = 'prompt_tags'
+    __table_args__ = (
+        db.Index('ix_prompt_tags_tag', 'tag', 'prompt_id'),
+    )
+    
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompts.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(200), primary_key=True)
+    
+    def __repr__(self):
+        return f'<PromptTag {self.prompt_id}: {self.tag}>'
+
+
+class PromptSignature(db.Model):
+    """词条标签集合的MinHash分段签名（近似重复检测的LSH桶）"""
+    __tablename__ = 'prompt_signatures'
+    __table_args__ = (
+        db.Index('ix_prompt_signatures_bucket', 'band', 'bucket', 'prompt_id'),
+    )
+    
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompts.id', ondelete='CASCADE'), primary_key=True)
+    band = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<PromptSignature {self.prompt_id}: {self.band}>'
+
+
+class ChangeLog(db.Model):
+    """词条变更日志"""
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    operation = db.Column(db.String(10), nullable=False)  # insert, update, delete, reset, category
+    prompt_id = db.Column(db.Integer, nullable=True)
+    timestamp = db.Column(db.DateTime, default=_utcnow, nullable=False)
+    # category 记录：原分类 previous_category 下的全部词条现在属于分类 category（id为 category_id）
+    category_id = db.Column(db.Integer, nullable=True)
+    category = db.Column(db.String(50), nullable=True)
+    previous_category = db.Column(db.String(50), nullable=True)
+    
+    def to_dict(self):
+        """转换为字典"""
+        data = {
+            'version': self.version,
+            'operation': self.operation,
+            'prompt_id': self.prompt_id,
+            'timestamp': self.timestamp.isoformat() + 'Z' if self.timestamp else None
+        }
+        if self.operation == 'category':
+            data['category_id'] = self.category_id
+            data['category'] = self.category
+            data['previous_category'] = self.previous_category
+        return data
+    
+    def __repr__(self):
+        return f'<ChangeLog {self.version}: {self.operation} {self.prompt_id}>'
+
+
 class BackupHistory(db.Model):
     """备份历史记录模型"""
     __tablename__ = 'backup_history'
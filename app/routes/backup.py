@@ -4,12 +4,20 @@
 import os
 import csv
 import shutil
-from datetime import datetime
 from flask import Blueprint, request, send_file, after_this_request
 from werkzeug.utils import secure_filename
-from app.models import db, Prompt, BackupHistory
+from app.models import db, Prompt, PromptTag, PromptSignature, BackupHistory
 from app.utils.response import success_response, error_response
 from app.utils.validators import allowed_file
+from app.utils.snapshot_store import snapshot_store, restore_snapshot, online_backup, SnapshotError
+from app.utils.tags import sync_prompt_tags, rebuild_prompt_tags
+from app.utils.migrate import prepare_database
+from app.utils.changes import record_changes, record_reset, latest_version, OP_INSERT, OP_UPDATE
+from app.utils.signals import notify_prompts_changed
+from app.utils.columnar import FORMATS, encode_history
+from app.utils.restore_preview import preview_csv
+from app.utils.export_cache import export_cache
+from app.utils.write_queue import write_queue, WriteQueueFull
 from app.config import Config
 
 bp = Blueprint('backup', __name__, url_prefix='/api/v1/backup')
@@ -28,6 +36,22 @@ def _create_cleanup_callback(filepath):
     return cleanup
 
 
+def _after_database_replaced(previous_version, operation, filename):
+    """
+    整库替换后补齐缺失的表、重建派生索引，记录整体替换和恢复历史（调用方随后发送变更通知）
+
+    Returns:
+        恢复后的词条数
+    """
+    prepare_database()
+    rebuild_prompt_tags()
+    record_reset(previous_version)
+    restored_count = Prompt.query.count()
+    db.session.add(BackupHistory(operation=operation, filename=filename, imported_count=restored_count))
+    db.session.commit()
+    return restored_count
+
+
 def _validate_upload_file(allowed_extensions):
     """验证上传文件，返回 (file, filepath, filename) 或错误响应"""
     if 'file' not in request.files:
@@ -51,98 +75,107 @@ def _validate_upload_file(allowed_extensions):
 
 @bp.route('/export/csv', methods=['GET'])
 def export_csv():
-    """导出CSV格式备份"""
+    """导出CSV格式备份（数据未变化时发送缓存的文件）"""
     category = request.args.get('category', '')
     
-    query = Prompt.query
-    if category:
-        query = query.filter_by(category=category)
-    
-    prompts = query.all()
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'naibot_prompts_{timestamp}.csv'
-    filepath = os.path.join(Config.BACKUP_TEMP_DIR, filename)
-    
-    os.makedirs(Config.BACKUP_TEMP_DIR, exist_ok=True)
-    
-    with open(filepath, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['分类', '名称', '译文', '注释', '创建时间'])
+    def build(filepath):
+        query = Prompt.query
+        if category:
+            query = query.filter_by(category=category)
         
-        for prompt in prompts:
-            writer.writerow([
-                prompt.category,
-                prompt.name,
-                prompt.translation,
-                prompt.comment or '',
-                prompt.created_at.isoformat() if prompt.created_at else ''
-            ])
-    
-    _create_cleanup_callback(filepath)
+        with open(filepath, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['分类', '名称', '译文', '注释', '创建时间'])
+            
+            for prompt in query.yield_per(Config.STREAM_BATCH_SIZE):
+                writer.writerow([
+                    prompt.category,
+                    prompt.name,
+                    prompt.translation,
+                    prompt.comment or '',
+                    prompt.created_at.isoformat() if prompt.created_at else ''
+                ])
     
-    return send_file(
-        os.path.abspath(filepath),
-        as_attachment=True,
-        download_name=filename,
-        mimetype='text/csv'
-    )
+    artifact, _ = export_cache.get('csv', category, build)
+    return _send_artifact(artifact, 'naibot_prompts', 'text/csv')
 
 
 @bp.route('/export/db', methods=['GET'])
 def export_db():
-    """导出SQLite数据库备份"""
+    """导出SQLite数据库备份（数据未变化时发送缓存的文件）"""
     db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
     
     if not os.path.exists(db_path):
         return error_response('数据库文件不存在', 404)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'naibot_database_{timestamp}.db'
-    filepath = os.path.join(Config.BACKUP_TEMP_DIR, filename)
-    
-    os.makedirs(Config.BACKUP_TEMP_DIR, exist_ok=True)
-    shutil.copy2(db_path, filepath)
+    def build(filepath):
+        # 在线备份得到一致的镜像（从节点以此初始化，不能复制到写了一半的文件）
+        online_backup(db_path, filepath, step_pages=Config.BACKUP_STEP_PAGES)
     
-    _create_cleanup_callback(filepath)
+    artifact, _ = export_cache.get('db', '', build)
+    return _send_artifact(artifact, 'naibot_database', 'application/octet-stream')
+
+
+def _send_artifact(artifact, prefix, mimetype):
+    """发送导出文件：支持 Range 断点续传和 If-None-Match；未缓存的文件发送后删除"""
+    if artifact.etag is None:
+        _create_cleanup_callback(artifact.path)
     
+    timestamp = artifact.created_at.strftime('%Y%m%d_%H%M%S')
     return send_file(
-        os.path.abspath(filepath),
+        os.path.abspath(artifact.path),
         as_attachment=True,
-        download_name=filename,
-        mimetype='application/octet-stream'
+        download_name=f'{prefix}_{timestamp}.{artifact.key[0]}',
+        mimetype=mimetype,
+        conditional=True,
+        etag=artifact.etag or False,
+        max_age=0
     )
 
 
-def _restore_csv(filepath, filename, replace_mode=False):
-    """CSV恢复核心逻辑"""
-    try:
-        imported_count = 0
-        updated_count = 0
-        skipped_count = 0
-        errors = []
-        backup_filename = None
-        
-        if replace_mode:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'naibot_backup_{timestamp}.db'
-            db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
-            backup_path = os.path.join(Config.BACKUP_TEMP_DIR, backup_filename)
-            shutil.copy2(db_path, backup_path)
-            Prompt.query.delete()
-        
-        with open(filepath, 'r', encoding='utf-8-sig') as csvfile:
-            reader = csv.DictReader(csvfile)
-            rows = list(reader)
-        
-        if not replace_mode:
-            existing_prompts = {}
-            for p in Prompt.query.all():
-                existing_prompts[(p.category, p.name)] = p
-        
-        for row in rows:
-            try:
-                if replace_mode:
+def _apply_csv_rows(rows, filename, replace_mode=False):
+    """写线程中执行：把CSV行写入数据库并记录恢复历史"""
+    imported_count = 0
+    updated_count = 0
+    skipped_count = 0
+    errors = []
+    
+    if replace_mode:
+        PromptTag.query.delete()
+        PromptSignature.query.delete()
+        Prompt.query.delete()
+        record_reset()
+    
+    if not replace_mode:
+        existing_prompts = {}
+        for p in Prompt.query.all():
+            existing_prompts[(p.category, p.name)] = p
+    
+    touched_prompts = []
+    updated_prompts = []
+    for row in rows:
+        try:
+            if replace_mode:
+                prompt = Prompt(
+                    category=row['分类'],
+                    name=row['名称'],
+                    translation=row['译文'],
+                    comment=row.get('注释', '')
+                )
+                db.session.add(prompt)
+                touched_prompts.append(prompt)
+                imported_count += 1
+            else:
+                key = (row['分类'], row['名称'])
+                existing = existing_prompts.get(key)
+                
+                if existing:
+                    existing.translation = row['译文']
+                    existing.comment = row.get('注释', '')
+                    touched_prompts.append(existing)
+                    updated_prompts.append(existing)
+                    updated_count += 1
+                else:
                     prompt = Prompt(
                         category=row['分类'],
                         name=row['名称'],
@@ -150,44 +183,48 @@ def _restore_csv(filepath, filename, replace_mode=False):
                         comment=row.get('注释', '')
                     )
                     db.session.add(prompt)
+                    touched_prompts.append(prompt)
                     imported_count += 1
-                else:
-                    key = (row['分类'], row['名称'])
-                    existing = existing_prompts.get(key)
-                    
-                    if existing:
-                        existing.translation = row['译文']
-                        existing.comment = row.get('注释', '')
-                        updated_count += 1
-                    else:
-                        prompt = Prompt(
-                            category=row['分类'],
-                            name=row['名称'],
-                            translation=row['译文'],
-                            comment=row.get('注释', '')
-                        )
-                        db.session.add(prompt)
-                        imported_count += 1
-            except Exception as e:
-                skipped_count += 1
-                errors.append(f"行错误: {str(e)}")
+        except Exception as e:
+            skipped_count += 1
+            errors.append(f"行错误: {str(e)}")
+    
+    db.session.flush()
+    sync_prompt_tags(touched_prompts)
+    if not replace_mode:
+        updated_ids = {p.id for p in updated_prompts}
+        record_changes(OP_INSERT, [p.id for p in touched_prompts if p.id not in updated_ids])
+        record_changes(OP_UPDATE, sorted(updated_ids))
+    
+    db.session.add(BackupHistory(
+        operation='csv_replace' if replace_mode else 'csv_increment',
+        filename=filename,
+        imported_count=imported_count
+    ))
+    
+    return {
+        'imported_count': imported_count,
+        'updated_count': updated_count,
+        'skipped_count': skipped_count,
+        'errors': errors[:10]
+    }
+
+
+def _restore_csv(filepath, filename, replace_mode=False):
+    """CSV恢复核心逻辑：读取文件后经写队列在一个事务中写入"""
+    try:
+        backup_filename = None
         
-        db.session.commit()
+        if replace_mode:
+            backup_filename = snapshot_store.create(label='csv_replace')['id']
         
-        history = BackupHistory(
-            operation='csv_replace' if replace_mode else 'csv_increment',
-            filename=filename,
-            imported_count=imported_count
-        )
-        db.session.add(history)
-        db.session.commit()
+        with open(filepath, 'r', encoding='utf-8-sig') as csvfile:
+            reader = csv.DictReader(csvfile)
+            rows = list(reader)
         
-        data = {
-            'imported_count': imported_count,
-            'updated_count': updated_count,
-            'skipped_count': skipped_count,
-            'errors': errors[:10]
-        }
+        data = write_queue.submit(_apply_csv_rows, rows, filename, replace_mode)
+        # 恢复涉及的词条可能很多，订阅者整体重建
+        notify_prompts_changed(reset=True)
         
         if replace_mode:
             data['backup_before_restore'] = True
@@ -195,8 +232,9 @@ def _restore_csv(filepath, filename, replace_mode=False):
         
         return success_response(data, '覆盖恢复成功' if replace_mode else '增量恢复成功')
         
+    except WriteQueueFull:
+        return write_queue.busy_response()
     except Exception as e:
-        db.session.rollback()
         return error_response(f'恢复失败: {str(e)}', 500)
     finally:
         if os.path.exists(filepath):
@@ -223,6 +261,36 @@ def restore_csv_replace():
     return _restore_csv(filepath, filename, replace_mode=True)
 
 
+@bp.route('/restore/csv/preview', methods=['POST'])
+def preview_csv_restore():
+    """预览CSV恢复的差异（不写入数据库）"""
+    mode = request.form.get('mode', 'increment')
+    sample = request.form.get('sample', 10)
+    
+    if mode not in ('increment', 'replace'):
+        return error_response('mode必须是 increment 或 replace', 400)
+    
+    try:
+        sample = int(sample)
+        if not 0 <= sample <= 100:
+            raise ValueError
+    except (ValueError, TypeError):
+        return error_response('sample必须是0-100之间的整数', 400)
+    
+    _, filepath, _, err = _validate_upload_file({'csv'})
+    if err:
+        return err
+    
+    try:
+        data = preview_csv(filepath, replace_mode=(mode == 'replace'), sample_size=sample)
+        return success_response(data, '预览成功')
+    except Exception as e:
+        return error_response(f'预览失败: {str(e)}', 500)
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
 @bp.route('/restore/db', methods=['POST'])
 def restore_db():
     """从数据库恢复数据"""
@@ -233,31 +301,24 @@ def restore_db():
     mode = request.form.get('mode', 'increment')
     
     try:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'naibot_backup_{timestamp}.db'
+        backup_snapshot_id = snapshot_store.create(label=f'db_{mode}')['id']
         db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
-        backup_path = os.path.join(Config.BACKUP_TEMP_DIR, backup_filename)
-        shutil.copy2(db_path, backup_path)
-        
-        shutil.copy2(filepath, db_path)
         
-        db.session.remove()
-        db.engine.dispose()
-        
-        restored_count = Prompt.query.count()
-        
-        history = BackupHistory(
-            operation=f'db_{mode}',
-            filename=filename,
-            imported_count=restored_count
-        )
-        db.session.add(history)
-        db.session.commit()
+        # 替换数据库文件需要释放所有连接，不能在写线程中执行；期间暂停写线程
+        with write_queue.exclusive():
+            previous_version = latest_version()
+            shutil.copy2(filepath, db_path)
+            
+            db.session.remove()
+            db.engine.dispose()
+            restored_count = _after_database_replaced(previous_version, f'db_{mode}', filename)
+        notify_prompts_changed(reset=True)
         
         data = {
             'restored_count': restored_count,
             'mode': mode,
-            'backup_before_operation': True
+            'backup_before_operation': True,
+            'backup_snapshot_id': backup_snapshot_id
         }
         
         return success_response(data, '数据库恢复成功')
@@ -273,6 +334,97 @@ def restore_db():
 @bp.route('/history', methods=['GET'])
 def get_backup_history():
     """获取恢复历史记录"""
+    fmt = request.args.get('format', 'json')
+    if fmt not in FORMATS:
+        return error_response(f'format必须是 {FORMATS} 之一', 400)
+    
     history = BackupHistory.query.order_by(BackupHistory.timestamp.desc()).limit(Config.BACKUP_HISTORY_LIMIT).all()
-    data = [h.to_dict() for h in history]
+    data = encode_history(history) if fmt == 'columnar' else [h.to_dict() for h in history]
     return success_response(data, '获取成功')
+
+
+def _snapshot_summary(manifest):
+    """快照清单摘要（不含块列表）"""
+    summary = {k: v for k, v in manifest.items() if k != 'chunks'}
+    summary['chunk_count'] = len(manifest['chunks'])
+    return summary
+
+
+@bp.route('/snapshots', methods=['GET'])
+def list_snapshots():
+    """获取快照列表及存储统计"""
+    data = {
+        'snapshots': [_snapshot_summary(m) for m in snapshot_store.list()],
+        'stats': snapshot_store.stats()
+    }
+    return success_response(data, '获取成功')
+
+
+@bp.route('/snapshots', methods=['POST'])
+def create_snapshot():
+    """立即创建快照"""
+    data = request.get_json(silent=True) or {}
+    label = str(data.get('label', 'manual'))[:100]
+    
+    try:
+        manifest = snapshot_store.create(label=label)
+        return success_response(_snapshot_summary(manifest), '快照创建成功', 201)
+    except Exception as e:
+        return error_response(f'快照创建失败: {str(e)}', 500)
+
+
+@bp.route('/snapshots/<snapshot_id>/restore', methods=['POST'])
+def restore_from_snapshot(snapshot_id):
+    """恢复到指定快照（恢复前自动对当前数据做快照）"""
+    try:
+        if snapshot_store.get(snapshot_id) is None:
+            return error_response('快照不存在', 404)
+    except SnapshotError as e:
+        return error_response(str(e), 400)
+    
+    try:
+        backup_snapshot_id = snapshot_store.create(label='snapshot_restore')['id']
+        
+        # 与数据库文件恢复相同，期间暂停写线程
+        with write_queue.exclusive():
+            previous_version = latest_version()
+            restore_snapshot(snapshot_id)
+            restored_count = _after_database_replaced(previous_version, 'snapshot_restore', snapshot_id)
+        notify_prompts_changed(reset=True)
+        
+        data = {
+            'restored_count': restored_count,
+            'snapshot_id': snapshot_id,
+            'backup_before_operation': True,
+            'backup_snapshot_id': backup_snapshot_id
+        }
+        return success_response(data, '快照恢复成功')
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'恢复失败: {str(e)}', 500)
+
+
+@bp.route('/snapshots/<snapshot_id>', methods=['DELETE'])
+def delete_snapshot(snapshot_id):
+    """删除快照并回收不再引用的数据块"""
+    try:
+        if not snapshot_store.delete(snapshot_id):
+            return error_response('快照不存在', 404)
+    except SnapshotError as e:
+        return error_response(str(e), 400)
+    
+    removed_chunks, freed_bytes = snapshot_store.gc()
+    return success_response(
+        {'removed_chunks': removed_chunks, 'freed_bytes': freed_bytes},
+        '快照删除成功'
+    )
+
+
+@bp.route('/snapshots/gc', methods=['POST'])
+def gc_snapshots():
+    """回收不再被任何快照引用的数据块"""
+    removed_chunks, freed_bytes = snapshot_store.gc()
+    return success_response(
+        {'removed_chunks': removed_chunks, 'freed_bytes': freed_bytes},
+        '回收完成'
+    )
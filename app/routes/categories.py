@@ -2,10 +2,14 @@
 分类管理API路由
 """
 from datetime import datetime, timedelta
-from flask import Blueprint
+from flask import Blueprint, request
 from sqlalchemy import func
-from app.models import db, Prompt
-from app.utils.response import success_response
+from app.models import db, Prompt, Category
+from app.utils.response import success_response, error_response
+from app.utils.changes import record_category_change
+from app.utils.categories import merge_category
+from app.utils.signals import notify_prompts_changed, notify_categories_changed
+from app.utils.write_queue import write_queue, WriteQueueFull
 
 bp = Blueprint('categories', __name__, url_prefix='/api/v1')
 
@@ -13,21 +17,25 @@ bp = Blueprint('categories', __name__, url_prefix='/api/v1')
 @bp.route('/categories', methods=['GET'])
 def get_categories():
     """获取所有分类及其词条数量"""
-    # 查询所有分类及其计数
-    categories = db.session.query(
-        Prompt.category,
+    # 按整数外键分组计数，只返回有词条的分类
+    counts = db.session.query(
+        Prompt.category_id,
         func.count(Prompt.id).label('count'),
         func.min(Prompt.created_at).label('created_at')
-    ).group_by(Prompt.category).all()
+    ).group_by(Prompt.category_id).subquery()
+    
+    categories = db.session.query(
+        Category.id, Category.name, counts.c.count, counts.c.created_at
+    ).join(counts, counts.c.category_id == Category.id).order_by(Category.name).all()
     
     data = [
         {
-            'id': idx + 1,
-            'name': cat.category,
+            'id': cat.id,
+            'name': cat.name,
             'count': cat.count,
             'created_at': cat.created_at.isoformat() + 'Z' if cat.created_at else None
         }
-        for idx, cat in enumerate(categories)
+        for cat in categories
     ]
     
     return success_response(data, '获取成功')
@@ -36,7 +44,7 @@ def get_categories():
 @bp.route('/categories/stats', methods=['GET'])
 def get_category_stats():
     """获取分类统计信息"""
-    total_categories = db.session.query(func.count(func.distinct(Prompt.category))).scalar()
+    total_categories = db.session.query(func.count(func.distinct(Prompt.category_id))).scalar()
     total_prompts = db.session.query(func.count(Prompt.id)).scalar()
     
     # 最近7天新增的词条数
@@ -52,3 +60,130 @@ def get_category_stats():
     }
     
     return success_response(data, '获取成功')
+
+
+class _CategoryError(Exception):
+    """写线程中发现的请求错误（返回400）"""
+
+
+def _merge_category(source, target):
+    """把 source 分类的词条整体移到 target 分类并删除 source，返回移动的词条数"""
+    previous_name = source.name
+    moved = merge_category(source, target)
+    # 只记录一条分类变更，增量同步的客户端按分类整体改名，不逐条拉取词条
+    record_category_change(target.id, target.name, previous_name)
+    return moved
+
+
+def _rename_category(category_id, name):
+    """
+    写线程中执行：重命名分类，新名称已存在时合并到该分类
+
+    Returns:
+        (响应数据, 是否有变化)；分类不存在时为None。合并时响应数据带有 merged_count
+    """
+    category = db.session.get(Category, category_id)
+    if category is None:
+        return None
+    
+    target = Category.query.filter(Category.name == name, Category.id != category.id).first()
+    if target is not None:
+        moved = _merge_category(category, target)
+        return {'id': target.id, 'name': target.name, 'merged_count': moved}, True
+    
+    if name == category.name:
+        return category.to_dict(), False
+    previous_name = category.name
+    category.name = name
+    record_category_change(category.id, name, previous_name)
+    db.session.flush()
+    return category.to_dict(), True
+
+
+def _delete_category(category_id, merge_into):
+    """
+    写线程中执行：删除分类，指定 merge_into 时先把词条移到该分类
+
+    Returns:
+        (响应数据, 接收词条的分类名称或None)；分类不存在时为None
+    """
+    category = db.session.get(Category, category_id)
+    if category is None:
+        return None
+    
+    if merge_into is not None:
+        target = db.session.get(Category, merge_into)
+        if target is None or target.id == category.id:
+            raise _CategoryError('merge_into 指定的分类不存在')
+        moved = _merge_category(category, target)
+        return {'id': category_id, 'merged_into': target.id, 'merged_count': moved}, target.name
+    
+    remaining = db.session.query(func.count(Prompt.id)) \
+        .filter(Prompt.category_id == category.id) \
+        .execution_options(include_deleted=True).scalar()
+    if remaining:
+        raise _CategoryError(f'分类下还有{remaining}条词条，请通过 merge_into 指定目标分类')
+    
+    db.session.delete(category)
+    return {'id': category_id}, None
+
+
+@bp.route('/categories/<int:category_id>', methods=['PUT'])
+def update_category(category_id):
+    """重命名分类；新名称已存在时合并到该分类"""
+    if db.session.get(Category, category_id) is None:
+        return error_response('分类不存在', 404)
+    
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name:
+        return error_response('分类名称不能为空', 400)
+    if len(name) > 50:
+        return error_response('分类长度不能超过50个字符', 400)
+    
+    try:
+        result = write_queue.submit(_rename_category, category_id, name)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except Exception as e:
+        return error_response(f'更新分类失败: {str(e)}', 500)
+    
+    # 提交前分类已被并发删除
+    if result is None:
+        return error_response('分类不存在', 404)
+    
+    data, changed = result
+    if changed:
+        notify_prompts_changed()
+        notify_categories_changed()
+    if 'merged_count' in data:
+        return success_response(data, f'已合并到分类"{data["name"]}"，移动{data["merged_count"]}条词条')
+    return success_response(data, '分类重命名成功')
+
+
+@bp.route('/categories/<int:category_id>', methods=['DELETE'])
+def delete_category(category_id):
+    """删除分类；分类下还有词条时需通过 merge_into 指定接收词条的分类"""
+    if db.session.get(Category, category_id) is None:
+        return error_response('分类不存在', 404)
+    
+    merge_into = request.args.get('merge_into', type=int)
+    try:
+        result = write_queue.submit(_delete_category, category_id, merge_into)
+    except _CategoryError as e:
+        return error_response(str(e), 400)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except Exception as e:
+        return error_response(f'删除分类失败: {str(e)}', 500)
+    
+    if result is None:
+        return error_response('分类不存在', 404)
+    
+    data, target_name = result
+    if target_name is None:
+        return success_response(data, '分类删除成功')
+    
+    notify_prompts_changed()
+    notify_categories_changed()
+    return success_response(data, f'分类已删除，{data["merged_count"]}条词条移动到"{target_name}"')
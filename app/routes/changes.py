@@ -0,0 +1,52 @@
+"""
+变更订阅API路由
+"""
+from flask import Blueprint, request
+from app.utils.response import success_response, error_response
+from app.utils.changes import change_feed, get_changes, oldest_version, OP_RESET
+from app.config import Config
+
+bp = Blueprint('changes', __name__, url_prefix='/api/v1')
+
+MAX_CHANGES_LIMIT = 1000
+
+
+@bp.route('/changes', methods=['GET'])
+def get_change_feed():
+    """按版本号增量拉取词条变更（支持长轮询）"""
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+        limit = int(request.args.get('limit', 100))
+        timeout = float(request.args.get('timeout', 0))
+    except (ValueError, TypeError):
+        return error_response('since、limit必须是整数，timeout必须是数字', 400)
+
+    limit = min(max(limit, 1), MAX_CHANGES_LIMIT)
+    timeout = min(max(timeout, 0), Config.CHANGE_FEED_MAX_WAIT)
+
+    if change_feed.version <= since and timeout > 0:
+        change_feed.wait(since, timeout)
+
+    if change_feed.version <= since:
+        # 没有新变更时不访问数据库
+        data = {
+            'changes': [],
+            'latest_version': change_feed.version,
+            'has_more': False,
+            'reset_required': False
+        }
+        return success_response(data, '没有新变更')
+
+    changes, has_more = get_changes(since, limit)
+
+    # 请求的版本已被清理（包括从0开始但日志已被清理过），或期间发生过整体替换，客户端需要全量重新同步
+    reset_required = since < oldest_version() - 1 or \
+        any(c['operation'] == OP_RESET for c in changes)
+
+    data = {
+        'changes': changes,
+        'latest_version': change_feed.version,
+        'has_more': has_more,
+        'reset_required': reset_required
+    }
+    return success_response(data, '获取成功')
@@ -8,6 +8,18 @@ from flask import Blueprint, request
 from app.models import db, Prompt
 from app.utils.response import success_response, error_response
 from app.config import Config
+from app.utils.auto_backup import backup_scheduler
+from app.utils.profiler import sql_profiler
+from app.utils.replication import follower
+from app.utils.changes import change_feed
+from app.utils.bulk_delete import purge_worker
+from app.utils.maintenance import maintenance
+from app.utils.admission import admission
+from app.utils.fragment_cache import fragment_cache
+from app.utils.sampler import prompt_sampler
+from app.utils.export_cache import export_cache
+from app.utils.write_queue import write_queue
+from app.utils.libraries import libraries
 from datetime import datetime
 
 bp = Blueprint('config', __name__, url_prefix='/api/v1')
@@ -104,7 +116,7 @@ def get_system_status():
     # 数据库状态
     try:
         total_prompts = Prompt.query.count()
-        total_categories = db.session.query(db.func.count(db.func.distinct(Prompt.category))).scalar()
+        total_categories = db.session.query(db.func.count(db.func.distinct(Prompt.category_id))).scalar()
         
         db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
         db_size = os.path.getsize(db_path) if os.path.exists(db_path) else 0
@@ -114,7 +126,8 @@ def get_system_status():
             'status': 'connected',
             'total_prompts': total_prompts,
             'total_categories': total_categories,
-            'database_size': f'{db_size_mb}MB'
+            'database_size': f'{db_size_mb}MB',
+            'pending_purge': purge_worker.pending_count()
         }
     except Exception as e:
         database_status = {
@@ -150,14 +163,91 @@ def get_system_status():
     # 备份状态
     backup_status = {
         'last_backup': 'N/A',
+        'last_backup_duration': None,
         'auto_backup': Config.AUTO_BACKUP,
-        'backup_retention_days': Config.BACKUP_RETENTION_DAYS
+        'backup_retention_days': Config.BACKUP_RETENTION_DAYS,
+        'backup_max_count': Config.BACKUP_MAX_COUNT
     }
+    try:
+        backup_status.update(backup_scheduler.status())
+    except Exception:
+        pass
+    
+    # 数据库维护状态
+    try:
+        maintenance_status = maintenance.status()
+    except Exception as e:
+        maintenance_status = {'error': str(e)}
+    
+    # 复制状态
+    if follower.active:
+        replication_status = follower.status()
+    else:
+        replication_status = {
+            'role': 'leader',
+            'latest_version': change_feed.version
+        }
     
     data = {
         'database': database_status,
         'server': server_status,
-        'backup': backup_status
+        'backup': backup_status,
+        'maintenance': maintenance_status,
+        'admission': admission.status(),
+        'fragment_cache': fragment_cache.stats(),
+        'sampler': prompt_sampler.stats(),
+        'export_cache': export_cache.stats(),
+        'write_queue': write_queue.status(),
+        'libraries': libraries.status(),
+        'replication': replication_status
     }
     
     return success_response(data, '系统状态正常')
+
+
+@bp.route('/system/profile', methods=['GET'])
+def get_sql_profiles():
+    """获取最近请求的SQL性能分析记录"""
+    try:
+        limit = int(request.args.get('limit', 0)) or None
+    except (ValueError, TypeError):
+        return error_response('limit必须是整数', 400)
+    
+    data = {
+        'enabled': sql_profiler.enabled,
+        'slow_query_ms': sql_profiler.slow_query_ms,
+        'n_plus_one_threshold': sql_profiler.n_plus_one_threshold,
+        'profiles': sql_profiler.recent(limit)
+    }
+    
+    return success_response(data, '获取成功')
+
+
+@bp.route('/system/maintenance', methods=['GET'])
+def get_maintenance_status():
+    """获取数据库碎片统计与最近一次维护结果"""
+    return success_response(maintenance.status(), '获取成功')
+
+
+@bp.route('/system/maintenance', methods=['POST'])
+def run_maintenance():
+    """立即执行一次数据库维护"""
+    data = request.get_json(silent=True) or {}
+    
+    time_budget = data.get('time_budget')
+    if time_budget is not None:
+        try:
+            time_budget = max(float(time_budget), 0)
+        except (ValueError, TypeError):
+            return error_response('time_budget必须是数字', 400)
+    
+    result = maintenance.run(force=True, full_vacuum=bool(data.get('full_vacuum')), time_budget=time_budget)
+    if result is None:
+        return error_response('已有维护任务在进行中', 409)
+    if result.get('error'):
+        return error_response(f'数据库维护失败: {result["error"]}', 500)
+    
+    data = dict(result)
+    data['finished_at'] = data['finished_at'].isoformat() + 'Z'
+    data.update(maintenance.status())
+    return success_response(data, '数据库维护完成')
@@ -0,0 +1,211 @@
+"""
+词条库管理API路由
+主词条库仍使用 /api/v1/prompts 等接口；其他词条库的词条通过 /api/v1/libraries/<name>/prompts 访问
+"""
+from functools import wraps
+from flask import Blueprint, request
+from sqlalchemy import func, or_
+from app.models import db, Prompt, Category
+from app.utils.response import success_response, error_response
+from app.utils.validators import validate_prompt_data, validate_pagination_params
+from app.utils.libraries import libraries, LibraryNotFound, LibraryBusy
+from app.utils.write_queue import write_queue, WriteQueueFull
+from app.routes.prompts import _insert_prompt, _update_prompt, _delete_prompt
+from app.config import Config
+
+bp = Blueprint('libraries', __name__, url_prefix='/api/v1/libraries')
+
+
+def library_view(view):
+    """在指定词条库的会话中执行视图，词条库不存在时返回404"""
+    @wraps(view)
+    def wrapper(name, *args, **kwargs):
+        if not libraries.valid_name(name):
+            return error_response('词条库名称只能包含字母、数字、下划线和短横线（1-64个字符）', 400)
+        try:
+            with libraries.session(name):
+                return view(*args, **kwargs)
+        except LibraryNotFound:
+            return error_response('词条库不存在', 404)
+    return wrapper
+
+
+@bp.route('', methods=['GET'])
+def get_libraries():
+    """获取词条库列表"""
+    return success_response(libraries.list_all(), '获取成功')
+
+
+@bp.route('', methods=['POST'])
+def create_library():
+    """新建空词条库"""
+    data = request.get_json(silent=True) or {}
+    name = (data.get('name') or '').strip()
+    
+    if not libraries.valid_name(name):
+        return error_response('词条库名称只能包含字母、数字、下划线和短横线（1-64个字符）', 400)
+    
+    try:
+        libraries.create(name)
+    except FileExistsError:
+        return error_response('词条库已存在', 409)
+    except Exception as e:
+        return error_response(f'创建失败: {str(e)}', 500)
+    
+    return success_response({'name': name}, '词条库创建成功', 201)
+
+
+@bp.route('/<name>', methods=['DELETE'])
+def delete_library(name):
+    """删除词条库（数据库文件一并删除）"""
+    try:
+        libraries.delete(name)
+    except LibraryNotFound:
+        return error_response('词条库不存在', 404)
+    except LibraryBusy:
+        return error_response('词条库正在使用中，请稍后重试', 409)
+    
+    return success_response(None, '词条库删除成功')
+
+
+@bp.route('/<name>/categories', methods=['GET'])
+@library_view
+def get_library_categories():
+    """获取词条库的分类及其词条数量"""
+    rows = db.session.query(Category.name, func.count(Prompt.id)) \
+        .join(Prompt, Prompt.category_id == Category.id) \
+        .group_by(Category.id).order_by(Category.name).all()
+    
+    data = [{'name': category, 'count': count} for category, count in rows]
+    return success_response(data, '获取成功')
+
+
+@bp.route('/<name>/prompts', methods=['GET'])
+@library_view
+def get_library_prompts():
+    """获取词条库的词条列表（支持分页、分类筛选、关键词搜索）"""
+    category = request.args.get('category', '')
+    keyword = request.args.get('keyword', '').strip()
+    page = request.args.get('page', 1)
+    limit = request.args.get('limit', Config.DEFAULT_PAGE_SIZE)
+    sort = request.args.get('sort', 'created_desc')
+    
+    is_valid, errors, page, limit = validate_pagination_params(page, limit, Config.MAX_PAGE_SIZE)
+    if not is_valid:
+        return error_response('分页参数错误', 400, errors)
+    
+    query = Prompt.query
+    if category:
+        query = query.filter(Prompt.category == category)
+    if keyword:
+        query = query.filter(or_(
+            Prompt.name.contains(keyword),
+            Prompt.translation.contains(keyword),
+            Prompt.comment.contains(keyword)
+        ))
+    
+    if sort == 'name_asc':
+        query = query.order_by(Prompt.name.asc())
+    else:
+        query = query.order_by(Prompt.created_at.desc())
+    
+    pagination = query.paginate(page=page, per_page=limit, error_out=False)
+    
+    data = {
+        'prompts': [prompt.to_dict() for prompt in pagination.items],
+        'pagination': {
+            'page': page,
+            'limit': limit,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    }
+    
+    return success_response(data, '获取成功')
+
+
+@bp.route('/<name>/prompts', methods=['POST'])
+@library_view
+def create_library_prompt():
+    """在词条库中创建词条（与主词条库相同，经写入队列提交并维护标签、签名和变更日志）"""
+    data = request.get_json()
+    
+    if not data:
+        return error_response('请求数据不能为空', 400)
+    
+    is_valid, errors = validate_prompt_data(data)
+    if not is_valid:
+        return error_response('数据验证失败', 400, errors)
+    
+    try:
+        prompt_data = write_queue.submit_library(request.view_args['name'], _insert_prompt, data)
+        return success_response(prompt_data, '词条创建成功', 201)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except LibraryNotFound:
+        return error_response('词条库不存在', 404)
+    except Exception as e:
+        return error_response(f'创建失败: {str(e)}', 500)
+
+
+@bp.route('/<name>/prompts/<int:id>', methods=['GET'])
+@library_view
+def get_library_prompt(id):
+    """获取词条库中的词条详情"""
+    prompt = db.session.get(Prompt, id)
+    
+    if not prompt:
+        return error_response('词条不存在', 404)
+    
+    return success_response(prompt.to_dict(), '获取成功')
+
+
+@bp.route('/<name>/prompts/<int:id>', methods=['PUT'])
+@library_view
+def update_library_prompt(id):
+    """更新词条库中的词条"""
+    prompt = db.session.get(Prompt, id)
+    
+    if not prompt:
+        return error_response('词条不存在', 404)
+    
+    data = request.get_json()
+    
+    if not data:
+        return error_response('请求数据不能为空', 400)
+    
+    is_valid, errors = validate_prompt_data(data)
+    if not is_valid:
+        return error_response('数据验证失败', 400, errors)
+    
+    try:
+        prompt_data = write_queue.submit_library(request.view_args['name'], _update_prompt, id, data)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except LibraryNotFound:
+        return error_response('词条库不存在', 404)
+    except Exception as e:
+        return error_response(f'更新失败: {str(e)}', 500)
+    
+    # 提交前词条已被并发删除
+    if prompt_data is None:
+        return error_response('词条不存在', 404)
+    return success_response(prompt_data, '词条更新成功')
+
+
+@bp.route('/<name>/prompts/<int:id>', methods=['DELETE'])
+@library_view
+def delete_library_prompt(id):
+    """删除词条库中的词条"""
+    try:
+        deleted = write_queue.submit_library(request.view_args['name'], _delete_prompt, id)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except LibraryNotFound:
+        return error_response('词条库不存在', 404)
+    except Exception as e:
+        return error_response(f'删除失败: {str(e)}', 500)
+    
+    if not deleted:
+        return error_response('词条不存在', 404)
+    return success_response(None, '词条删除成功')
@@ -1,16 +1,51 @@
 """
 词条管理API路由
 """
-from flask import Blueprint, request
+import sys
+import math
+import random
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from sqlalchemy import or_
 from app.models import db, Prompt
-from app.utils.response import success_response, error_response
+from app.utils.response import success_response, error_response, assembled_response
 from app.utils.validators import validate_prompt_data, validate_pagination_params
+from app.utils.tags import split_tags, sync_prompt_tags, remove_prompt_tags
+from app.utils.changes import record_changes, parse_timestamp, OP_INSERT, OP_UPDATE, OP_DELETE
+from app.utils.bulk_delete import delete_prompts, delete_by_filter, soft_delete
+from app.utils.write_queue import write_queue, WriteQueueFull, WriteResult
+from app.utils.suggest import suggest_index
+from app.utils.columnar import FORMATS, encode_prompts
+from app.utils.fragment_cache import fragment_cache
+from app.utils.sampler import prompt_sampler
+from app.utils.duplicates import similar_prompts
+from app.utils import ndjson
 from app.config import Config
 
 bp = Blueprint('prompts', __name__, url_prefix='/api/v1')
 
 
+def _prompt_page_response(query, page, limit, message):
+    """
+    分页返回词条：只查询当前页的 (id, updated_at)，行内容取自片段缓存，
+    响应结构与 success_response 相同
+    """
+    total = query.order_by(None).count()
+    rows = query.with_entities(Prompt.id, Prompt.updated_at) \
+        .limit(limit).offset((page - 1) * limit).all()
+    
+    pagination = {
+        'page': page,
+        'limit': limit,
+        'total': total,
+        'pages': math.ceil(total / limit)
+    }
+    parts = {
+        'prompts': '[' + ','.join(fragment_cache.fragments(rows)) + ']',
+        'pagination': current_app.json.dumps(pagination, separators=(',', ':'))
+    }
+    return assembled_response(parts, message)
+
+
 @bp.route('/prompts', methods=['GET'])
 def get_prompts():
     """获取词条列表（支持分页、筛选、排序）"""
@@ -19,6 +54,10 @@ def get_prompts():
     page = request.args.get('page', 1)
     limit = request.args.get('limit', Config.DEFAULT_PAGE_SIZE)
     sort = request.args.get('sort', 'created_desc')
+    fmt = request.args.get('format', 'json')
+    
+    if fmt not in FORMATS:
+        return error_response(f'format必须是 {FORMATS} 之一', 400)
     
     # 验证分页参数
     is_valid, errors, page, limit = validate_pagination_params(page, limit, Config.MAX_PAGE_SIZE)
@@ -38,11 +77,14 @@ def get_prompts():
     else:  # 默认使用 created_desc
         query = query.order_by(Prompt.created_at.desc())
     
+    if fmt == 'json':
+        return _prompt_page_response(query, page, limit, '获取成功')
+    
     # 分页
     pagination = query.paginate(page=page, per_page=limit, error_out=False)
     
     data = {
-        'prompts': [prompt.to_dict() for prompt in pagination.items],
+        'prompts': encode_prompts(pagination.items),
         'pagination': {
             'page': page,
             'limit': limit,
@@ -61,10 +103,14 @@ def search_prompts():
     category = request.args.get('category', '')
     page = request.args.get('page', 1)
     limit = request.args.get('limit', Config.DEFAULT_PAGE_SIZE)
+    fmt = request.args.get('format', 'json')
     
     if not keyword:
         return error_response('搜索关键词不能为空', 400)
     
+    if fmt not in FORMATS:
+        return error_response(f'format必须是 {FORMATS} 之一', 400)
+    
     is_valid, errors, page, limit = validate_pagination_params(page, limit, Config.MAX_PAGE_SIZE)
     if not is_valid:
         return error_response('分页参数错误', 400, errors)
@@ -81,10 +127,13 @@ def search_prompts():
         query = query.filter(Prompt.category == category)
     
     query = query.order_by(Prompt.created_at.desc())
+    if fmt == 'json':
+        return _prompt_page_response(query, page, limit, '搜索成功')
+    
     pagination = query.paginate(page=page, per_page=limit, error_out=False)
     
     data = {
-        'prompts': [prompt.to_dict() for prompt in pagination.items],
+        'prompts': encode_prompts(pagination.items),
         'pagination': {
             'page': page,
             'limit': limit,
@@ -96,9 +145,135 @@ def search_prompts():
     return success_response(data, '搜索成功')
 
 
+@bp.route('/prompts/stream', methods=['GET'])
+def stream_prompts():
+    """以NDJSON逐行导出词条（服务端游标，按id排序）"""
+    category = request.args.get('category', '')
+    keyword = request.args.get('keyword', '').strip()
+    
+    try:
+        updated_since = parse_timestamp(request.args.get('updated_since'))
+        after_id = int(request.args.get('after_id', 0))
+    except (ValueError, TypeError, AttributeError):
+        return error_response('updated_since必须是ISO 8601时间，after_id必须是整数', 400)
+    
+    lines = ndjson.export_lines(
+        category=category or None,
+        keyword=keyword or None,
+        updated_since=updated_since,
+        after_id=after_id or None
+    )
+    return Response(stream_with_context(lines), mimetype=ndjson.MIMETYPE)
+
+
+@bp.route('/prompts/stream', methods=['POST'])
+def import_prompt_stream():
+    """逐行读取NDJSON请求体并分批upsert，每批返回一行确认"""
+    # 流式导入不受普通上传大小限制（设为None会回退到应用配置，0表示不限制）
+    request.max_content_length = Config.STREAM_MAX_BODY_SIZE or sys.maxsize
+    return Response(stream_with_context(ndjson.import_lines(request.stream)), mimetype=ndjson.MIMETYPE)
+
+
+@bp.route('/prompts/suggest', methods=['GET'])
+def suggest_prompts():
+    """按前缀联想词条名称和标签"""
+    prefix = request.args.get('prefix', '').strip()
+    kind = request.args.get('type', '') or None
+    
+    if not prefix:
+        return error_response('前缀不能为空', 400)
+    
+    if kind not in (None, 'name', 'tag'):
+        return error_response('type必须是name或tag', 400)
+    
+    try:
+        limit = int(request.args.get('limit', 10))
+    except (ValueError, TypeError):
+        return error_response('limit必须是正整数', 400)
+    limit = min(max(limit, 1), 50)
+    
+    return success_response(suggest_index.suggest(prefix, limit=limit, kind=kind), '获取成功')
+
+
+def _split_values(name):
+    """读取可重复、可用逗号分隔的查询参数"""
+    return [item.strip() for value in request.args.getlist(name) for item in value.split(',') if item.strip()]
+
+
+def _split_pair(item, cast):
+    """把 `分类:数值` 拆为 (分类, 数值)，没有数值时为 (分类, None)"""
+    name, sep, value = item.rpartition(':')
+    try:
+        return (name.strip(), cast(value)) if sep else (item, None)
+    except ValueError:
+        # 冒号后不是数值时视为分类名的一部分
+        return item, None
+
+
+@bp.route('/prompts/sample', methods=['GET'])
+def sample_prompts():
+    """随机抽取词条（支持分类配额、权重和随机种子）"""
+    seed = request.args.get('seed', '')
+    k = request.args.get('k', '')
+    
+    categories, quotas, weights = [], {}, None
+    try:
+        for item in _split_values('category'):
+            category, quota = _split_pair(item, int)
+            if quota is None:
+                categories.append(category)
+            elif quota < 0:
+                raise ValueError
+            else:
+                quotas[category] = quota
+    except ValueError:
+        return error_response('category格式为 分类 或 分类:数量（非负整数）', 400)
+    
+    if request.args.get('weights'):
+        weights = {}
+        try:
+            for item in _split_values('weights'):
+                category, weight = _split_pair(item, float)
+                if weight is None or not 0 <= weight < float('inf'):
+                    raise ValueError
+                weights[category] = weight
+        except ValueError:
+            return error_response('weights格式为 分类:权重（非负数），多个用逗号分隔', 400)
+    
+    # 只给出带配额的分类时，总数默认为配额之和
+    default_k = sum(quotas.values()) if quotas and not categories else 10
+    try:
+        k = int(k) if k else default_k
+        if k < 0:
+            raise ValueError
+    except ValueError:
+        return error_response('k必须是非负整数', 400)
+    
+    if sum(quotas.values()) > k:
+        return error_response('各分类配额之和不能超过k', 400)
+    if k > Config.MAX_PAGE_SIZE:
+        return error_response(f'k不能超过{Config.MAX_PAGE_SIZE}', 400)
+    
+    # 不指定种子时随机生成并返回，便于复现
+    if not seed:
+        seed = str(random.randrange(2 ** 32))
+    
+    prompts, allocation = prompt_sampler.sample(
+        quotas=quotas, k=k, weights=weights,
+        categories=sorted(set(categories)) if categories else None, seed=seed
+    )
+    
+    data = {
+        'prompts': [prompt.to_dict() for prompt in prompts],
+        'allocation': allocation,
+        'seed': seed
+    }
+    return success_response(data, '获取成功')
+
+
 @bp.route('/prompts', methods=['POST'])
 def create_prompt():
-    """创建词条"""
+    """创建词条（开启重复检查时，存在标签近似相同的词条返回409，allow_duplicate为true时仍然创建）"""
     data = request.get_json()
     
     if not data:
@@ -108,20 +283,38 @@ def create_prompt():
     if not is_valid:
         return error_response('数据验证失败', 400, errors)
     
+    if Config.DUPLICATE_CHECK_ON_CREATE and not data.get('allow_duplicate'):
+        similar = similar_prompts(
+            split_tags(data['translation']), threshold=Config.DUPLICATE_CREATE_THRESHOLD, limit=5
+        )
+        if similar:
+            duplicates = [dict(prompt.to_dict(), similarity=round(score, 4)) for prompt, score in similar]
+            return error_response('已存在标签近似相同的词条', 409, duplicates)
+    
+    try:
+        prompt_data = write_queue.submit(_insert_prompt, data)
+        return success_response(prompt_data, '词条创建成功', 201)
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except Exception as e:
+        return error_response(f'创建失败: {str(e)}', 500)
+
+
+def _insert_prompt(data):
+    """写线程中执行：插入词条"""
     prompt = Prompt(
         category=data['category'],
         name=data['name'],
         translation=data['translation'],
         comment=data.get('comment', '')
     )
-    
-    try:
-        db.session.add(prompt)
-        db.session.commit()
-        return success_response(prompt.to_dict(), '词条创建成功', 201)
-    except Exception as e:
-        db.session.rollback()
-        return error_response(f'创建失败: {str(e)}', 500)
+    db.session.add(prompt)
+    db.session.flush()
+    sync_prompt_tags([prompt])
+    record_changes(OP_INSERT, [prompt.id])
+    # 提交后对象过期，响应内容在事务内按数据库中的值生成
+    db.session.refresh(prompt)
+    return WriteResult(prompt.to_dict(), upserted=[prompt])
 
 
 @bp.route('/prompts/<int:id>', methods=['GET'])
@@ -153,38 +346,66 @@ def update_prompt(id):
         return error_response('数据验证失败', 400, errors)
     
     try:
-        prompt.category = data['category']
-        prompt.name = data['name']
-        prompt.translation = data['translation']
-        prompt.comment = data.get('comment', '')
-        
-        db.session.commit()
-        return success_response(prompt.to_dict(), '词条更新成功')
+        prompt_data = write_queue.submit(_update_prompt, id, data)
+    except WriteQueueFull:
+        return write_queue.busy_response()
     except Exception as e:
-        db.session.rollback()
         return error_response(f'更新失败: {str(e)}', 500)
+    
+    # 提交前词条已被并发删除
+    if prompt_data is None:
+        return error_response('词条不存在', 404)
+    return success_response(prompt_data, '词条更新成功')
 
 
-@bp.route('/prompts/<int:id>', methods=['DELETE'])
-def delete_prompt(id):
-    """删除词条"""
+def _update_prompt(id, data):
+    """写线程中执行：更新词条，词条不存在时返回None"""
     prompt = db.session.get(Prompt, id)
-    
     if not prompt:
-        return error_response('词条不存在', 404)
+        return None
+    
+    prompt.category = data['category']
+    prompt.name = data['name']
+    prompt.translation = data['translation']
+    prompt.comment = data.get('comment', '')
     
+    sync_prompt_tags([prompt])
+    record_changes(OP_UPDATE, [prompt.id])
+    db.session.flush()
+    db.session.refresh(prompt)
+    return WriteResult(prompt.to_dict(), upserted=[prompt])
+
+
+@bp.route('/prompts/<int:id>', methods=['DELETE'])
+def delete_prompt(id):
+    """删除词条"""
     try:
-        db.session.delete(prompt)
-        db.session.commit()
-        return success_response(None, '词条删除成功')
+        deleted = write_queue.submit(_delete_prompt, id)
+    except WriteQueueFull:
+        return write_queue.busy_response()
     except Exception as e:
-        db.session.rollback()
         return error_response(f'删除失败: {str(e)}', 500)
+    
+    if not deleted:
+        return error_response('词条不存在', 404)
+    return success_response(None, '词条删除成功')
+
+
+def _delete_prompt(id):
+    """写线程中执行：删除词条，词条不存在时返回False"""
+    prompt = db.session.get(Prompt, id)
+    if not prompt:
+        return False
+    
+    remove_prompt_tags([id])
+    record_changes(OP_DELETE, [id])
+    db.session.delete(prompt)
+    return WriteResult(True, deleted=[id])
 
 
 @bp.route('/prompts/batch', methods=['DELETE'])
 def batch_delete_prompts():
-    """批量删除词条"""
+    """批量删除词条（分块提交，soft为true时软删除并由后台清理）"""
     data = request.get_json()
     
     if not data or 'ids' not in data:
@@ -195,13 +416,66 @@ def batch_delete_prompts():
     if not isinstance(ids, list) or not ids:
         return error_response('ids必须是非空数组', 400)
     
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return error_response('ids必须是整数数组', 400)
+    
     try:
-        deleted_count = Prompt.query.filter(Prompt.id.in_(ids)).delete(synchronize_session=False)
-        db.session.commit()
+        if data.get('soft'):
+            marked_count = soft_delete(ids)
+            return success_response(
+                {'deleted_count': marked_count, 'soft': True},
+                f'已标记删除{marked_count}条记录，将在后台清理'
+            )
+        
+        deleted_count = delete_prompts(ids)
         return success_response(
             {'deleted_count': deleted_count},
             f'批量删除成功，删除{deleted_count}条记录'
         )
+    except WriteQueueFull:
+        return write_queue.busy_response()
     except Exception as e:
-        db.session.rollback()
         return error_response(f'批量删除失败: {str(e)}', 500)
+
+
+@bp.route('/prompts/by-filter', methods=['DELETE'])
+def delete_prompts_by_filter():
+    """按条件删除词条（分类、关键词、创建时间之前），无需客户端列出id"""
+    data = request.get_json(silent=True) or {}
+    
+    category = (data.get('category') or '').strip()
+    keyword = (data.get('keyword') or '').strip()
+    created_before = data.get('created_before')
+    
+    if not (category or keyword or created_before):
+        return error_response('至少需要一个筛选条件: category、keyword、created_before', 400)
+    
+    if created_before:
+        try:
+            created_before = parse_timestamp(created_before)
+        except (ValueError, TypeError, AttributeError):
+            return error_response('created_before必须是ISO 8601时间', 400)
+    
+    filters = {
+        'category': category or None,
+        'keyword': keyword or None,
+        'created_before': created_before or None
+    }
+    
+    try:
+        if data.get('soft'):
+            marked_count = soft_delete(**filters)
+            return success_response(
+                {'deleted_count': marked_count, 'soft': True},
+                f'已标记删除{marked_count}条记录，将在后台清理'
+            )
+        
+        deleted_count = delete_by_filter(**filters)
+        return success_response(
+            {'deleted_count': deleted_count},
+            f'删除成功，删除{deleted_count}条记录'
+        )
+    except WriteQueueFull:
+        return write_queue.busy_response()
+    except Exception as e:
+        return error_response(f'删除失败: {str(e)}', 500)
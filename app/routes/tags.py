@@ -0,0 +1,126 @@
+"""
+标签索引API路由
+"""
+from flask import Blueprint, request
+from app.models import db, Prompt
+from app.utils.response import success_response, error_response
+from app.utils.validators import validate_pagination_params
+from app.utils.tags import split_tags, tag_counts, prompt_ids_with_tags, related_prompt_ids
+from app.utils.duplicates import find_duplicates
+from app.config import Config
+
+bp = Blueprint('tags', __name__, url_prefix='/api/v1')
+
+MAX_TAG_LIST_SIZE = 1000
+
+
+@bp.route('/tags', methods=['GET'])
+def get_tags():
+    """获取标签及其出现次数"""
+    category = request.args.get('category', '')
+
+    try:
+        limit = int(request.args.get('limit', 100))
+    except (ValueError, TypeError):
+        return error_response('limit必须是正整数', 400)
+    limit = min(max(limit, 1), MAX_TAG_LIST_SIZE)
+
+    data = [
+        {'tag': tag, 'count': count}
+        for tag, count in tag_counts(limit=limit, category=category or None)
+    ]
+
+    return success_response(data, '获取成功')
+
+
+@bp.route('/tags/prompts', methods=['GET'])
+def get_prompts_by_tag():
+    """精确查找包含指定标签的词条（多个tag参数表示同时包含）"""
+    tags = []
+    for value in request.args.getlist('tag'):
+        for tag in split_tags(value):
+            if tag not in tags:
+                tags.append(tag)
+
+    if not tags:
+        return error_response('标签不能为空', 400)
+
+    category = request.args.get('category', '')
+    page = request.args.get('page', 1)
+    limit = request.args.get('limit', Config.DEFAULT_PAGE_SIZE)
+
+    is_valid, errors, page, limit = validate_pagination_params(page, limit, Config.MAX_PAGE_SIZE)
+    if not is_valid:
+        return error_response('分页参数错误', 400, errors)
+
+    query = Prompt.query.filter(Prompt.id.in_(prompt_ids_with_tags(tags)))
+    if category:
+        query = query.filter(Prompt.category == category)
+
+    query = query.order_by(Prompt.created_at.desc())
+    pagination = query.paginate(page=page, per_page=limit, error_out=False)
+
+    data = {
+        'tags': tags,
+        'prompts': [prompt.to_dict() for prompt in pagination.items],
+        'pagination': {
+            'page': page,
+            'limit': limit,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    }
+
+    return success_response(data, '获取成功')
+
+
+@bp.route('/prompts/duplicates', methods=['GET'])
+def get_duplicate_prompts():
+    """查找标签集合近似相同的词条组（MinHash/LSH）"""
+    category = request.args.get('category', '')
+
+    try:
+        threshold = float(request.args.get('threshold', 0.8))
+        if not 0 < threshold <= 1:
+            raise ValueError
+    except (ValueError, TypeError):
+        return error_response('threshold必须是0到1之间的数（不含0）', 400)
+
+    try:
+        limit = int(request.args.get('limit', 50))
+    except (ValueError, TypeError):
+        return error_response('limit必须是正整数', 400)
+    limit = min(max(limit, 1), Config.MAX_PAGE_SIZE)
+
+    data = find_duplicates(threshold=threshold, category=category or None, limit=limit)
+    data['threshold'] = threshold
+    return success_response(data, '获取成功')
+
+
+@bp.route('/prompts/<int:id>/related', methods=['GET'])
+def get_related_prompts(id):
+    """获取与指定词条共享标签的词条（按共享标签数排序）"""
+    if db.session.get(Prompt, id) is None:
+        return error_response('词条不存在', 404)
+
+    try:
+        limit = int(request.args.get('limit', 20))
+    except (ValueError, TypeError):
+        return error_response('limit必须是正整数', 400)
+    limit = min(max(limit, 1), Config.MAX_PAGE_SIZE)
+
+    ranked = related_prompt_ids(id, limit=limit)
+    prompts = {
+        p.id: p for p in Prompt.query.filter(Prompt.id.in_([pid for pid, _ in ranked])).all()
+    } if ranked else {}
+
+    data = []
+    for prompt_id, shared in ranked:
+        prompt = prompts.get(prompt_id)
+        if prompt is None:
+            continue
+        item = prompt.to_dict()
+        item['shared_tags'] = shared
+        data.append(item)
+
+    return success_response(data, '获取成功')
@@ -0,0 +1,173 @@
+"""
+准入控制
+按路由把请求分为 interactive（交互）、bulk（批量）、admin（管理）、longpoll（变更订阅长轮询）四类，
+每类限制并发数并带有限长的等待队列；
+超出限制或等待超时的请求立即返回503和Retry-After，慢操作不会占满全部工作线程
+"""
+import threading
+from flask import g, request
+from werkzeug.wsgi import ClosingIterator
+from app.utils.response import error_response
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+ADMIN = 'admin'
+LONGPOLL = 'longpoll'
+CLASSES = (INTERACTIVE, BULK, ADMIN, LONGPOLL)
+
+# 端点到类别的映射，优先于蓝图映射；未列出的API请求属于 interactive
+ENDPOINT_CLASSES = {
+    'prompts.stream_prompts': BULK,
+    'prompts.import_prompt_stream': BULK,
+    'prompts.batch_delete_prompts': BULK,
+    'prompts.delete_prompts_by_filter': BULK,
+    'backup.export_csv': BULK,
+    'backup.export_db': BULK,
+    'backup.get_backup_history': INTERACTIVE,
+    # 长轮询大部分时间在等待，单独限制，不占用交互请求的名额
+    'changes.get_change_feed': LONGPOLL,
+}
+BLUEPRINT_CLASSES = {
+    'backup': ADMIN,
+    'config': ADMIN,
+}
+# 健康检查不参与准入控制，过载时也要能及时响应
+EXEMPT_ENDPOINTS = {'health.health_check'}
+
+DEFAULT_LIMITS = {
+    INTERACTIVE: {'limit': 8, 'queue': 8, 'timeout': 2, 'retry_after': 1},
+    BULK: {'limit': 2, 'queue': 2, 'timeout': 10, 'retry_after': 5},
+    ADMIN: {'limit': 1, 'queue': 1, 'timeout': 10, 'retry_after': 5},
+    LONGPOLL: {'limit': 32, 'queue': 0, 'timeout': 0, 'retry_after': 5},
+}
+
+
+def classify(endpoint):
+    """返回端点所属的类别，不参与准入控制时返回None"""
+    if endpoint is None or endpoint in EXEMPT_ENDPOINTS or not request.path.startswith('/api/'):
+        return None
+    if endpoint in ENDPOINT_CLASSES:
+        return ENDPOINT_CLASSES[endpoint]
+    return BLUEPRINT_CLASSES.get(endpoint.split('.', 1)[0], INTERACTIVE)
+
+
+class AdmissionClass:
+    """单个类别的并发限制与等待队列"""
+
+    def __init__(self, name, limit, queue, timeout, retry_after):
+        self.name = name
+        self.limit = max(int(limit), 1)
+        self.queue = max(int(queue), 0)
+        self.timeout = max(float(timeout), 0)
+        self.retry_after = max(int(retry_after), 1)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        获取一个并发名额，队列已满或等待超时返回False
+        """
+        with self._cond:
+            if self.active < self.limit and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                ok = self._cond.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+            finally:
+                self.waiting -= 1
+            if ok:
+                self.active += 1
+                self.admitted += 1
+            else:
+                self.rejected += 1
+            return ok
+
+    def release(self):
+        with self._cond:
+            self.active = max(self.active - 1, 0)
+            self._cond.notify()
+
+    def status(self):
+        return {
+            'limit': self.limit,
+            'queue_size': self.queue,
+            'active': self.active,
+            'queue_depth': self.waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected
+        }
+
+
+class AdmissionController:
+    """准入控制器"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.classes = {}
+
+    def init_app(self, app):
+        """按配置创建各类别并注册请求钩子"""
+        self.app = app
+        app.extensions['admission'] = self
+        self.enabled = app.config['ADMISSION_ENABLED']
+
+        configured = app.config['ADMISSION_CLASSES'] or {}
+        self.classes = {
+            name: AdmissionClass(name, **{**DEFAULT_LIMITS[name], **configured.get(name, {})})
+            for name in CLASSES
+        }
+
+        if self.enabled:
+            app.before_request(self._admit)
+            app.after_request(self._hold_while_streaming)
+            app.teardown_request(self._release)
+
+    def thread_capacity(self):
+        """所有类别同时满载（含排队）时需要的工作线程数"""
+        return sum(c.limit + c.queue for c in self.classes.values())
+
+    def _admit(self):
+        name = classify(request.endpoint)
+        if name is None:
+            return None
+
+        admission_class = self.classes[name]
+        if not admission_class.acquire():
+            response, code = error_response('服务器繁忙，请稍后重试', 503, {'class': name})
+            response.status_code = code
+            response.headers['Retry-After'] = str(admission_class.retry_after)
+            return response
+
+        g.admission_class = admission_class
+        return None
+
+    def _hold_while_streaming(self, response):
+        # 流式响应在视图返回后才开始输出，名额保留到响应关闭时再释放
+        if response.is_streamed and 'admission_class' in g:
+            response.response = ClosingIterator(response.response, g.pop('admission_class').release)
+        return response
+
+    def _release(self, exc=None):
+        admission_class = g.pop('admission_class', None)
+        if admission_class is not None:
+            admission_class.release()
+
+    def status(self):
+        """各类别的并发数与队列深度"""
+        return {
+            'enabled': self.enabled,
+            'classes': {name: c.status() for name, c in self.classes.items()}
+        }
+
+
+admission = AdmissionController()
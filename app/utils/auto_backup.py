@@ -0,0 +1,158 @@
+"""
+自动备份调度
+定期对在线数据库做去重快照，并按保留策略清理旧快照和旧备份文件
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from app.models import db, BackupHistory
+from app.config import Config
+from app.utils.background import PeriodicWorker, background_enabled
+from app.utils.snapshot_store import snapshot_store
+from app.utils.write_queue import write_queue, WriteQueueFull
+
+logger = logging.getLogger(__name__)
+
+# 参与清理的备份文件前缀：旧版本生成的自动备份和恢复前的安全备份
+PRUNE_PREFIXES = ('naibot_auto_', 'naibot_backup_')
+
+
+def prune_backups(backup_dir=None, retention_days=None, max_count=None, now=None):
+    """
+    按保留天数和保留数量清理备份文件
+
+    每种前缀分别计数，超过 retention_days 天或超出最新 max_count 个的文件会被删除，
+    参数小于等于0表示不限制。
+
+    Returns:
+        被删除的文件名列表
+    """
+    backup_dir = backup_dir or Config.BACKUP_TEMP_DIR
+    retention_days = Config.BACKUP_RETENTION_DAYS if retention_days is None else retention_days
+    max_count = Config.BACKUP_MAX_COUNT if max_count is None else max_count
+    now = now or datetime.now()
+
+    if not os.path.isdir(backup_dir):
+        return []
+
+    removed = []
+    for prefix in PRUNE_PREFIXES:
+        entries = [
+            entry for entry in os.scandir(backup_dir)
+            if entry.is_file() and entry.name.startswith(prefix) and entry.name.endswith('.db')
+        ]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+
+        for idx, entry in enumerate(entries):
+            age = now - datetime.fromtimestamp(entry.stat().st_mtime)
+            expired = retention_days > 0 and age > timedelta(days=retention_days)
+            overflow = max_count > 0 and idx >= max_count
+            if not (expired or overflow):
+                continue
+            try:
+                os.remove(entry.path)
+                removed.append(entry.name)
+            except OSError:
+                logger.warning('无法删除过期备份: %s', entry.path)
+
+    return removed
+
+
+def _record_history(snapshot_id, prompt_count):
+    """记录一次自动备份（在写线程中执行，不提交）"""
+    db.session.add(BackupHistory(operation='auto_backup', filename=snapshot_id, imported_count=prompt_count))
+
+
+class BackupScheduler:
+    """自动备份调度器"""
+
+    def __init__(self):
+        self.app = None
+        self.last_result = None
+        self.last_error = None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """注册到应用，开启自动备份时启动后台线程"""
+        self.app = app
+        app.extensions['backup_scheduler'] = self
+
+        if app.config['AUTO_BACKUP'] and background_enabled(app):
+            interval = max(float(app.config['BACKUP_INTERVAL_HOURS']), 0.01) * 3600
+            self._worker = PeriodicWorker('auto-backup', interval, self._run_scheduled, exclusive=True)
+            self._worker.start()
+
+    def _run_scheduled(self):
+        with self.app.app_context():
+            self.run_backup()
+
+    def run_backup(self):
+        """
+        执行一次在线备份并清理过期备份（需在应用上下文中调用）
+
+        Returns:
+            备份结果字典，已有备份在进行中时返回None
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            started = time.monotonic()
+            try:
+                manifest = snapshot_store.create(label='auto_backup')
+            except Exception as e:
+                logger.exception('自动备份失败')
+                self.last_error = str(e)
+                return {'snapshot_id': None, 'error': self.last_error}
+
+            duration = round(time.monotonic() - started, 3)
+            pruned = snapshot_store.prune() + prune_backups()
+            prompt_count = manifest['prompt_count'] or 0
+
+            try:
+                write_queue.submit(_record_history, manifest['id'], prompt_count)
+            except WriteQueueFull:
+                logger.warning('写队列已满，未记录自动备份历史: %s', manifest['id'])
+            except Exception:
+                logger.exception('记录自动备份历史失败')
+
+            self.last_result = {
+                'finished_at': datetime.utcnow(),
+                'duration': duration,
+                'snapshot_id': manifest['id'],
+                'size': manifest['size'],
+                'new_bytes': manifest['new_bytes'],
+                'prompt_count': prompt_count,
+                'pruned': pruned,
+                'error': None
+            }
+            self.last_error = None
+            logger.info('自动备份完成: %s (新增%d字节, %.3fs, 清理%d个)',
+                        manifest['id'], manifest['new_bytes'], duration, len(pruned))
+            return self.last_result
+        finally:
+            self._lock.release()
+
+    def status(self):
+        """返回最近一次备份的时间与耗时"""
+        result = self.last_result
+        if result is None:
+            latest = BackupHistory.query.filter_by(operation='auto_backup') \
+                .order_by(BackupHistory.timestamp.desc()).first()
+            return {
+                'last_backup': latest.timestamp.isoformat() + 'Z' if latest else 'N/A',
+                'last_backup_duration': None,
+                'last_backup_error': self.last_error
+            }
+
+        return {
+            'last_backup': result['finished_at'].isoformat() + 'Z',
+            'last_backup_duration': result['duration'],
+            'last_backup_error': self.last_error
+        }
+
+
+backup_scheduler = BackupScheduler()
@@ -0,0 +1,156 @@
+"""
+后台线程工具
+"""
+import os
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows：没有文件锁，也不支持监督模式
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def background_enabled(app):
+    """
+    判断当前进程是否应启动后台线程
+
+    开发模式下热重载的父进程只负责监控文件变化，后台任务只在子进程中运行；
+    init_db 等脚本使用开发配置创建应用，也不会启动后台线程。
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        bool
+    """
+    if app.testing:
+        return False
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return False
+    return True
+
+
+class TaskLock:
+    """
+    全库后台任务（清理、自动备份、维护）的进程锁
+
+    监督模式替换工作进程时新旧进程会并存一段时间，这些任务只在持有锁的进程中执行。
+    锁是数据库文件旁的文件锁，持有的进程排空或退出时释放，其他进程在下次执行任务前尝试获取
+    """
+
+    def __init__(self):
+        self.path = None
+        self._file = None
+        self._released = False
+        self._running = 0
+        self._cond = threading.Condition()
+
+    def init_app(self, app):
+        """按数据库路径确定锁文件（内存数据库不加锁）"""
+        app.extensions['task_lock'] = self
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        if uri.startswith('sqlite:///') and uri != 'sqlite:///:memory:':
+            self.path = uri[len('sqlite:///'):] + '.tasks.lock'
+
+    def _acquire(self):
+        if self._released:
+            return False
+        if self._file is not None or fcntl is None or self.path is None:
+            return True
+        file = open(self.path, 'a')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        self._file = file
+        logger.info('当前进程 %d 负责全库后台任务', os.getpid())
+        return True
+
+    @contextmanager
+    def hold(self):
+        """
+        执行一次全库任务期间使用：尝试获取锁（不阻塞，获取后一直持有），任务结束前 release 会等待
+
+        Yields:
+            当前进程是否应执行该任务
+        """
+        with self._cond:
+            held = self._acquire()
+            if held:
+                self._running += 1
+        try:
+            yield held
+        finally:
+            if held:
+                with self._cond:
+                    self._running -= 1
+                    self._cond.notify_all()
+
+    def release(self):
+        """
+        不再开始新的任务，等进行中的任务结束后释放锁（工作进程开始排空时调用，由新的工作进程接管）
+
+        提前释放会让新进程同时执行同样的任务，例如快照回收删掉旧进程刚写入、尚未记入清单的数据块
+        """
+        with self._cond:
+            self._released = True
+            self._cond.wait_for(lambda: self._running == 0)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+task_lock = TaskLock()
+
+
+class PeriodicWorker:
+    """周期性后台任务线程"""
+
+    def __init__(self, name, interval, func, exclusive=False):
+        """
+        Args:
+            name: 线程名称
+            interval: 执行间隔（秒），可以是返回秒数的函数
+            func: 每次执行的任务函数
+            exclusive: 为True时只在持有 task_lock 的进程中执行（全库任务）
+        """
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.exclusive = exclusive
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _next_interval(self):
+        return self.interval() if callable(self.interval) else self.interval
+
+    def _run(self):
+        while not self._stop_event.wait(self._next_interval()):
+            with task_lock.hold() if self.exclusive else nullcontext(True) as allowed:
+                if not allowed:
+                    continue
+                try:
+                    self.func()
+                except Exception:
+                    logger.exception('后台任务 %s 执行失败', self.name)
+
+    def start(self):
+        """启动线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """通知线程退出"""
+        self._stop_event.set()
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
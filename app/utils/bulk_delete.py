@@ -0,0 +1,222 @@
+"""
+批量删除
+按id或筛选条件分块删除词条，每块一个短事务；软删除只打标记并立即记录删除变更，由后台任务分块清理
+"""
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import or_
+from app.models import db, Prompt
+from app.config import Config
+from app.utils.background import background_enabled, task_lock
+from app.utils.tags import remove_prompt_tags
+from app.utils.changes import record_changes, OP_DELETE
+from app.utils.write_queue import write_queue, WriteResult
+
+logger = logging.getLogger(__name__)
+
+INCLUDE_DELETED = {'include_deleted': True}
+
+
+def _chunk_size():
+    return max(int(Config.DELETE_CHUNK_SIZE), 1)
+
+
+def _delete_ids(ids, record=True):
+    """
+    写线程中执行：删除一块词条
+
+    Args:
+        record: 是否记录删除变更；清理软删除词条时已在标记时记录过，为False
+    """
+    existing_ids = [
+        pid for (pid,) in db.session.query(Prompt.id)
+        .filter(Prompt.id.in_(ids))
+        .execution_options(**INCLUDE_DELETED)
+    ]
+    if not existing_ids:
+        return []
+
+    Prompt.query.filter(Prompt.id.in_(existing_ids)).delete(synchronize_session=False)
+    remove_prompt_tags(existing_ids)
+    if record:
+        record_changes(OP_DELETE, existing_ids)
+    return WriteResult(existing_ids, deleted=existing_ids)
+
+
+def _delete_chunk(ids, record=True):
+    """在一个事务中删除一块词条（经写队列，可与其他写操作合并提交），返回实际删除的id列表"""
+    return write_queue.submit(_delete_ids, ids, record=record)
+
+
+def delete_prompts(ids):
+    """
+    按id分块删除词条
+
+    Args:
+        ids: 词条id列表（可超过SQLite绑定变量上限）
+
+    Returns:
+        删除的条数
+    """
+    ids = list(dict.fromkeys(ids))
+    size = _chunk_size()
+    deleted = 0
+    for i in range(0, len(ids), size):
+        deleted += len(_delete_chunk(ids[i:i + size]))
+    return deleted
+
+
+def filter_query(category=None, keyword=None, created_before=None):
+    """
+    按条件构建词条id查询
+
+    Args:
+        category: 分类
+        keyword: 关键词（匹配名称、译文、注释，与搜索接口一致）
+        created_before: 只匹配此时间之前创建的词条
+    """
+    query = db.session.query(Prompt.id)
+    if category:
+        query = query.filter(Prompt.category == category)
+    if keyword:
+        query = query.filter(or_(
+            Prompt.name.contains(keyword),
+            Prompt.translation.contains(keyword),
+            Prompt.comment.contains(keyword)
+        ))
+    if created_before:
+        query = query.filter(Prompt.created_at < created_before)
+    return query
+
+
+def delete_by_filter(**filters):
+    """
+    按条件分块删除词条，id不离开服务端
+
+    Returns:
+        删除的条数
+    """
+    size = _chunk_size()
+    deleted = 0
+    while True:
+        ids = [pid for (pid,) in filter_query(**filters).order_by(Prompt.id).limit(size)]
+        if not ids:
+            return deleted
+        deleted += len(_delete_chunk(ids))
+
+
+def soft_delete(ids=None, **filters):
+    """
+    软删除：只设置 deleted_at 标记，词条立即对查询不可见，随后由后台任务清理；
+    删除变更在标记时记录并通知订阅者，内存索引和从节点不必等到清理
+
+    Args:
+        ids: 词条id列表；为None时按 filters 条件匹配
+
+    Returns:
+        标记的条数
+    """
+    if ids is not None:
+        ids = list(dict.fromkeys(ids))
+    marked = write_queue.submit(_mark_deleted, ids, filters)
+    purge_worker.wake()
+    return marked
+
+
+def _mark_deleted(ids, filters):
+    """写线程中执行：设置软删除标记并记录删除变更"""
+    now = datetime.utcnow()
+    if ids is None:
+        # 查询默认排除已软删除的词条，得到的都是本次新标记的
+        ids = [pid for (pid,) in filter_query(**filters).order_by(Prompt.id)]
+
+    marked = []
+    size = _chunk_size()
+    for i in range(0, len(ids), size):
+        chunk = [
+            pid for (pid,) in db.session.query(Prompt.id)
+            .filter(Prompt.id.in_(ids[i:i + size]), Prompt.deleted_at.is_(None))
+        ]
+        if not chunk:
+            continue
+        Prompt.query.filter(Prompt.id.in_(chunk)) \
+            .update({Prompt.deleted_at: now}, synchronize_session=False)
+        record_changes(OP_DELETE, chunk)
+        marked.extend(chunk)
+    return WriteResult(len(marked), deleted=marked)
+
+
+class PurgeWorker:
+    """后台清理软删除的词条"""
+
+    def __init__(self):
+        self.app = None
+        self.last_purge = None
+        self.purged_total = 0
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        """注册到应用并启动清理线程"""
+        self.app = app
+        app.extensions['purge_worker'] = self
+        if background_enabled(app):
+            self._thread = threading.Thread(target=self._run, name='purge', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """通知清理线程立即开始"""
+        self._wake_event.set()
+
+    def _run(self):
+        while True:
+            self._wake_event.wait(Config.DELETE_PURGE_INTERVAL)
+            self._wake_event.clear()
+            # 监督模式下新旧工作进程并存时只由一个进程清理
+            with task_lock.hold() as allowed:
+                if not allowed:
+                    continue
+                try:
+                    with self.app.app_context():
+                        # 从节点的数据由主节点复制，删除变更在主节点标记时已同步过来
+                        follower = self.app.extensions.get('follower')
+                        if follower is None or not follower.active:
+                            self.purge()
+                except Exception:
+                    logger.exception('清理软删除词条失败')
+
+    def purge(self):
+        """
+        分块清理全部软删除的词条（需在应用上下文中调用）
+
+        Returns:
+            清理的条数
+        """
+        size = _chunk_size()
+        purged = 0
+        while True:
+            ids = [
+                pid for (pid,) in db.session.query(Prompt.id)
+                .filter(Prompt.deleted_at.isnot(None))
+                .order_by(Prompt.id).limit(size)
+                .execution_options(**INCLUDE_DELETED)
+            ]
+            if not ids:
+                break
+            purged += len(_delete_chunk(ids, record=False))
+
+        if purged:
+            self.last_purge = datetime.utcnow()
+            self.purged_total += purged
+            logger.info('已清理%d条软删除词条', purged)
+        return purged
+
+    def pending_count(self):
+        """等待清理的软删除词条数"""
+        return db.session.query(db.func.count(Prompt.id)) \
+            .filter(Prompt.deleted_at.isnot(None)) \
+            .execution_options(**INCLUDE_DELETED).scalar() or 0
+
+
+purge_worker = PurgeWorker()
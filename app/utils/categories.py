@@ -0,0 +1,45 @@
+"""
+分类重命名与合并
+词条通过 category_id 引用分类，重命名只改分类表中的一行；合并是一条按 category_id 的批量更新，
+都不逐个修改词条。调用方负责记录变更、提交和发送通知
+"""
+from sqlalchemy import func
+from app.models import db, Prompt, Category
+
+
+def merge_category(source, target):
+    """
+    在当前事务中把 source 分类的词条整体移到 target 分类并删除 source
+
+    Returns:
+        移动的词条数（不含已软删除的词条）
+    """
+    moved = db.session.query(func.count(Prompt.id)).filter(Prompt.category_id == source.id).scalar()
+    db.session.flush()
+    Prompt.query.filter(Prompt.category_id == source.id) \
+        .execution_options(include_deleted=True) \
+        .update({Prompt.category_id: target.id}, synchronize_session=False)
+    db.session.delete(source)
+    db.session.flush()
+    # Category.resolve 的会话缓存可能还引用已删除的分类
+    db.session.info.pop('category_cache', None)
+    return moved
+
+
+def apply_category_change(name, previous_name):
+    """
+    在当前事务中按名称应用分类变更记录：previous_name 分类的词条改属 name 分类
+    （name 已存在时合并，否则重命名）；从节点复制主节点的分类变更时使用
+
+    Returns:
+        本地是否有 previous_name 分类
+    """
+    source = Category.query.filter_by(name=previous_name).first()
+    if source is None or previous_name == name:
+        return source is not None
+    target = Category.query.filter(Category.name == name, Category.id != source.id).first()
+    if target is not None:
+        merge_category(source, target)
+    else:
+        source.name = name
+    return True
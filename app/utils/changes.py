@@ -0,0 +1,233 @@
+"""
+词条变更日志与变更订阅
+每次写操作在同一事务中追加带单调递增版本号的变更记录，客户端按版本号增量拉取
+"""
+import asyncio
+import threading
+from datetime import datetime
+from sqlalchemy import func
+from app.models import db, Prompt, ChangeLog
+from app.config import Config
+from app.utils.signals import prompts_changed
+
+OP_INSERT = 'insert'
+OP_UPDATE = 'update'
+OP_DELETE = 'delete'
+# 数据被整体替换，客户端需要全量重新同步
+OP_RESET = 'reset'
+# 分类重命名或合并：原分类下的全部词条改属新分类，只记录一条
+OP_CATEGORY = 'category'
+
+PRUNE_EVERY = 1000
+ID_CHUNK_SIZE = 500
+
+
+def latest_version():
+    """当前最大版本号"""
+    return db.session.query(func.max(ChangeLog.version)).scalar() or 0
+
+
+def oldest_version():
+    """日志中保留的最小版本号"""
+    return db.session.query(func.min(ChangeLog.version)).scalar() or 0
+
+
+def record_changes(operation, prompt_ids):
+    """
+    在当前事务中追加变更记录
+
+    Args:
+        operation: insert / update / delete
+        prompt_ids: 词条id列表
+    """
+    rows = [{'operation': operation, 'prompt_id': pid} for pid in prompt_ids]
+    if not rows:
+        return
+    db.session.execute(ChangeLog.__table__.insert(), rows)
+    _maybe_prune(len(rows))
+
+
+def record_category_change(category_id, name, previous_name):
+    """
+    在当前事务中追加分类变更记录（重命名或合并），不论分类下有多少词条都只有一条
+
+    Args:
+        category_id: 词条现在所属分类的id
+        name: 词条现在所属分类的名称
+        previous_name: 原分类名称
+    """
+    db.session.execute(
+        ChangeLog.__table__.insert(),
+        [{
+            'operation': OP_CATEGORY,
+            'prompt_id': None,
+            'category_id': category_id,
+            'category': name,
+            'previous_category': previous_name
+        }]
+    )
+    _maybe_prune(1)
+
+
+def record_reset(previous_version=0):
+    """
+    在当前事务中追加整体替换记录
+
+    整库恢复后日志表来自上传的文件，版本号可能比恢复前更小，
+    这里显式使用不小于恢复前的版本号，保证版本单调递增。
+
+    Args:
+        previous_version: 替换前的最大版本号
+    """
+    version = max(previous_version, latest_version()) + 1
+    db.session.execute(
+        ChangeLog.__table__.insert(),
+        [{'version': version, 'operation': OP_RESET, 'prompt_id': None}]
+    )
+
+
+def append_entries(entries):
+    """
+    在当前事务中按原版本号追加变更记录（从节点复制主节点日志时使用），
+    与主节点一样按 CHANGE_LOG_RETENTION 清理旧记录
+
+    Args:
+        entries: 主节点 /changes 返回的变更字典列表
+    """
+    rows = [
+        {
+            'version': e['version'],
+            'operation': e['operation'],
+            'prompt_id': e.get('prompt_id'),
+            'timestamp': parse_timestamp(e.get('timestamp')) or datetime.utcnow(),
+            'category_id': e.get('category_id'),
+            'category': e.get('category'),
+            'previous_category': e.get('previous_category')
+        }
+        for e in entries
+    ]
+    if rows:
+        previous = latest_version()
+        db.session.execute(ChangeLog.__table__.insert(), rows)
+        # 主节点的版本号可能不连续，按版本号的增量判断是否跨过清理点
+        _maybe_prune(max(row['version'] for row in rows) - previous)
+
+
+def parse_timestamp(value):
+    """解析接口返回的ISO时间字符串（去掉结尾的Z，返回naive UTC时间）"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.rstrip('Z'))
+
+
+def _maybe_prune(added):
+    """版本号每跨过 PRUNE_EVERY 的整数倍时清理超出保留数量的旧记录"""
+    if Config.CHANGE_LOG_RETENTION <= 0:
+        return
+    version = latest_version()
+    if version // PRUNE_EVERY != (version - added) // PRUNE_EVERY:
+        ChangeLog.query.filter(
+            ChangeLog.version <= version - Config.CHANGE_LOG_RETENTION
+        ).delete(synchronize_session=False)
+
+
+def get_changes(since, limit):
+    """
+    读取 since 之后的变更，附带新增/更新词条的当前数据
+
+    Returns:
+        (changes, has_more) 元组
+    """
+    entries = ChangeLog.query.filter(ChangeLog.version > since) \
+        .order_by(ChangeLog.version.asc()).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    upsert_ids = list({e.prompt_id for e in entries if e.operation in (OP_INSERT, OP_UPDATE)})
+    prompts = {}
+    for i in range(0, len(upsert_ids), ID_CHUNK_SIZE):
+        for prompt in Prompt.query.filter(Prompt.id.in_(upsert_ids[i:i + ID_CHUNK_SIZE])):
+            prompts[prompt.id] = prompt.to_dict()
+
+    changes = []
+    for entry in entries:
+        item = entry.to_dict()
+        if entry.operation in (OP_INSERT, OP_UPDATE):
+            # 词条之后被删除时为None，后续会有对应的delete记录
+            item['prompt'] = prompts.get(entry.prompt_id)
+        changes.append(item)
+    return changes, has_more
+
+
+class ChangeFeed:
+    """在内存中跟踪最新版本号，供长轮询等待而不访问数据库"""
+
+    def __init__(self):
+        self.app = None
+        self.version = 0
+        self._cond = threading.Condition()
+        self._async_waiters = {}  # Future -> (事件循环, since)
+
+    def init_app(self, app):
+        """注册到应用：读取当前版本并订阅词条变更"""
+        self.app = app
+        app.extensions['change_feed'] = self
+        prompts_changed.connect(self._on_prompts_changed, sender=app, weak=False)
+        with app.app_context():
+            self.version = latest_version()
+
+    def _on_prompts_changed(self, sender, library=None, **kwargs):
+        # 词条库有各自的变更日志，变更订阅只跟随主词条库
+        if library is None:
+            self.refresh()
+
+    def refresh(self):
+        """从数据库读取最新版本并唤醒等待中的请求（需在应用上下文中调用）"""
+        version = latest_version()
+        with self._cond:
+            self.version = version
+            self._cond.notify_all()
+            for future, (loop, since) in list(self._async_waiters.items()):
+                if version > since:
+                    del self._async_waiters[future]
+                    loop.call_soon_threadsafe(_wake, future)
+
+    def wait(self, since, timeout):
+        """
+        等待版本号超过 since
+
+        Returns:
+            是否有新变更
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version > since, timeout=timeout)
+
+    async def wait_async(self, since, timeout):
+        """
+        在事件循环中等待版本号超过 since，等待期间不占用线程
+
+        Returns:
+            是否有新变更
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self.version > since:
+                return True
+            self._async_waiters[future] = (loop, since)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.pop(future, None)
+        return self.version > since
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+change_feed = ChangeFeed()
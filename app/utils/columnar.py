@@ -0,0 +1,73 @@
+"""
+列式响应格式
+列表接口传入 format=columnar 时，只发送一次列名，每行为数组；时间转为毫秒时间戳，
+重复度高的列（分类、操作类型）用字典编码为下标。static/js/app.js 中的 decodeColumnar 负责还原
+"""
+import calendar
+
+FORMATS = ('json', 'columnar')
+
+PROMPT_COLUMNS = ('id', 'category', 'name', 'translation', 'comment', 'created_at', 'updated_at')
+HISTORY_COLUMNS = ('id', 'operation', 'filename', 'imported_count', 'timestamp')
+
+
+def epoch_ms(value):
+    """naive UTC时间转为毫秒时间戳"""
+    if value is None:
+        return None
+    return calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+
+
+def encode_columnar(columns, rows, dictionary=(), timestamps=()):
+    """
+    把行元组编码为列式结构
+
+    Args:
+        columns: 列名
+        rows: 与列名顺序一致的值序列
+        dictionary: 需要字典编码的列
+        timestamps: 需要转为毫秒时间戳的列
+
+    Returns:
+        {'format', 'columns', 'dictionaries', 'timestamps', 'rows'}
+    """
+    dict_index = {columns.index(name): {} for name in dictionary}
+    time_index = [columns.index(name) for name in timestamps]
+
+    encoded = []
+    for row in rows:
+        row = list(row)
+        for i in time_index:
+            row[i] = epoch_ms(row[i])
+        for i, values in dict_index.items():
+            if row[i] is not None:
+                row[i] = values.setdefault(row[i], len(values))
+        encoded.append(row)
+
+    return {
+        'format': 'columnar',
+        'columns': list(columns),
+        'dictionaries': {columns[i]: list(values) for i, values in dict_index.items()},
+        'timestamps': list(timestamps),
+        'rows': encoded
+    }
+
+
+def encode_prompts(prompts):
+    """词条列表的列式编码"""
+    return encode_columnar(
+        PROMPT_COLUMNS,
+        ((p.id, p.category, p.name, p.translation, p.comment, p.created_at, p.updated_at) for p in prompts),
+        dictionary=('category',),
+        timestamps=('created_at', 'updated_at')
+    )
+
+
+def encode_history(history):
+    """恢复历史记录的列式编码"""
+    return encode_columnar(
+        HISTORY_COLUMNS,
+        ((h.id, h.operation, h.filename, h.imported_count, h.timestamp) for h in history),
+        dictionary=('operation',),
+        timestamps=('timestamp',)
+    )
@@ -0,0 +1,110 @@
+"""
+响应压缩
+根据 Accept-Encoding 协商，用标准库对较大的文本/JSON响应做 gzip 或 deflate 压缩；
+文件下载、流式响应和已经编码过的响应保持原样
+"""
+import gzip
+import zlib
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+# 优先级从高到低
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+
+def parse_accept_encoding(header):
+    """
+    解析 Accept-Encoding 头
+
+    Returns:
+        {编码: q值}，q=0 的编码表示客户端明确拒绝
+    """
+    weights = {}
+    for part in (header or '').split(','):
+        fields = part.strip().split(';')
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def choose_encoding(header):
+    """选出客户端接受且q值最高的压缩编码，没有可用编码时返回None"""
+    weights = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+class Compressor:
+    """响应压缩中间件"""
+
+    def __init__(self):
+        self.app = None
+        self.min_size = 1024
+        self.level = 6
+
+    def init_app(self, app):
+        """按配置注册响应钩子"""
+        self.app = app
+        app.extensions['compressor'] = self
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.level = min(max(int(app.config['COMPRESSION_LEVEL']), 1), 9)
+
+        if app.config['COMPRESSION_ENABLED']:
+            app.after_request(self._compress_response)
+
+    @staticmethod
+    def _compressible(response):
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+    def _compress_response(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or not 200 <= response.status_code < 300 or response.status_code == 204
+                or 'Content-Encoding' in response.headers
+                or not self._compressible(response)):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.set_data(compress(data, encoding, self.level))
+        response.headers['Content-Encoding'] = encoding
+        # 压缩后的内容与原始内容不同，强ETag需要区分
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f'{etag}-{encoding}')
+        return response
+
+
+compressor = Compressor()
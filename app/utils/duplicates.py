@@ -0,0 +1,271 @@
+"""
+近似重复词条检测
+对每个词条规范化后的标签集合计算MinHash签名，按LSH分段（band）哈希后写入 prompt_signatures 表；
+标签集合的Jaccard相似度越高，至少一段签名落入同一个桶的概率越大。查找重复时只比较同桶的词条，
+不必两两比较全部词条；候选对再用实际标签集合的Jaccard相似度确认
+"""
+import random
+import hashlib
+from functools import lru_cache
+from itertools import groupby
+from sqlalchemy import func, tuple_
+from app.models import db, Prompt, PromptTag, PromptSignature
+
+# 签名由 NUM_BANDS 段、每段 BAND_ROWS 个最小哈希组成；相似度约 (1/NUM_BANDS)^(1/BAND_ROWS) ≈ 0.59 以上的词条大概率同桶
+NUM_BANDS = 8
+BAND_ROWS = 4
+NUM_PERM = NUM_BANDS * BAND_ROWS
+
+_PRIME = (1 << 61) - 1
+_MASK63 = (1 << 63) - 1
+# 固定种子：签名写入数据库，不同进程、重启前后必须使用相同的哈希函数
+_rng = random.Random(20250207)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+TAG_CACHE_SIZE = 65536
+ID_CHUNK_SIZE = 500
+REBUILD_BATCH_SIZE = 1000
+# 单次查找最多确认的候选对数，超出时结果标记为不完整
+MAX_COMPARISONS = 2000000
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def _tag_hashes(tag):
+    """一个标签在各个哈希函数下的值"""
+    h = int.from_bytes(hashlib.blake2b(tag.encode('utf-8'), digest_size=8).digest(), 'little')
+    return tuple((a * h + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def band_buckets(tags):
+    """
+    计算标签集合各段签名的桶值
+
+    Args:
+        tags: 已规范化的标签列表
+
+    Returns:
+        长度为 NUM_BANDS 的桶值列表；没有标签时为空列表
+    """
+    if not tags:
+        return []
+    signature = list(map(min, zip(*map(_tag_hashes, tags))))
+    buckets = []
+    for band in range(NUM_BANDS):
+        value = 0
+        for h in signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]:
+            value = (value * 1000003 ^ h) & _MASK63
+        buckets.append(value)
+    return buckets
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _chunks(items, size=ID_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def remove_signatures(ids):
+    """在当前事务中删除指定词条的签名"""
+    for chunk in _chunks(ids):
+        PromptSignature.query.filter(PromptSignature.prompt_id.in_(chunk)).delete(synchronize_session=False)
+
+
+def add_signatures(tags_by_id):
+    """
+    在当前事务中写入签名（调用方已删除旧签名）
+
+    Args:
+        tags_by_id: {词条id: 规范化的标签列表}
+    """
+    rows = [
+        {'prompt_id': prompt_id, 'band': band, 'bucket': bucket}
+        for prompt_id, tags in tags_by_id.items()
+        for band, bucket in enumerate(band_buckets(tags))
+    ]
+    if rows:
+        db.session.execute(PromptSignature.__table__.insert(), rows)
+
+
+def rebuild_signatures():
+    """
+    在当前事务中根据 prompt_tags 表重建全部签名
+
+    Returns:
+        写入签名的词条数
+    """
+    PromptSignature.query.delete(synchronize_session=False)
+
+    total = 0
+    batch = {}
+    rows = db.session.query(PromptTag.prompt_id, PromptTag.tag) \
+        .order_by(PromptTag.prompt_id).yield_per(REBUILD_BATCH_SIZE)
+    for prompt_id, group in groupby(rows, key=lambda row: row[0]):
+        batch[prompt_id] = [tag for _, tag in group]
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            add_signatures(batch)
+            total += len(batch)
+            batch = {}
+    add_signatures(batch)
+    return total + len(batch)
+
+
+def ensure_signatures():
+    """启动时检查签名，有标签但签名为空时重建"""
+    has_tags = db.session.query(PromptTag.prompt_id).first() is not None
+    has_signatures = db.session.query(PromptSignature.prompt_id).first() is not None
+    if has_tags and not has_signatures:
+        rebuild_signatures()
+        db.session.commit()
+
+
+def _load_tags(ids, category=None):
+    """读取可见词条的标签集合（已软删除的词条不返回）"""
+    tags = {}
+    for chunk in _chunks(ids):
+        query = db.session.query(PromptTag.prompt_id, PromptTag.tag) \
+            .join(Prompt, Prompt.id == PromptTag.prompt_id) \
+            .filter(PromptTag.prompt_id.in_(chunk))
+        if category:
+            query = query.filter(Prompt.category == category)
+        for prompt_id, tag in query:
+            tags.setdefault(prompt_id, set()).add(tag)
+    return {prompt_id: frozenset(t) for prompt_id, t in tags.items()}
+
+
+class _DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent.get(x, x)
+        return root
+
+    def union(self, a, b):
+        self.parent[self.find(b)] = self.find(a)
+
+
+def find_duplicates(threshold=0.8, category=None, limit=50):
+    """
+    查找近似重复的词条组（需在应用上下文中调用）
+
+    同桶的词条逐个与桶内已出现的各组的代表词条比较，达到阈值的并入该组；已在同一组中的不再比较，
+    大量完全相同的词条落在同一个桶时比较次数只与词条数成正比
+
+    Args:
+        threshold: 标签集合Jaccard相似度阈值（0-1]
+        category: 只在该分类内查找
+        limit: 返回的组数上限（按组大小降序）
+
+    Returns:
+        {'groups': [{'prompts': [...], 'pairs': [...]}], 'group_count', 'candidate_buckets',
+         'compared_pairs', 'complete'}
+    """
+    buckets = []
+    query = db.session.query(func.group_concat(PromptSignature.prompt_id)) \
+        .group_by(PromptSignature.band, PromptSignature.bucket) \
+        .having(func.count(PromptSignature.prompt_id) > 1)
+    for (members,) in query:
+        buckets.append(sorted(int(i) for i in members.split(',')))
+
+    tags = _load_tags({i for members in buckets for i in members}, category)
+    groups = _DisjointSet()
+    edges = []
+    compared = 0
+    complete = True
+    for members in buckets:
+        representatives = []
+        for b in members:
+            if b not in tags:
+                continue
+            root = groups.find(b)
+            if any(groups.find(a) == root for a in representatives):
+                continue
+            matched = False
+            for a in representatives:
+                if compared >= MAX_COMPARISONS:
+                    complete = False
+                    break
+                compared += 1
+                similarity = jaccard(tags[a], tags[b])
+                if similarity >= threshold:
+                    groups.union(a, b)
+                    edges.append((a, b, similarity))
+                    matched = True
+            if not complete:
+                break
+            if not matched:
+                representatives.append(b)
+        if not complete:
+            break
+
+    members_by_root = {}
+    for a, b, _ in edges:
+        for prompt_id in (a, b):
+            members_by_root.setdefault(groups.find(prompt_id), set()).add(prompt_id)
+    ranked = sorted(members_by_root.values(), key=lambda m: (-len(m), min(m)))
+
+    selected = ranked[:limit]
+    wanted = {i for members in selected for i in members}
+    prompts = {p.id: p for chunk in _chunks(wanted) for p in Prompt.query.filter(Prompt.id.in_(chunk))}
+    pairs_by_root = {}
+    for a, b, similarity in edges:
+        if a in wanted:
+            pairs_by_root.setdefault(groups.find(a), []).append(
+                {'ids': [a, b], 'similarity': round(similarity, 4)}
+            )
+
+    return {
+        'groups': [
+            {
+                'prompts': [prompts[i].to_dict() for i in sorted(members) if i in prompts],
+                'pairs': pairs_by_root.get(groups.find(min(members)), [])
+            }
+            for members in selected
+        ],
+        'group_count': len(ranked),
+        'candidate_buckets': len(buckets),
+        'compared_pairs': compared,
+        'complete': complete
+    }
+
+
+def similar_prompts(tags, threshold=0.8, limit=10, exclude_id=None):
+    """
+    查找与给定标签集合相似的已有词条（需在应用上下文中调用）
+
+    Args:
+        tags: 已规范化的标签列表
+
+    Returns:
+        [(Prompt, 相似度), ...] 按相似度降序
+    """
+    buckets = band_buckets(tags)
+    if not buckets:
+        return []
+    candidate_ids = {
+        prompt_id for (prompt_id,) in db.session.query(PromptSignature.prompt_id)
+        .filter(tuple_(PromptSignature.band, PromptSignature.bucket).in_(list(enumerate(buckets))))
+    }
+    candidate_ids.discard(exclude_id)
+
+    target = frozenset(tags)
+    scored = [
+        (prompt_id, jaccard(target, candidate))
+        for prompt_id, candidate in _load_tags(candidate_ids).items()
+    ]
+    scored = sorted((s for s in scored if s[1] >= threshold), key=lambda s: (-s[1], s[0]))[:limit]
+    if not scored:
+        return []
+    prompts = {p.id: p for p in Prompt.query.filter(Prompt.id.in_([i for i, _ in scored]))}
+    return [(prompts[i], similarity) for i, similarity in scored if i in prompts]
@@ -0,0 +1,177 @@
+"""
+导出文件缓存
+导出的CSV和数据库文件按 (格式, 分类筛选, 数据版本) 保存在缓存目录中，数据未变化时重复导出直接发送已有文件；
+目录总大小和文件数有上限，超出时删除最久未使用的文件，数据版本变化后旧版本的文件不会再命中，生成新文件时一并删除
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import func
+from app.models import db, BackupHistory
+from app.utils.changes import latest_version
+from app.utils.bulk_delete import purge_worker
+
+logger = logging.getLogger(__name__)
+
+
+def data_version():
+    """
+    当前数据版本（需在应用上下文中调用）
+
+    由变更记录的最大版本号、待清理的软删除词条数和备份历史的最大id组成，任一写操作都会使其变化
+    """
+    history = db.session.query(func.max(BackupHistory.id)).scalar() or 0
+    return f'{latest_version()}.{purge_worker.pending_count()}.{history}'
+
+
+class ExportArtifact:
+    """缓存中的一个导出文件"""
+    __slots__ = ('key', 'path', 'size', 'etag', 'created_at')
+
+    def __init__(self, key, path, size, etag):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.created_at = datetime.now()
+
+
+class ExportCache:
+    """有界的导出文件缓存"""
+
+    def __init__(self):
+        self.app = None
+        self.directory = None
+        self.max_bytes = 256 * 1024 * 1024
+        self.max_files = 32
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> ExportArtifact
+        self._bytes = 0
+        self._building = {}            # key -> 生成中的 Event，同一文件只生成一次
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """按配置设置容量并清理上次运行留下的文件（索引只在内存中）"""
+        self.app = app
+        app.extensions['export_cache'] = self
+        self.directory = app.config['EXPORT_CACHE_DIR']
+        self.max_bytes = app.config['EXPORT_CACHE_MAX_BYTES']
+        self.max_files = app.config['EXPORT_CACHE_MAX_FILES']
+        os.makedirs(self.directory, exist_ok=True)
+        for filename in os.listdir(self.directory):
+            self._remove_file(os.path.join(self.directory, filename))
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.max_files > 0
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            # 文件仍在发送中（Windows）时删除失败，下次启动时清理
+            pass
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha1('\0'.join(key).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{self._digest(key)[:20]}.{key[0]}')
+
+    def _discard(self, entry):
+        del self._entries[entry.key]
+        self._bytes -= entry.size
+        self._remove_file(entry.path)
+
+    def _add(self, entry):
+        """登记新文件，删除旧版本的文件，再按容量淘汰最久未使用的（新文件本身保留）"""
+        fmt, category, version = entry.key
+        for old in list(self._entries.values()):
+            if old.key[:2] == (fmt, category) and old.key[2] != version:
+                self._discard(old)
+        self._entries[entry.key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > 1 and (len(self._entries) > self.max_files or self._bytes > self.max_bytes):
+            self._discard(next(iter(self._entries.values())))
+            self.evictions += 1
+
+    def get(self, fmt, category, build):
+        """
+        取得导出文件，缓存中没有当前数据版本的文件时调用 build 生成（需在应用上下文中调用）
+
+        Args:
+            fmt: 导出格式（同时作为文件扩展名）
+            category: 分类筛选，无筛选时为空字符串
+            build: build(path) 把导出内容写入 path
+
+        Returns:
+            (ExportArtifact, 是否命中缓存)；未启用缓存时返回的文件由调用方在发送后删除
+        """
+        version = data_version()
+        key = (fmt, category, version)
+
+        if not self.enabled:
+            path = self._path(key) + f'.{threading.get_ident()}.{time.monotonic_ns()}'
+            build(path)
+            return ExportArtifact(key, path, os.path.getsize(path), None), False
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and os.path.exists(entry.path):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry, True
+                if entry is not None:
+                    self._discard(entry)
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 其他请求正在生成同一文件，等待后直接使用
+            building.wait()
+
+        try:
+            path = self._path(key)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            try:
+                build(tmp_path)
+                os.replace(tmp_path, path)
+            except Exception:
+                self._remove_file(tmp_path)
+                raise
+            entry = ExportArtifact(key, path, os.path.getsize(path), self._digest(key))
+            with self._lock:
+                self._add(entry)
+            logger.info('已生成导出文件: %s（%d字节）', os.path.basename(path), entry.size)
+            return entry, False
+        finally:
+            with self._lock:
+                self._building.pop(key).set()
+
+    def stats(self):
+        """缓存的文件与命中率"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'files': len(self._entries),
+                'max_files': self.max_files,
+                'size_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions
+            }
+
+
+export_cache = ExportCache()
@@ -0,0 +1,149 @@
+"""
+词条JSON片段缓存
+缓存每个词条序列化后的JSON片段，键为 (id, updated_at)，写操作后失效；
+列表页只查询当前页的 (id, updated_at)，命中的行直接拼接片段，未命中的行一次查询补齐
+"""
+import sys
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.models import Prompt
+from app.utils.signals import prompts_changed, categories_changed
+
+# 每个条目除片段本身外的大致开销（键元组、OrderedDict节点）
+ENTRY_OVERHEAD = 200
+
+
+def encode_row(prompt):
+    """与 jsonify 一致的紧凑、键排序编码"""
+    return current_app.json.dumps(prompt.to_dict(), separators=(',', ':'))
+
+
+class FragmentCache:
+    """有界LRU片段缓存"""
+
+    def __init__(self):
+        self.app = None
+        self.max_entries = 20000
+        self.max_bytes = 32 * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0           # 整体失效时递增，丢弃失效前开始加载的片段
+        self._entries = OrderedDict()  # (id, updated_at) -> 片段
+        self._keys = {}                # id -> 当前缓存的键
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """按配置设置容量并订阅变更"""
+        self.app = app
+        app.extensions['fragment_cache'] = self
+        self.max_entries = app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+        self.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+        prompts_changed.connect(self._on_prompts_changed, sender=app, weak=False)
+        categories_changed.connect(self._on_categories_changed, sender=app, weak=False)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def _size(fragment):
+        return sys.getsizeof(fragment) + ENTRY_OVERHEAD
+
+    def _discard(self, prompt_id):
+        key = self._keys.pop(prompt_id, None)
+        if key is not None:
+            self._bytes -= self._size(self._entries.pop(key))
+
+    def _put(self, key, fragment):
+        self._discard(key[0])
+        self._entries[key] = fragment
+        self._keys[key[0]] = key
+        self._bytes += self._size(fragment)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            old_key, old = self._entries.popitem(last=False)
+            del self._keys[old_key[0]]
+            self._bytes -= self._size(old)
+            self.evictions += 1
+
+    def fragments(self, rows):
+        """
+        返回一页词条的JSON片段（需在应用上下文中调用）
+
+        Args:
+            rows: 按页内顺序排列的 (id, updated_at) 元组
+
+        Returns:
+            片段列表，顺序与 rows 一致；期间被删除的词条会被跳过
+        """
+        keys = [tuple(row) for row in rows]
+        result = {}  # id -> 片段
+        missing = []
+        with self._lock:
+            generation = self._generation
+            for key in keys:
+                fragment = self._entries.get(key)
+                if fragment is None:
+                    missing.append(key[0])
+                else:
+                    self._entries.move_to_end(key)
+                    result[key[0]] = fragment
+            self.hits += len(result)
+            self.misses += len(missing)
+
+        if missing:
+            # 两次查询之间词条可能被更新，只按id匹配，片段按实际读到的 updated_at 缓存
+            loaded = {}
+            for prompt in Prompt.query.filter(Prompt.id.in_(missing)):
+                fragment = encode_row(prompt)
+                loaded[(prompt.id, prompt.updated_at)] = fragment
+                result[prompt.id] = fragment
+            if self.enabled:
+                with self._lock:
+                    if generation == self._generation:
+                        for key, fragment in loaded.items():
+                            self._put(key, fragment)
+
+        return [result[key[0]] for key in keys if key[0] in result]
+
+    def _on_prompts_changed(self, sender, upserted=(), deleted=(), reset=False, library=None):
+        if library is not None:
+            return
+        with self._lock:
+            if reset:
+                self._clear()
+                return
+            for prompt in upserted:
+                self._discard(prompt.id)
+            for prompt_id in deleted:
+                self._discard(prompt_id)
+
+    def _on_categories_changed(self, sender):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._keys.clear()
+        self._bytes = 0
+
+    def stats(self):
+        """命中率与内存占用"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+fragment_cache = FragmentCache()
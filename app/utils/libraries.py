@@ -0,0 +1,239 @@
+"""
+多词条库
+每个词条库是 LIBRARY_DIR 下的一个SQLite文件，通过 /api/v1/libraries/<name>/... 访问。
+引擎在首次访问时打开并放入有界LRU，长时间未访问的由后台任务关闭，进程内存只与活跃的词条库数量有关
+"""
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import create_engine
+from flask_sqlalchemy.session import Session
+from app.models import db
+from app.utils.background import background_enabled, PeriodicWorker
+from app.utils.migrate import prepare_database
+
+logger = logging.getLogger(__name__)
+
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+SUFFIX = '.db'
+# 删除词条库时一并删除的SQLite附属文件
+SIDE_FILES = ('-journal', '-wal', '-shm')
+
+
+class LibraryNotFound(LookupError):
+    """词条库不存在"""
+
+
+class LibraryBusy(RuntimeError):
+    """词条库正在使用中"""
+
+
+class LibrarySession(Session):
+    """绑定到词条库引擎的会话（Flask-SQLAlchemy 的会话总是选择主数据库）"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return bind if bind is not None else self.bind
+
+
+class _OpenLibrary:
+    __slots__ = ('name', 'engine', 'in_use', 'last_used')
+
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class LibraryRegistry:
+    """词条库目录与已打开引擎的LRU"""
+
+    def __init__(self):
+        self.app = None
+        self.directory = None
+        self.max_open = 16
+        self.idle_seconds = 300
+        self.opened = 0
+        self.evicted = 0
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def init_app(self, app):
+        """创建词条库目录并启动空闲引擎回收"""
+        self.app = app
+        app.extensions['libraries'] = self
+        self.directory = app.config['LIBRARY_DIR']
+        self.max_open = max(int(app.config['LIBRARY_MAX_OPEN']), 1)
+        self.idle_seconds = max(float(app.config['LIBRARY_IDLE_SECONDS']), 1)
+        os.makedirs(self.directory, exist_ok=True)
+
+        if background_enabled(app):
+            self._worker = PeriodicWorker('library-evict', min(self.idle_seconds, 60), self.evict_idle)
+            self._worker.start()
+
+    @staticmethod
+    def valid_name(name):
+        return bool(NAME_PATTERN.match(name or ''))
+
+    def path(self, name):
+        return os.path.join(self.directory, name + SUFFIX)
+
+    def exists(self, name):
+        return self.valid_name(name) and os.path.isfile(self.path(name))
+
+    def list_all(self):
+        """全部词条库：名称、文件大小、是否已打开"""
+        with self._lock:
+            open_names = set(self._open)
+        result = []
+        for filename in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(filename)
+            if ext != SUFFIX or not self.valid_name(name):
+                continue
+            result.append({
+                'name': name,
+                'size': os.path.getsize(os.path.join(self.directory, filename)),
+                'open': name in open_names
+            })
+        return result
+
+    def create(self, name):
+        """
+        新建空词条库（需在应用上下文中调用）
+
+        Raises:
+            FileExistsError: 同名词条库已存在
+        """
+        with self._lock:
+            if os.path.exists(self.path(name)):
+                raise FileExistsError(name)
+            self._open_engine(name)
+
+    def delete(self, name):
+        """
+        删除词条库文件
+
+        Raises:
+            LibraryNotFound: 不存在
+            LibraryBusy: 有请求正在使用
+        """
+        with self._lock:
+            if not self.exists(name):
+                raise LibraryNotFound(name)
+            entry = self._open.get(name)
+            if entry is not None:
+                if entry.in_use:
+                    raise LibraryBusy(name)
+                self._close(entry)
+            path = self.path(name)
+            os.remove(path)
+            for suffix in SIDE_FILES:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def _open_engine(self, name):
+        engine = create_engine('sqlite:///' + self.path(name))
+        try:
+            prepare_database(engine)
+        except Exception:
+            engine.dispose()
+            raise
+        entry = _OpenLibrary(name, engine)
+        self._open[name] = entry
+        self.opened += 1
+        self._evict_over_capacity()
+        return entry
+
+    def _close(self, entry):
+        del self._open[entry.name]
+        entry.engine.dispose()
+
+    def _evict_over_capacity(self):
+        # 从最久未使用的开始关闭；正在使用的跳过，全部在使用时允许暂时超出上限
+        for entry in list(self._open.values()):
+            if len(self._open) <= self.max_open:
+                break
+            if not entry.in_use:
+                self._close(entry)
+                self.evicted += 1
+
+    def _acquire(self, name):
+        with self._lock:
+            entry = self._open.get(name)
+            if entry is None:
+                if not self.exists(name):
+                    raise LibraryNotFound(name)
+                entry = self._open_engine(name)
+            self._open.move_to_end(name)
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    @contextmanager
+    def session(self, name):
+        """
+        在当前应用上下文中把 db.session 切换到指定词条库（需在应用上下文中调用）
+
+        期间模型查询与写入都作用于该词条库；退出时关闭会话并恢复为主数据库。
+        当前已是该词条库的会话时（例如词条库接口中直接执行的写操作）沿用当前会话
+
+        Raises:
+            LibraryNotFound: 不存在
+        """
+        entry = self._acquire(name)
+        current = db.session.registry() if db.session.registry.has() else None
+        if isinstance(current, LibrarySession) and current.bind is entry.engine:
+            try:
+                yield entry
+            finally:
+                self._release(entry)
+            return
+
+        db.session.remove()
+        options = {**db.session.session_factory.kw, 'bind': entry.engine}
+        db.session.registry.set(LibrarySession(**options))
+        try:
+            yield entry
+        finally:
+            db.session.remove()
+            self._release(entry)
+
+    def evict_idle(self):
+        """关闭超过空闲时间未访问的引擎"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [e for e in self._open.values() if not e.in_use and e.last_used < cutoff]
+            for entry in idle:
+                self._close(entry)
+                self.evicted += 1
+        if idle:
+            logger.info('已关闭%d个空闲词条库: %s', len(idle), ', '.join(e.name for e in idle))
+
+    def status(self):
+        """已打开的词条库与打开、回收次数"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'max_open': self.max_open,
+                'idle_seconds': self.idle_seconds,
+                'opened': self.opened,
+                'evicted': self.evicted,
+                'open': [
+                    {'name': e.name, 'in_use': e.in_use, 'idle': round(now - e.last_used, 1)}
+                    for e in reversed(self._open.values())
+                ]
+            }
+
+
+libraries = LibraryRegistry()
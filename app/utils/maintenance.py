@@ -0,0 +1,232 @@
+"""
+数据库维护
+空闲时定期执行 PRAGMA optimize / ANALYZE、WAL检查点和增量回收空闲页，
+每次维护有时间预算，有请求到来时停止；也可以通过接口手动触发
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from flask import g, request
+from app.models import db
+from app.config import Config
+from app.utils.background import PeriodicWorker, background_enabled
+from app.utils.changes import latest_version
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+# 长轮询请求大部分时间在等待，不算作活动请求
+PASSIVE_ENDPOINTS = {'changes.get_change_feed'}
+# 距上次ANALYZE的变更数超过总行数的这个比例时重新收集统计信息
+ANALYZE_CHANGE_RATIO = 0.1
+ANALYSIS_LIMIT = 1000
+
+
+def _autocommit_connection(engine=None):
+    """VACUUM等语句不能在事务中执行，使用自动提交连接"""
+    return (engine or db.engine).connect().execution_options(isolation_level='AUTOCOMMIT')
+
+
+def _pragma(conn, name):
+    return conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+
+def enable_incremental_vacuum(engine=None):
+    """把数据库切换为增量回收模式（需要重建文件，新建的空库开销很小）"""
+    with _autocommit_connection(engine) as conn:
+        conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.exec_driver_sql('VACUUM')
+
+
+def database_stats():
+    """数据库文件的页数、空闲页比例等碎片统计（需在应用上下文中调用）"""
+    with db.engine.connect() as conn:
+        page_count = _pragma(conn, 'page_count') or 0
+        freelist_count = _pragma(conn, 'freelist_count') or 0
+        page_size = _pragma(conn, 'page_size') or 0
+        auto_vacuum = _pragma(conn, 'auto_vacuum')
+        journal_mode = _pragma(conn, 'journal_mode')
+    return {
+        'page_count': page_count,
+        'page_size': page_size,
+        'freelist_count': freelist_count,
+        'freelist_ratio': round(freelist_count / page_count, 4) if page_count else 0.0,
+        'reclaimable_size': freelist_count * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+        'journal_mode': journal_mode
+    }
+
+
+class MaintenanceScheduler:
+    """数据库维护调度器"""
+
+    def __init__(self):
+        self.app = None
+        self.last_result = None
+        self.last_error = None
+        self._retry_soon = False
+        self._active_requests = 0
+        self._last_activity = time.monotonic()
+        self._analyzed_version = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._activity_lock = threading.Lock()
+
+    def init_app(self, app):
+        """注册请求活动跟踪，开启定期维护时启动后台线程"""
+        self.app = app
+        app.extensions['maintenance'] = self
+        app.before_request(self._request_started)
+        app.teardown_request(self._request_finished)
+
+        if app.config['MAINTENANCE_ENABLED'] and background_enabled(app):
+            self._worker = PeriodicWorker('maintenance', self._next_interval, self._run_scheduled, exclusive=True)
+            self._worker.start()
+
+    def _request_started(self):
+        if request.endpoint in PASSIVE_ENDPOINTS:
+            return
+        g.maintenance_tracked = True
+        with self._activity_lock:
+            self._active_requests += 1
+            self._last_activity = time.monotonic()
+
+    def _request_finished(self, exc=None):
+        # 被之前的 before_request 钩子拦截的请求没有计数
+        if not g.pop('maintenance_tracked', False):
+            return
+        with self._activity_lock:
+            self._active_requests = max(self._active_requests - 1, 0)
+            self._last_activity = time.monotonic()
+
+    def is_idle(self):
+        """没有进行中的请求，且距上次请求结束已超过 idle_seconds 秒"""
+        with self._activity_lock:
+            return self._active_requests == 0 and \
+                time.monotonic() - self._last_activity >= Config.MAINTENANCE_IDLE_SECONDS
+
+    def _next_interval(self):
+        # 上次因繁忙跳过时，隔一个空闲等待时间后重试
+        if self._retry_soon:
+            return max(float(Config.MAINTENANCE_IDLE_SECONDS), 1.0)
+        return max(float(Config.MAINTENANCE_INTERVAL_MINUTES), 0.1) * 60
+
+    def _run_scheduled(self):
+        with self.app.app_context():
+            self.run()
+
+    def run(self, force=False, full_vacuum=False, time_budget=None):
+        """
+        执行一次维护（需在应用上下文中调用）
+
+        Args:
+            force: 为True时不等待空闲，手动触发时使用
+            full_vacuum: 执行完整VACUUM（耗时与文件大小成正比，不受时间预算限制），
+                         同时把数据库切换为增量回收模式
+            time_budget: 时间预算（秒），默认使用配置
+
+        Returns:
+            维护结果字典，已有维护在进行中时返回None
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        try:
+            self._retry_soon = not force and not self.is_idle()
+            if self._retry_soon:
+                return {'skipped': True, 'steps': []}
+
+            budget = Config.MAINTENANCE_TIME_BUDGET if time_budget is None else time_budget
+            started = time.monotonic()
+            deadline = started + budget
+            steps = []
+            try:
+                before = database_stats()
+                with _autocommit_connection() as conn:
+                    self._optimize(conn, steps)
+                    if full_vacuum:
+                        conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+                        conn.exec_driver_sql('VACUUM')
+                        steps.append('vacuum')
+                    elif before['auto_vacuum'] == 'incremental' and before['freelist_count']:
+                        self._incremental_vacuum(conn, deadline, force, steps)
+                    if before['journal_mode'] == 'wal':
+                        conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+                        steps.append('wal_checkpoint')
+                after = database_stats()
+            except Exception as e:
+                logger.exception('数据库维护失败')
+                self.last_error = str(e)
+                return {'skipped': False, 'steps': steps, 'error': self.last_error}
+
+            duration = round(time.monotonic() - started, 3)
+            self.last_result = {
+                'finished_at': datetime.utcnow(),
+                'duration': duration,
+                'skipped': False,
+                'steps': steps,
+                'pages_freed': max(before['page_count'] - after['page_count'], 0),
+                'freelist_ratio': after['freelist_ratio']
+            }
+            self.last_error = None
+            logger.info('数据库维护完成: %s (释放%d页, %.3fs)',
+                        ', '.join(steps) or '无', self.last_result['pages_freed'], duration)
+            return self.last_result
+        finally:
+            self._lock.release()
+
+    def _optimize(self, conn, steps):
+        """首次或变更较多时执行ANALYZE，之后由 PRAGMA optimize 按需更新统计信息"""
+        version = latest_version()
+        has_stats = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).first() is not None
+        changed = version - (self._analyzed_version or 0)
+        row_count = conn.exec_driver_sql('SELECT COUNT(*) FROM prompts').scalar() or 0
+
+        if not has_stats or changed > max(row_count * ANALYZE_CHANGE_RATIO, 1):
+            # 限制每个索引的采样行数，大库上的ANALYZE也能在预算内完成
+            conn.exec_driver_sql(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+            conn.exec_driver_sql('ANALYZE')
+            steps.append('analyze')
+        else:
+            conn.exec_driver_sql('PRAGMA optimize')
+            steps.append('optimize')
+        self._analyzed_version = version
+
+    def _incremental_vacuum(self, conn, deadline, force, steps):
+        """按步回收空闲页，超出时间预算或有请求到来时停止"""
+        step_pages = max(int(Config.MAINTENANCE_VACUUM_STEP_PAGES), 1)
+        freed = 0
+        while time.monotonic() < deadline and (force or self.is_idle()):
+            remaining = _pragma(conn, 'freelist_count')
+            if not remaining:
+                break
+            # sqlite3 模块的 execute() 只单步执行这条PRAGMA（每次回收一页），executescript 会执行到底
+            conn.connection.driver_connection.executescript(
+                f'PRAGMA incremental_vacuum({min(step_pages, remaining)});'
+            )
+            freed += min(step_pages, remaining)
+        if freed:
+            steps.append(f'incremental_vacuum:{freed}')
+
+    def status(self):
+        """碎片统计与最近一次维护结果"""
+        result = self.last_result
+        data = database_stats()
+        data.update({
+            'maintenance_enabled': Config.MAINTENANCE_ENABLED,
+            'last_maintenance': None,
+            'last_maintenance_duration': None,
+            'last_maintenance_steps': [],
+            'last_maintenance_error': self.last_error
+        })
+        if result is not None:
+            data['last_maintenance'] = result['finished_at'].isoformat() + 'Z'
+            data['last_maintenance_duration'] = result['duration']
+            data['last_maintenance_steps'] = result['steps']
+        return data
+
+
+maintenance = MaintenanceScheduler()
@@ -0,0 +1,99 @@
+"""
+数据库结构迁移
+db.create_all() 只会创建缺失的表，已有表新增的列和索引在这里补齐
+"""
+import logging
+from sqlalchemy import inspect, text
+from app.models import db
+from app.utils.maintenance import enable_incremental_vacuum
+
+logger = logging.getLogger(__name__)
+
+# (表名, 列名, 列定义)
+COLUMN_MIGRATIONS = [
+    ('prompts', 'deleted_at', 'DATETIME'),
+    ('prompts', 'category_id', 'INTEGER REFERENCES categories (id)'),
+    ('change_log', 'category_id', 'INTEGER'),
+    ('change_log', 'category', 'VARCHAR(50)'),
+    ('change_log', 'previous_category', 'VARCHAR(50)'),
+]
+
+# (索引名, 建索引语句)
+INDEX_MIGRATIONS = [
+    ('ix_prompts_deleted_at', 'CREATE INDEX IF NOT EXISTS ix_prompts_deleted_at ON prompts (deleted_at)'),
+    ('ix_prompts_category_id', 'CREATE INDEX IF NOT EXISTS ix_prompts_category_id ON prompts (category_id)'),
+]
+
+# 回填 category_id 时每批更新的行数，每批一个短事务
+CATEGORY_BATCH_SIZE = 1000
+
+
+def prepare_database(engine=None):
+    """
+    创建缺失的表并补齐新增的列和索引（需在应用上下文中调用）
+
+    Args:
+        engine: 目标数据库，默认为主数据库
+    """
+    engine = engine or db.engine
+    is_new = not inspect(engine).get_table_names()
+    db.metadata.create_all(engine)
+    if is_new:
+        # 新建的数据库使用增量回收模式，删除产生的空闲页可由维护任务分批回收
+        enable_incremental_vacuum(engine)
+
+    inspector = inspect(engine)
+    applied = []
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMN_MIGRATIONS:
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+                applied.append(f'{table}.{column}')
+        for name, ddl in INDEX_MIGRATIONS:
+            conn.execute(text(ddl))
+
+    if 'category' in {c['name'] for c in inspect(engine).get_columns('prompts')}:
+        migrate_categories(engine=engine)
+        applied.append('prompts.category -> categories')
+
+    if applied:
+        logger.info('数据库结构已迁移: %s', ', '.join(applied))
+    return applied
+
+
+def migrate_categories(batch_size=CATEGORY_BATCH_SIZE, engine=None):
+    """
+    把旧版 prompts.category 字符串列迁移到 categories 表
+
+    先为每个分类名建一行，再按批回填 category_id（每批单独提交，中断后可继续），
+    最后删除旧列及其索引。
+    """
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        conn.execute(text(
+            'INSERT OR IGNORE INTO categories (name, created_at) '
+            'SELECT category, MIN(created_at) FROM prompts GROUP BY category'
+        ))
+
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text(
+                'UPDATE prompts SET category_id = '
+                '(SELECT id FROM categories WHERE categories.name = prompts.category) '
+                'WHERE id IN (SELECT id FROM prompts WHERE category_id IS NULL LIMIT :limit)'
+            ), {'limit': batch_size}).rowcount
+        if not count:
+            break
+        migrated += count
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for index in inspector.get_indexes('prompts'):
+            if 'category' in index['column_names']:
+                conn.execute(text(f'DROP INDEX IF EXISTS {index["name"]}'))
+        conn.execute(text('ALTER TABLE prompts DROP COLUMN category'))
+
+    logger.info('分类已迁移到categories表: %d条词条', migrated)
+    return migrated
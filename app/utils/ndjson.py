@@ -0,0 +1,277 @@
+"""
+NDJSON流式导入导出
+导出用服务端游标逐行输出；导入逐行解析请求体，按批upsert并逐批返回确认，
+两端内存占用与数据总量无关
+"""
+import json
+import time
+from sqlalchemy import or_
+from app.models import db, Prompt, Category
+from app.config import Config
+from app.utils.validators import validate_prompt_data
+from app.utils.tags import sync_prompt_tags
+from app.utils.changes import record_changes, parse_timestamp, OP_INSERT, OP_UPDATE
+from app.utils.write_queue import write_queue, WriteQueueFull, WriteResult
+
+MIMETYPE = 'application/x-ndjson'
+READ_CHUNK_SIZE = 64 * 1024
+INCLUDE_DELETED = {'include_deleted': True}
+# 写入队列已满时，一批最多重试的次数（每次间隔 retry_after 秒），导入不因短暂繁忙中断
+MAX_QUEUE_RETRIES = 10
+
+
+def dumps_line(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def _isoformat(value):
+    return value.isoformat() + 'Z' if value else None
+
+
+def export_lines(category=None, keyword=None, updated_since=None, after_id=None):
+    """
+    按id顺序逐行输出词条（需在请求上下文中迭代）
+
+    Args:
+        category: 分类
+        keyword: 关键词（匹配名称、译文、注释）
+        updated_since: 只输出此时间及之后更新的词条
+        after_id: 只输出id大于此值的词条，用于断点续传
+    """
+    query = db.session.query(
+        Prompt.id, Category.name, Prompt.name, Prompt.translation,
+        Prompt.comment, Prompt.created_at, Prompt.updated_at
+    ).join(Category, Category.id == Prompt.category_id)
+
+    if category:
+        query = query.filter(Category.name == category)
+    if keyword:
+        query = query.filter(or_(
+            Prompt.name.contains(keyword),
+            Prompt.translation.contains(keyword),
+            Prompt.comment.contains(keyword)
+        ))
+    if updated_since:
+        query = query.filter(Prompt.updated_at >= updated_since)
+    if after_id:
+        query = query.filter(Prompt.id > after_id)
+
+    rows = query.order_by(Prompt.id).execution_options(yield_per=Config.STREAM_BATCH_SIZE)
+    for pid, category_name, name, translation, comment, created_at, updated_at in rows:
+        yield dumps_line({
+            'id': pid,
+            'category': category_name,
+            'name': name,
+            'translation': translation,
+            'comment': comment or '',
+            'created_at': _isoformat(created_at),
+            'updated_at': _isoformat(updated_at)
+        })
+
+
+def iter_lines(stream):
+    """
+    从文件流中逐行读取（按块读取，不一次性载入请求体）
+
+    跨块的行先收集片段，遇到换行时拼接一次；超过 stream.max_line_size 字节的行不再收集，
+    丢弃到下一个换行为止并产出None
+    """
+    max_size = Config.STREAM_MAX_LINE_SIZE
+    pieces = []
+    size = 0
+    too_long = False
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        start = 0
+        end = chunk.find(b'\n')
+        while end >= 0:
+            if too_long or 0 < max_size < size + end - start:
+                yield None
+            elif pieces:
+                pieces.append(chunk[start:end])
+                yield b''.join(pieces)
+            else:
+                yield chunk[start:end]
+            pieces, size, too_long = [], 0, False
+            start = end + 1
+            end = chunk.find(b'\n', start)
+
+        if too_long or start == len(chunk):
+            continue
+        size += len(chunk) - start
+        if 0 < max_size < size:
+            pieces, too_long = [], True
+        else:
+            pieces.append(chunk[start:])
+    if too_long:
+        yield None
+    elif pieces:
+        yield b''.join(pieces)
+
+
+def parse_records(stream):
+    """
+    逐行解析NDJSON
+
+    Yields:
+        (行号, 词条字典或None, 错误信息或None)，空行跳过
+    """
+    for line_no, line in enumerate(iter_lines(stream), 1):
+        if line is None:
+            yield line_no, None, f'行超过{Config.STREAM_MAX_LINE_SIZE}字节'
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield line_no, None, f'JSON解析失败: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, '每行必须是JSON对象'
+            continue
+
+        is_valid, errors = validate_prompt_data(record)
+        if not is_valid:
+            yield line_no, None, '; '.join(f'{k}: {",".join(v)}' for k, v in errors.items())
+            continue
+        if record.get('id') is not None and (not isinstance(record['id'], int) or isinstance(record['id'], bool)):
+            yield line_no, None, 'id必须是整数'
+            continue
+        try:
+            record['created_at'] = parse_timestamp(record.get('created_at'))
+            record['updated_at'] = parse_timestamp(record.get('updated_at'))
+        except (ValueError, TypeError, AttributeError):
+            yield line_no, None, '时间必须是ISO 8601格式'
+            continue
+        yield line_no, record, None
+
+
+def _apply(prompt, record):
+    prompt.category = record['category']
+    prompt.name = record['name']
+    prompt.translation = record['translation']
+    prompt.comment = record.get('comment') or ''
+    prompt.deleted_at = None
+    if record['created_at']:
+        prompt.created_at = record['created_at']
+    if record['updated_at']:
+        prompt.updated_at = record['updated_at']
+
+
+def _chunks(items):
+    """按 DELETE_CHUNK_SIZE 切分IN列表，不超过SQLite的绑定变量上限"""
+    items = list(items)
+    size = max(int(Config.DELETE_CHUNK_SIZE), 1)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _upsert_records(records):
+    """写线程中执行：upsert一批词条"""
+    by_id = {}
+    for chunk in _chunks(r['id'] for r in records if r.get('id') is not None):
+        for p in Prompt.query.filter(Prompt.id.in_(chunk)).execution_options(**INCLUDE_DELETED):
+            by_id[p.id] = p
+
+    by_key = {}
+    for chunk in _chunks({r['name'] for r in records if r.get('id') is None}):
+        for p in Prompt.query.filter(Prompt.name.in_(chunk)):
+            by_key[(p.category, p.name)] = p
+
+    inserted, updated = [], []
+    seen = set()
+    for record in records:
+        if record.get('id') is not None:
+            prompt = by_id.get(record['id'])
+        else:
+            prompt = by_key.get((record['category'], record['name']))
+
+        if prompt is None:
+            prompt = Prompt(id=record.get('id'))
+            db.session.add(prompt)
+            inserted.append(prompt)
+            seen.add(id(prompt))
+        elif id(prompt) not in seen:
+            updated.append(prompt)
+            seen.add(id(prompt))
+
+        if prompt.id is not None:
+            by_id[prompt.id] = prompt
+        _apply(prompt, record)
+        by_key[(record['category'], record['name'])] = prompt
+
+    db.session.flush()
+    touched = inserted + updated
+    sync_prompt_tags(touched)
+    record_changes(OP_INSERT, [p.id for p in inserted])
+    record_changes(OP_UPDATE, [p.id for p in updated])
+    return WriteResult((len(inserted), len(updated)), upserted=touched)
+
+
+def upsert_batch(records):
+    """
+    经写队列在一个事务中upsert一批词条
+
+    带id的记录按id匹配（不存在时以该id插入），不带id的按（分类，名称）匹配，与CSV增量恢复一致
+
+    Returns:
+        (新增数, 更新数)
+    """
+    for attempt in range(MAX_QUEUE_RETRIES + 1):
+        try:
+            return write_queue.submit(_upsert_records, records)
+        except WriteQueueFull:
+            if attempt == MAX_QUEUE_RETRIES:
+                raise
+            time.sleep(write_queue.retry_after)
+
+
+def import_lines(stream):
+    """
+    逐行解析请求体并分批upsert（需在请求上下文中迭代）
+
+    Yields:
+        每批一行确认，最后一行为汇总（done为true）
+    """
+    batch_size = Config.STREAM_BATCH_SIZE
+    totals = {'received': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+    batch_no = 0
+    records, errors = [], []
+
+    def flush():
+        nonlocal records, errors, batch_no
+        batch_no += 1
+        inserted, updated = upsert_batch(records) if records else (0, 0)
+        totals['inserted'] += inserted
+        totals['updated'] += updated
+        ack = {
+            'batch': batch_no,
+            'received': len(records) + len(errors),
+            'inserted': inserted,
+            'updated': updated,
+            'errors': errors
+        }
+        records, errors = [], []
+        return dumps_line(ack)
+
+    try:
+        for line_no, record, error in parse_records(stream):
+            totals['received'] += 1
+            if error:
+                totals['skipped'] += 1
+                errors.append({'line': line_no, 'error': error})
+            else:
+                records.append(record)
+            if len(records) + len(errors) >= batch_size:
+                yield flush()
+        if records or errors:
+            yield flush()
+    except Exception as e:
+        yield dumps_line({'done': False, 'error': str(e), **totals})
+        return
+
+    yield dumps_line({'done': True, **totals})
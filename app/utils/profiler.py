@@ -0,0 +1,165 @@
+"""
+按请求的SQL性能分析
+基于SQLAlchemy游标事件统计每个请求的查询次数与耗时，识别重复语句（N+1），
+记录慢查询及其查询计划；默认关闭，由配置 profiling.enabled 开启
+"""
+import re
+import time
+import logging
+import threading
+from collections import deque, Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def statement_shape(statement):
+    """归一化语句形状：合并空白并把展开的IN参数列表折叠为一个占位符"""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    return _IN_LIST.sub('(?...)', shape)
+
+
+class RequestProfile:
+    """单个请求的SQL统计"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.shapes = Counter()
+        self.slow_queries = []
+
+
+class SQLProfiler:
+    """SQL性能分析器"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.slow_query_ms = 100
+        self.n_plus_one_threshold = 5
+        self._profiles = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app):
+        """按配置注册游标事件和请求钩子"""
+        self.app = app
+        app.extensions['sql_profiler'] = self
+        self.enabled = app.config['PROFILING_ENABLED']
+        self.slow_query_ms = app.config['PROFILING_SLOW_QUERY_MS']
+        self.n_plus_one_threshold = app.config['PROFILING_N_PLUS_ONE_THRESHOLD']
+        self._profiles = deque(maxlen=app.config['PROFILING_HISTORY'])
+
+        if not self.enabled:
+            return
+
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def _current():
+        if not has_request_context():
+            return None
+        return g.get('sql_profile')
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._current() is not None:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._current()
+        if profile is None:
+            return
+        starts = conn.info.get('profile_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+
+        profile.query_count += 1
+        profile.sql_time += elapsed
+        shape = statement_shape(statement)
+        profile.shapes[shape] += 1
+
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms >= self.slow_query_ms:
+            plan = None if executemany else self._explain(conn, statement, parameters)
+            profile.slow_queries.append({
+                'statement': shape,
+                'time_ms': round(elapsed_ms, 2),
+                'plan': plan
+            })
+            logger.warning('慢查询 %.2fms: %s\n查询计划: %s', elapsed_ms, shape, plan)
+
+    @staticmethod
+    def _explain(conn, statement, parameters):
+        """在同一连接上执行 EXPLAIN QUERY PLAN（绕过SQLAlchemy事件）"""
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            driver_connection = conn.connection.driver_connection
+            rows = driver_connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters or ()).fetchall()
+            return [row[-1] for row in rows]
+        except Exception as e:
+            return [f'无法获取查询计划: {e}']
+
+    def _start_request(self):
+        g.sql_profile = RequestProfile()
+
+    def _finish_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+
+        repeated = [
+            {'statement': shape, 'count': count}
+            for shape, count in profile.shapes.most_common()
+            if count >= self.n_plus_one_threshold
+        ]
+        sql_ms = round(profile.sql_time * 1000, 2)
+        total_ms = round((time.perf_counter() - profile.started) * 1000, 2)
+
+        response.headers['X-SQL-Profile'] = (
+            f'queries={profile.query_count}; sql_ms={sql_ms}; '
+            f'n_plus_one={len(repeated)}; slow={len(profile.slow_queries)}'
+        )
+
+        record = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': response.status_code,
+            'query_count': profile.query_count,
+            'sql_time_ms': sql_ms,
+            'total_time_ms': total_ms,
+            'n_plus_one': repeated,
+            'slow_queries': profile.slow_queries,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        with self._lock:
+            self._profiles.append(record)
+
+        if repeated:
+            logger.warning('疑似N+1查询 %s %s: %s', request.method, request.path,
+                           ', '.join(f"{r['count']}x {r['statement'][:80]}" for r in repeated))
+        return response
+
+    def recent(self, limit=None):
+        """最近的请求分析记录（新的在前）"""
+        with self._lock:
+            profiles = list(self._profiles)
+        profiles.reverse()
+        return profiles[:limit] if limit else profiles
+
+
+sql_profiler = SQLProfiler()
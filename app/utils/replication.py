@@ -0,0 +1,289 @@
+"""
+只读副本（从节点）
+从主节点下载数据库快照启动，再通过 /api/v1/changes 长轮询拉取变更并应用到本地SQLite；
+本地直接处理所有GET请求，写请求按配置拒绝或转发给主节点
+"""
+import os
+import json
+import logging
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+from flask import request, Response
+from app.models import db, Prompt
+from app.config import Config
+from app.utils.response import error_response
+from app.utils.background import background_enabled
+from app.utils.changes import (
+    append_entries, latest_version, parse_timestamp, OP_INSERT, OP_UPDATE, OP_DELETE, OP_RESET, OP_CATEGORY
+)
+from app.utils.categories import apply_category_change
+from app.utils.tags import sync_prompt_tags, remove_prompt_tags, rebuild_prompt_tags
+from app.utils.migrate import prepare_database
+from app.utils.signals import notify_prompts_changed, notify_categories_changed
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODES = ('reject', 'forward')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# 首次初始化完成前仍可访问的接口（健康检查和复制状态）
+STATUS_PATHS = ('/api/v1/health', '/api/v1/system/status')
+POLL_TIMEOUT = 25
+BATCH_LIMIT = 500
+RETRY_DELAY = 5
+# 快照中可能带有主节点已软删除、尚未清理的行，查找本地记录时需要包含
+INCLUDE_DELETED = {'include_deleted': True}
+
+
+class ReplicationError(Exception):
+    """复制错误"""
+
+
+class Follower:
+    """从节点复制器"""
+
+    def __init__(self):
+        self.app = None
+        self.leader_url = None
+        self.write_mode = 'reject'
+        self.applied_version = 0
+        self.leader_version = 0
+        self.last_contact = None
+        self.caught_up_at = None
+        self.last_error = None
+        self.bootstrap_count = 0
+        self.ready = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self.leader_url is not None
+
+    def init_app(self, app, leader_url, write_mode='reject'):
+        """
+        以从节点模式运行：拦截写请求并启动复制线程
+
+        首次从主节点初始化也在复制线程中进行，主节点暂时不可达时按 RETRY_DELAY 重试，
+        不影响进程启动；初始化完成前 status() 中 ready 为false，数据接口返回503
+
+        Args:
+            app: Flask应用实例
+            leader_url: 主节点地址，例如 http://127.0.0.1:15252
+            write_mode: 'reject' 拒绝写请求，'forward' 转发给主节点
+        """
+        if write_mode not in WRITE_MODES:
+            raise ValueError(f'write_mode必须是 {WRITE_MODES} 之一')
+
+        self.app = app
+        self.leader_url = leader_url.rstrip('/')
+        self.write_mode = write_mode
+        app.extensions['follower'] = self
+        app.before_request(self._guard_writes)
+
+        if background_enabled(app):
+            self._thread = threading.Thread(target=self._run, name='replication', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _open(self, path, timeout, data=None, method='GET', headers=None):
+        req = urllib.request.Request(
+            self.leader_url + path, data=data, method=method, headers=headers or {}
+        )
+        return urllib.request.urlopen(req, timeout=timeout)
+
+    def _get_json(self, path, timeout):
+        with self._open(path, timeout) as resp:
+            result = json.loads(resp.read().decode('utf-8'))
+        if result.get('code') != 200:
+            raise ReplicationError(result.get('message', '主节点返回错误'))
+        return result['data']
+
+    def bootstrap(self):
+        """从主节点下载数据库快照替换本地数据库（需在应用上下文中调用）"""
+        db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(db_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, self._open('/api/v1/backup/export/db', timeout=300) as resp:
+                while True:
+                    chunk = resp.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+
+            with open(tmp_path, 'rb') as f:
+                if not f.read(16).startswith(b'SQLite format 3'):
+                    raise ReplicationError('主节点返回的不是SQLite数据库文件')
+
+            db.session.remove()
+            db.engine.dispose()
+            os.replace(tmp_path, db_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        prepare_database()
+        # 主节点标记软删除时已记录delete变更，快照中尚未清理的行直接删除（从节点不运行清理任务）
+        Prompt.query.filter(Prompt.deleted_at.isnot(None)).delete(synchronize_session=False)
+        rebuild_prompt_tags()
+        db.session.commit()
+
+        self.applied_version = latest_version()
+        self.leader_version = max(self.leader_version, self.applied_version)
+        self.last_contact = datetime.utcnow()
+        self.bootstrap_count += 1
+        self.ready = True
+        notify_prompts_changed(reset=True)
+        logger.info('从主节点 %s 初始化完成，版本 %d', self.leader_url, self.applied_version)
+
+    def apply(self, changes):
+        """
+        在本地应用一批变更（需在应用上下文中调用）
+
+        Returns:
+            遇到整体替换记录时返回False，调用方需要重新初始化
+        """
+        if any(c['operation'] == OP_RESET for c in changes):
+            return False
+
+        upserted = {}
+        deleted = set()
+        category_changed = False
+        try:
+            for change in changes:
+                prompt_id = change['prompt_id']
+                if change['operation'] in (OP_INSERT, OP_UPDATE):
+                    data = change.get('prompt')
+                    if data is None:
+                        # 之后已被删除，等待对应的delete记录
+                        continue
+                    prompt = db.session.get(Prompt, prompt_id, execution_options=INCLUDE_DELETED)
+                    if prompt is None:
+                        prompt = Prompt(id=prompt_id)
+                        db.session.add(prompt)
+                    prompt.category = data['category']
+                    prompt.name = data['name']
+                    prompt.translation = data['translation']
+                    prompt.comment = data.get('comment', '')
+                    prompt.created_at = parse_timestamp(data['created_at'])
+                    prompt.updated_at = parse_timestamp(data['updated_at'])
+                    upserted[prompt_id] = prompt
+                    deleted.discard(prompt_id)
+                elif change['operation'] == OP_DELETE:
+                    prompt = upserted.pop(prompt_id, None) or \
+                        db.session.get(Prompt, prompt_id, execution_options=INCLUDE_DELETED)
+                    if prompt is not None:
+                        db.session.delete(prompt)
+                    deleted.add(prompt_id)
+                elif change['operation'] == OP_CATEGORY:
+                    # 分类重命名或合并：按名称整体应用，不涉及单个词条
+                    category_changed |= apply_category_change(change['category'], change['previous_category'])
+
+            db.session.flush()
+            remove_prompt_tags(deleted)
+            sync_prompt_tags(list(upserted.values()))
+            append_entries(changes)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if changes:
+            self.applied_version = changes[-1]['version']
+        notify_prompts_changed(upserted=list(upserted.values()), deleted=sorted(deleted))
+        if category_changed:
+            notify_categories_changed()
+        return True
+
+    def sync_once(self, timeout=POLL_TIMEOUT):
+        """拉取并应用一批变更（需在应用上下文中调用）"""
+        data = self._get_json(
+            f'/api/v1/changes?since={self.applied_version}&limit={BATCH_LIMIT}&timeout={timeout}',
+            timeout=timeout + 10
+        )
+        self.last_contact = datetime.utcnow()
+        self.leader_version = data['latest_version']
+
+        if data['reset_required'] or not self.apply(data['changes']):
+            self.bootstrap()
+            return
+
+        if not data['has_more'] and self.applied_version >= self.leader_version:
+            self.caught_up_at = self.last_contact
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    if self.ready:
+                        self.sync_once()
+                    else:
+                        self.bootstrap()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning('复制失败，%d秒后重试: %s', RETRY_DELAY, e)
+                self._stop_event.wait(RETRY_DELAY)
+
+    def _guard_writes(self):
+        if not request.path.startswith('/api/'):
+            return None
+        if not self.ready and request.path not in STATUS_PATHS:
+            # 本地数据库尚未从主节点初始化，不返回过时或空的数据
+            response, code = error_response('只读副本正在从主节点初始化，请稍后重试', 503, {'leader': self.leader_url})
+            response.status_code = code
+            response.headers['Retry-After'] = str(RETRY_DELAY)
+            return response
+        if request.method in READ_METHODS:
+            return None
+        if self.write_mode == 'forward':
+            return self._forward()
+        return error_response('只读副本不接受写操作，请发送到主节点', 405, {'leader': self.leader_url})
+
+    def _forward(self):
+        """把写请求原样转发给主节点"""
+        headers = {}
+        if request.content_type:
+            headers['Content-Type'] = request.content_type
+        try:
+            resp = self._open(
+                request.full_path.rstrip('?'), timeout=300,
+                data=request.get_data(), method=request.method, headers=headers
+            )
+        except urllib.error.HTTPError as e:
+            resp = e
+        except (urllib.error.URLError, OSError) as e:
+            return error_response(f'无法连接主节点: {e}', 502)
+
+        with resp:
+            body = resp.read()
+            return Response(body, status=resp.status, content_type=resp.headers.get('Content-Type'))
+
+    def status(self):
+        """复制状态与延迟"""
+        now = datetime.utcnow()
+        lag_seconds = None
+        if self.caught_up_at is not None:
+            lag_seconds = 0.0 if self.applied_version >= self.leader_version \
+                else round((now - self.caught_up_at).total_seconds(), 3)
+        return {
+            'role': 'follower',
+            'ready': self.ready,
+            'leader': self.leader_url,
+            'write_mode': self.write_mode,
+            'applied_version': self.applied_version,
+            'leader_version': self.leader_version,
+            'lag_versions': max(self.leader_version - self.applied_version, 0),
+            'lag_seconds': lag_seconds,
+            'last_contact': self.last_contact.isoformat() + 'Z' if self.last_contact else None,
+            'bootstrap_count': self.bootstrap_count,
+            'last_error': self.last_error
+        }
+
+
+follower = Follower()
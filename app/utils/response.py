@@ -2,7 +2,7 @@
 统一响应格式工具
 """
 from datetime import datetime
-from flask import jsonify
+from flask import jsonify, current_app
 
 
 def success_response(data=None, message="操作成功", code=200):
@@ -48,3 +48,26 @@ def error_response(message="操作失败", code=400, errors=None):
         response['errors'] = errors
     
     return jsonify(response), code
+
+
+def assembled_response(data_parts, message="操作成功", code=200):
+    """
+    由已编码的JSON片段拼接成功响应，结构与 success_response 相同
+    
+    Args:
+        data_parts: {data中的键: 已编码的JSON字符串}
+        message: 响应消息
+        code: HTTP状态码
+    
+    Returns:
+        Flask JSON响应
+    """
+    dumps = current_app.json.dumps
+    data = ','.join(f'{dumps(key)}:{value}' for key, value in sorted(data_parts.items()))
+    # 与 jsonify 的键排序保持一致: code, data, message, timestamp
+    body = (
+        f'{{"code":{code},"data":{{{data}}},'
+        f'"message":{dumps(message)},'
+        f'"timestamp":{dumps(datetime.utcnow().isoformat() + "Z")}}}\n'
+    )
+    return current_app.response_class(body, mimetype='application/json'), code
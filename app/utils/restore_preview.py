@@ -0,0 +1,221 @@
+"""
+CSV恢复预览
+把上传的CSV与数据库按（分类，名称）做排序归并比较，统计恢复后将新增、更新、不变、删除的词条并给出样例，不写入数据库。
+CSV超过 BACKUP_PREVIEW_CHUNK_ROWS 行时分段排序后写入临时文件（外部排序），内存占用与文件大小无关；
+数据库一侧按同样的顺序用游标逐行读取
+"""
+import os
+import csv
+import heapq
+import tempfile
+from app.models import db, Prompt, Category
+from app.config import Config
+
+INSERT = 'insert'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+DELETE = 'delete'
+ACTIONS = (INSERT, UPDATE, UNCHANGED, DELETE)
+
+MAX_ERRORS = 10
+
+
+def _read_csv(filepath, errors):
+    """
+    逐行读取CSV
+
+    Yields:
+        (分类, 名称, 行号, 译文, 注释)；行号保证同一键的多行保持文件中的顺序
+    """
+    with open(filepath, 'r', encoding='utf-8-sig', newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for line_no, row in enumerate(reader, 2):
+            category, name, translation = row.get('分类'), row.get('名称'), row.get('译文')
+            if category is None or name is None or translation is None:
+                errors.append(f'第{line_no}行缺少分类、名称或译文列')
+                continue
+            yield category, name, line_no, translation, row.get('注释') or ''
+
+
+def _write_run(rows, directory):
+    fd, path = tempfile.mkstemp(prefix='preview_', suffix='.csv', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for category, name, line_no, translation, comment in csv.reader(f):
+            yield category, name, int(line_no), translation, comment
+
+
+class _SortedCSV:
+    """按（分类，名称，行号）排序的CSV行，超过分段大小时外部排序"""
+
+    def __init__(self, filepath, chunk_rows, errors):
+        self.filepath = filepath
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self.errors = errors
+        self.total = 0
+        self.runs = []
+
+    def __enter__(self):
+        directory = Config.BACKUP_TEMP_DIR
+        os.makedirs(directory, exist_ok=True)
+        chunk = []
+        for row in _read_csv(self.filepath, self.errors):
+            chunk.append(row)
+            self.total += 1
+            if len(chunk) >= self.chunk_rows:
+                chunk.sort()
+                self.runs.append(_write_run(chunk, directory))
+                chunk = []
+        chunk.sort()
+        self._tail = chunk
+        return self
+
+    def __iter__(self):
+        if not self.runs:
+            return iter(self._tail)
+        return heapq.merge(*(_read_run(path) for path in self.runs), self._tail)
+
+    def __exit__(self, *exc):
+        for path in self.runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _database_rows():
+    """按（分类，名称）排序逐行读取数据库中的词条"""
+    query = db.session.query(
+        Category.name, Prompt.name, Prompt.translation, Prompt.comment
+    ).join(Category, Category.id == Prompt.category_id) \
+        .order_by(Category.name, Prompt.name, Prompt.id) \
+        .execution_options(yield_per=Config.STREAM_BATCH_SIZE)
+    for category, name, translation, comment in query:
+        yield category, name, translation, comment or ''
+
+
+def _group(rows, width):
+    """把已排序的行按前两列（分类，名称）分组"""
+    key, group = None, []
+    for row in rows:
+        if row[:2] != key:
+            if group:
+                yield key, group
+            key, group = row[:2], []
+        group.append(row[width:])
+    if group:
+        yield key, group
+
+
+def _merge(csv_rows, db_rows):
+    """
+    归并两个按键排序的序列
+
+    Yields:
+        (键, CSV中该键的 (行号, 译文, 注释) 列表, 数据库中该键的 (译文, 注释) 列表)
+    """
+    csv_groups = _group(csv_rows, 2)
+    db_groups = _group(db_rows, 2)
+    csv_item = next(csv_groups, None)
+    db_item = next(db_groups, None)
+    while csv_item is not None or db_item is not None:
+        if db_item is None or (csv_item is not None and csv_item[0] < db_item[0]):
+            yield csv_item[0], csv_item[1], []
+            csv_item = next(csv_groups, None)
+        elif csv_item is None or db_item[0] < csv_item[0]:
+            yield db_item[0], [], db_item[1]
+            db_item = next(db_groups, None)
+        else:
+            yield csv_item[0], csv_item[1], db_item[1]
+            csv_item = next(csv_groups, None)
+            db_item = next(db_groups, None)
+
+
+def _prompt(key, translation, comment, line_no=None):
+    item = {'category': key[0], 'name': key[1], 'translation': translation, 'comment': comment}
+    if line_no is not None:
+        item['line'] = line_no
+    return item
+
+
+def preview_csv(filepath, replace_mode=False, sample_size=10):
+    """
+    计算CSV恢复的差异（需在应用上下文中调用，不修改数据库）
+
+    与实际恢复的规则一致：增量恢复时已有的（分类，名称）更新译文和注释，其余新增，不删除；
+    覆盖恢复时文件中没有的词条都会被删除
+
+    Args:
+        filepath: 已保存的CSV文件
+        replace_mode: 是否按覆盖恢复计算
+        sample_size: 每类样例的最大条数
+
+    Returns:
+        {'mode', 'total_rows', 'skipped_count', 'errors', 'counts', 'samples', 'spilled_runs'}
+    """
+    counts = dict.fromkeys(ACTIONS, 0)
+    samples = {action: [] for action in ACTIONS}
+    errors = []
+
+    def add(action, item):
+        counts[action] += 1
+        if len(samples[action]) < sample_size:
+            samples[action].append(item)
+
+    with _SortedCSV(filepath, Config.BACKUP_PREVIEW_CHUNK_ROWS, errors) as csv_rows:
+        for key, file_rows, db_rows in _merge(csv_rows, _database_rows()):
+            if not file_rows:
+                # 只在数据库中：覆盖恢复时删除，增量恢复时保留
+                if replace_mode:
+                    for translation, comment in db_rows:
+                        add(DELETE, _prompt(key, translation, comment))
+                continue
+
+            if replace_mode:
+                # 覆盖恢复先清空再逐行插入：同键的第一行与原有词条比较，其余行是新增的重复词条
+                current = list(db_rows)
+                for line_no, translation, comment in file_rows:
+                    if current:
+                        old = current.pop(0)
+                        action = UNCHANGED if old == (translation, comment) else UPDATE
+                    else:
+                        old, action = None, INSERT
+                    item = _prompt(key, translation, comment, line_no)
+                    if action == UPDATE:
+                        item['old'] = {'translation': old[0], 'comment': old[1]}
+                    add(action, item)
+                for translation, comment in current:
+                    add(DELETE, _prompt(key, translation, comment))
+                continue
+
+            # 增量恢复：已有的键逐行覆盖当前值（数据库中有重复时与恢复一样取id最大的一条）；
+            # 不存在的键每行都会新增一条
+            current = db_rows[-1] if db_rows else None
+            for line_no, translation, comment in file_rows:
+                item = _prompt(key, translation, comment, line_no)
+                if current is None:
+                    add(INSERT, item)
+                elif current == (translation, comment):
+                    add(UNCHANGED, item)
+                else:
+                    item['old'] = {'translation': current[0], 'comment': current[1]}
+                    add(UPDATE, item)
+                    current = (translation, comment)
+
+        spilled_runs = len(csv_rows.runs)
+        total_rows = csv_rows.total
+
+    return {
+        'mode': 'replace' if replace_mode else 'increment',
+        'total_rows': total_rows,
+        'skipped_count': len(errors),
+        'errors': errors[:MAX_ERRORS],
+        'counts': counts,
+        'samples': samples,
+        'spilled_runs': spilled_runs
+    }
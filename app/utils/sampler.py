@@ -0,0 +1,170 @@
+"""
+词条随机抽样
+常驻内存的每个分类的有序id数组，抽样只在数组上按下标随机取id，再按id查询词条，开销与抽样数量成正比而不是与词条总数；
+首次抽样时构建，写操作后增量更新，分类变化或整库恢复后重建
+"""
+import bisect
+import random
+import logging
+import threading
+from array import array
+from app.models import db, Prompt, Category
+from app.utils.signals import prompts_changed, categories_changed
+
+logger = logging.getLogger(__name__)
+
+# 抽到的id已不可见（例如软删除后尚未清理）时，剔除后重新抽样的最多次数
+MAX_ATTEMPTS = 3
+
+
+class PromptSampler:
+    """按分类的有序id数组"""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.RLock()
+        self._ids = None  # 分类名 -> 有序的 array('q')；None 表示尚未构建
+
+    def init_app(self, app):
+        """注册到应用并订阅变更"""
+        self.app = app
+        app.extensions['prompt_sampler'] = self
+        prompts_changed.connect(self._on_prompts_changed, sender=app, weak=False)
+        categories_changed.connect(self._on_categories_changed, sender=app, weak=False)
+
+    def _ensure_loaded(self):
+        if self._ids is not None:
+            return
+        rows = db.session.query(Category.name, Prompt.id) \
+            .join(Category, Category.id == Prompt.category_id) \
+            .order_by(Category.name, Prompt.id).yield_per(1000)
+        ids = {}
+        for category, prompt_id in rows:
+            ids.setdefault(category, array('q')).append(prompt_id)
+        self._ids = ids
+        logger.info('抽样索引已构建: %d个分类，%d个词条', len(ids), sum(len(a) for a in ids.values()))
+
+    def invalidate(self):
+        """丢弃索引，下次抽样时重建"""
+        with self._lock:
+            self._ids = None
+
+    def _on_categories_changed(self, sender):
+        self.invalidate()
+
+    def _remove(self, prompt_id, skip=None):
+        for category, ids in self._ids.items():
+            if category == skip:
+                continue
+            idx = bisect.bisect_left(ids, prompt_id)
+            if idx < len(ids) and ids[idx] == prompt_id:
+                del ids[idx]
+                if not ids:
+                    del self._ids[category]
+                return
+
+    def _on_prompts_changed(self, sender, upserted=(), deleted=(), reset=False, library=None):
+        if library is not None:
+            return
+        with self._lock:
+            if reset:
+                self._ids = None
+            if self._ids is None:
+                return
+            for prompt in upserted:
+                ids = self._ids.setdefault(prompt.category, array('q'))
+                idx = bisect.bisect_left(ids, prompt.id)
+                if idx == len(ids) or ids[idx] != prompt.id:
+                    ids.insert(idx, prompt.id)
+                    # 分类改变时从原分类中移除
+                    self._remove(prompt.id, skip=prompt.category)
+            for prompt_id in deleted:
+                self._remove(prompt_id)
+
+    def _allocate(self, rng, quotas, k, weights, pool):
+        """计算每个分类抽取的数量"""
+        allocation = {}
+        for category, quota in quotas.items():
+            size = len(self._ids.get(category, ()))
+            allocation[category] = min(quota, size)
+
+        remaining = k - sum(quotas.values())
+        pool = [c for c in pool if c not in quotas and c in self._ids]
+        if remaining <= 0 or not pool:
+            return allocation
+
+        if weights is None:
+            # 不指定权重时在这些分类的全部词条中均匀抽取：对合并后的下标抽样，再按累计数量映射回分类
+            bounds, total = [], 0
+            for category in pool:
+                total += len(self._ids[category])
+                bounds.append(total)
+            for index in rng.sample(range(total), min(remaining, total)):
+                category = pool[bisect.bisect_right(bounds, index)]
+                allocation[category] = allocation.get(category, 0) + 1
+            return allocation
+
+        # 按权重逐个名额选择分类，已取完的分类不再参与
+        capacity = {c: len(self._ids[c]) for c in pool if weights.get(c, 1) > 0}
+        for _ in range(remaining):
+            candidates = [c for c, left in capacity.items() if left > 0]
+            if not candidates:
+                break
+            category = rng.choices(candidates, [weights.get(c, 1) for c in candidates])[0]
+            capacity[category] -= 1
+            allocation[category] = allocation.get(category, 0) + 1
+        return allocation
+
+    def _draw(self, seed, quotas, k, weights, categories):
+        rng = random.Random(seed)
+        with self._lock:
+            self._ensure_loaded()
+            pool = categories if categories else sorted(self._ids)
+            allocation = self._allocate(rng, quotas, k, weights, pool)
+            picked = []
+            for category in sorted(allocation):
+                ids = self._ids.get(category, ())
+                picked.extend(ids[i] for i in rng.sample(range(len(ids)), allocation[category]))
+        return {c: n for c, n in allocation.items() if n}, picked
+
+    def sample(self, quotas=None, k=0, weights=None, categories=None, seed=None):
+        """
+        随机抽取词条（需在应用上下文中调用）
+
+        Args:
+            quotas: {分类名: 数量}，这些分类固定抽取指定数量（不超过该分类的词条数）
+            k: 总数量，扣除配额后的名额在 categories 中其余分类间分配
+            weights: {分类名: 权重}，其余名额按权重分配到分类（未列出的权重为1）；
+                为None时在这些分类的全部词条中均匀抽取
+            categories: 参与分配的分类，为空时为全部分类
+            seed: 随机种子，数据不变时相同参数的结果相同
+
+        Returns:
+            (Prompt 列表, {分类名: 抽取数量})，词条按分类名、抽取顺序排列
+        """
+        quotas = quotas or {}
+        for _ in range(MAX_ATTEMPTS):
+            allocation, picked = self._draw(seed, quotas, k, weights, categories)
+            prompts = {p.id: p for p in Prompt.query.filter(Prompt.id.in_(picked))} if picked else {}
+            stale = [prompt_id for prompt_id in picked if prompt_id not in prompts]
+            if not stale:
+                break
+            with self._lock:
+                if self._ids is not None:
+                    for prompt_id in stale:
+                        self._remove(prompt_id)
+        return [prompts[i] for i in picked if i in prompts], allocation
+
+    def stats(self):
+        """索引规模"""
+        with self._lock:
+            if self._ids is None:
+                return {'loaded': False, 'categories': 0, 'prompts': 0}
+            return {
+                'loaded': True,
+                'categories': len(self._ids),
+                'prompts': sum(len(ids) for ids in self._ids.values())
+            }
+
+
+prompt_sampler = PromptSampler()
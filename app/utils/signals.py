@@ -0,0 +1,53 @@
+"""
+词条数据变更信号
+写操作提交后发送，供内存索引、缓存等订阅
+"""
+import logging
+from blinker import Namespace
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+_signals = Namespace()
+
+# 接收参数:
+#   upserted: 新增或更新的 Prompt 对象列表
+#   deleted: 被删除的词条id列表
+#   reset: 数据被整体替换（恢复操作），订阅者应从数据库重建
+#   library: 发生变更的词条库名称，主词条库为None（内存索引、变更订阅只覆盖主词条库）
+prompts_changed = _signals.signal('prompts-changed')
+
+# 分类被重命名、合并或删除（词条的 updated_at 不变，但序列化结果中的分类名变化）
+categories_changed = _signals.signal('categories-changed')
+
+
+def notify_prompts_changed(upserted=(), deleted=(), reset=False, library=None):
+    """
+    发送词条变更信号（需在事务提交后、应用上下文中调用）
+
+    Args:
+        upserted: 新增或更新的 Prompt 对象列表
+        deleted: 被删除的词条id列表
+        reset: 是否整体替换
+        library: 词条库名称，主词条库为None
+
+    数据已经提交，订阅者出错只记录日志，不影响请求结果。
+    """
+    try:
+        prompts_changed.send(
+            current_app._get_current_object(),
+            upserted=list(upserted),
+            deleted=list(deleted),
+            reset=reset,
+            library=library
+        )
+    except Exception:
+        logger.exception('词条变更通知处理失败')
+
+
+def notify_categories_changed():
+    """发送分类变更信号（需在事务提交后、应用上下文中调用）"""
+    try:
+        categories_changed.send(current_app._get_current_object())
+    except Exception:
+        logger.exception('分类变更通知处理失败')
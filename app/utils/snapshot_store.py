@@ -0,0 +1,362 @@
+"""
+内容寻址的数据库快照存储
+把数据库镜像按页对齐切分为固定大小的块，以块内容的SHA-256命名并去重保存，
+每个快照只保存一份清单（manifest），未变化的块在快照之间共享
+"""
+import os
+import re
+import json
+import time
+import zlib
+import shutil
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID_PATTERN = re.compile(r'^\d{8}_\d{6}_\d{6}$')
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+class SnapshotError(Exception):
+    """快照存储错误"""
+
+
+def online_backup(src_path, dst_path, step_pages=100, step_pause=0.0):
+    """
+    在线备份SQLite数据库
+
+    每复制 step_pages 个页面后暂停 step_pause 秒，把写锁让给前台请求。
+
+    Args:
+        src_path: 源数据库路径
+        dst_path: 备份文件路径
+        step_pages: 每批复制的页面数
+        step_pause: 批次之间的暂停时间（秒）
+
+    Returns:
+        (page_count, prompt_count) 元组
+    """
+    def _progress(status, remaining, total):
+        if remaining and step_pause > 0:
+            time.sleep(step_pause)
+
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=max(int(step_pages), 1), progress=_progress)
+        page_count = dst.execute('PRAGMA page_count').fetchone()[0]
+        try:
+            prompt_count = dst.execute('SELECT COUNT(*) FROM prompts').fetchone()[0]
+        except sqlite3.Error:
+            prompt_count = 0
+        return page_count, prompt_count
+    finally:
+        dst.close()
+        src.close()
+
+
+def _read_page_size(path):
+    """读取SQLite文件头中的页大小"""
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(SQLITE_HEADER):
+        raise SnapshotError('不是有效的SQLite数据库文件')
+    page_size = int.from_bytes(header[16:18], 'big')
+    return 65536 if page_size == 1 else page_size
+
+
+class SnapshotStore:
+    """快照存储"""
+
+    def __init__(self, root=None, chunk_pages=16):
+        self.root = root
+        self.chunk_pages = chunk_pages
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        """从应用配置初始化存储目录"""
+        self.root = app.config['BACKUP_SNAPSHOT_DIR']
+        self.chunk_pages = app.config['BACKUP_SNAPSHOT_CHUNK_PAGES']
+        os.makedirs(self._chunk_dir, exist_ok=True)
+        os.makedirs(self._manifest_dir, exist_ok=True)
+        app.extensions['snapshot_store'] = self
+
+    @property
+    def _chunk_dir(self):
+        return os.path.join(self.root, 'chunks')
+
+    @property
+    def _manifest_dir(self):
+        return os.path.join(self.root, 'manifests')
+
+    def _chunk_path(self, digest):
+        return os.path.join(self._chunk_dir, digest[:2], digest)
+
+    def _manifest_path(self, snapshot_id):
+        if not SNAPSHOT_ID_PATTERN.match(snapshot_id or ''):
+            raise SnapshotError('快照ID格式错误')
+        return os.path.join(self._manifest_dir, f'{snapshot_id}.json')
+
+    def _write_chunk(self, digest, data):
+        """写入块（已存在则跳过），返回新写入的字节数"""
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = zlib.compress(data, 6)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return len(payload)
+
+    def _read_chunk(self, digest):
+        path = self._chunk_path(digest)
+        if not os.path.exists(path):
+            raise SnapshotError(f'快照数据块缺失: {digest}')
+        with open(path, 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise SnapshotError(f'快照数据块校验失败: {digest}')
+        return data
+
+    def add_file(self, image_path, label='', prompt_count=None):
+        """
+        把一个数据库镜像文件存入快照库
+
+        Args:
+            image_path: 一致的数据库镜像文件路径
+            label: 快照说明
+            prompt_count: 快照中的词条数
+
+        Returns:
+            快照清单字典
+        """
+        page_size = _read_page_size(image_path)
+        chunk_size = page_size * max(int(self.chunk_pages), 1)
+
+        with self._lock:
+            snapshot_id = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            chunks = []
+            size = 0
+            new_bytes = 0
+
+            with open(image_path, 'rb') as f:
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        break
+                    digest = hashlib.sha256(data).hexdigest()
+                    new_bytes += self._write_chunk(digest, data)
+                    chunks.append(digest)
+                    size += len(data)
+
+            manifest = {
+                'id': snapshot_id,
+                'label': label,
+                'created_at': datetime.utcnow().isoformat() + 'Z',
+                'page_size': page_size,
+                'chunk_size': chunk_size,
+                'size': size,
+                'prompt_count': prompt_count,
+                'new_bytes': new_bytes,
+                'chunks': chunks
+            }
+
+            manifest_path = self._manifest_path(snapshot_id)
+            fd, tmp_path = tempfile.mkstemp(dir=self._manifest_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, manifest_path)
+
+        return manifest
+
+    def create(self, db_path=None, label=''):
+        """
+        对在线数据库做一次快照
+
+        先用在线备份接口生成一致的临时镜像，再切块入库。
+
+        Returns:
+            快照清单字典
+        """
+        db_path = db_path or Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.db')
+        os.close(fd)
+        try:
+            _, prompt_count = online_backup(
+                db_path, tmp_path,
+                step_pages=Config.BACKUP_STEP_PAGES,
+                step_pause=Config.BACKUP_STEP_PAUSE
+            )
+            return self.add_file(tmp_path, label=label, prompt_count=prompt_count)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, snapshot_id):
+        """读取快照清单，不存在时返回None"""
+        path = self._manifest_path(snapshot_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list(self):
+        """按时间倒序列出所有快照清单"""
+        manifests = []
+        if not os.path.isdir(self._manifest_dir):
+            return manifests
+        for name in os.listdir(self._manifest_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self._manifest_dir, name), 'r', encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError):
+                logger.warning('无法读取快照清单: %s', name)
+        manifests.sort(key=lambda m: m['id'], reverse=True)
+        return manifests
+
+    def materialize(self, snapshot_id, dst_path):
+        """
+        把快照还原为数据库文件
+
+        Args:
+            snapshot_id: 快照ID
+            dst_path: 输出文件路径
+
+        Returns:
+            快照清单字典
+        """
+        manifest = self.get(snapshot_id)
+        if manifest is None:
+            raise SnapshotError('快照不存在')
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst_path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for digest in manifest['chunks']:
+                    f.write(self._read_chunk(digest))
+            os.replace(tmp_path, dst_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return manifest
+
+    def delete(self, snapshot_id):
+        """删除快照清单（数据块由gc回收），返回是否存在"""
+        path = self._manifest_path(snapshot_id)
+        with self._lock:
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+        return True
+
+    def gc(self):
+        """
+        回收不再被任何快照引用的数据块
+
+        Returns:
+            (removed_chunks, freed_bytes) 元组
+        """
+        with self._lock:
+            referenced = set()
+            for manifest in self.list():
+                referenced.update(manifest['chunks'])
+
+            removed = 0
+            freed = 0
+            if not os.path.isdir(self._chunk_dir):
+                return removed, freed
+            for prefix in os.listdir(self._chunk_dir):
+                prefix_dir = os.path.join(self._chunk_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for name in os.listdir(prefix_dir):
+                    if name in referenced:
+                        continue
+                    path = os.path.join(prefix_dir, name)
+                    try:
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        logger.warning('无法删除快照数据块: %s', path)
+            return removed, freed
+
+    def prune(self, retention_days=None, max_count=None, now=None):
+        """
+        按保留天数和数量删除旧快照并回收数据块
+
+        Returns:
+            被删除的快照ID列表
+        """
+        retention_days = Config.BACKUP_RETENTION_DAYS if retention_days is None else retention_days
+        max_count = Config.BACKUP_MAX_COUNT if max_count is None else max_count
+        now = now or datetime.now()
+
+        removed = []
+        with self._lock:
+            for idx, manifest in enumerate(self.list()):
+                created = datetime.strptime(manifest['id'], '%Y%m%d_%H%M%S_%f')
+                expired = retention_days > 0 and now - created > timedelta(days=retention_days)
+                overflow = max_count > 0 and idx >= max_count
+                if expired or overflow:
+                    self.delete(manifest['id'])
+                    removed.append(manifest['id'])
+            if removed:
+                self.gc()
+        return removed
+
+    def stats(self):
+        """统计快照数量、逻辑大小和实际占用"""
+        manifests = self.list()
+        chunk_count = 0
+        stored_bytes = 0
+        if os.path.isdir(self._chunk_dir):
+            for prefix in os.listdir(self._chunk_dir):
+                prefix_dir = os.path.join(self._chunk_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for entry in os.scandir(prefix_dir):
+                    chunk_count += 1
+                    stored_bytes += entry.stat().st_size
+        return {
+            'snapshot_count': len(manifests),
+            'logical_bytes': sum(m['size'] for m in manifests),
+            'stored_bytes': stored_bytes,
+            'chunk_count': chunk_count
+        }
+
+
+def restore_snapshot(snapshot_id):
+    """
+    把在线数据库恢复到指定快照（需在应用上下文中调用）
+
+    Returns:
+        快照清单字典
+    """
+    from app.models import db
+
+    db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+    fd, tmp_path = tempfile.mkstemp(dir=snapshot_store.root, suffix='.db')
+    os.close(fd)
+    try:
+        manifest = snapshot_store.materialize(snapshot_id, tmp_path)
+        db.session.remove()
+        db.engine.dispose()
+        shutil.copy2(tmp_path, db_path)
+        return manifest
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,212 @@
+"""
+词条名称与标签的前缀联想索引
+常驻内存的有序数组，按前缀二分定位，按出现次数排序；写操作后增量更新
+"""
+import bisect
+import heapq
+import logging
+import threading
+from app.models import db, Prompt
+from app.utils.tags import split_tags
+from app.utils.signals import prompts_changed
+
+logger = logging.getLogger(__name__)
+
+KIND_NAME = 'name'
+KIND_TAG = 'tag'
+# 前缀匹配范围超过该数量时缓存其Top-K结果，避免短前缀每次扫描大量条目
+SCAN_LIMIT = 256
+CACHE_TOP_K = 50
+
+
+def _normalize(text):
+    return ' '.join((text or '').split()).lower()
+
+
+class SuggestIndex:
+    """前缀联想索引"""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.RLock()
+        self._keys = []        # 有序的 (key, kind) 列表
+        self._entries = {}     # (key, kind) -> [display, count]
+        self._by_id = {}       # prompt_id -> (name_key, tag_keys)，用于增量更新
+        self._top_cache = {}   # (prefix, kind) -> 预排序的候选列表
+
+    def init_app(self, app):
+        """注册到应用：构建索引并订阅词条变更"""
+        self.app = app
+        app.extensions['suggest_index'] = self
+        prompts_changed.connect(self._on_prompts_changed, sender=app, weak=False)
+        with app.app_context():
+            self.rebuild()
+
+    def rebuild(self):
+        """从数据库重建索引（需在应用上下文中调用）"""
+        rows = db.session.query(Prompt.id, Prompt.name, Prompt.translation).yield_per(1000)
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+            self._by_id = {}
+            self._top_cache = {}
+            for prompt_id, name, translation in rows:
+                self._add(prompt_id, name, translation, keep_sorted=False)
+            self._keys.sort()
+        logger.info('联想索引已构建: %d个条目', len(self._keys))
+
+    def _add_term(self, key, kind, display, keep_sorted):
+        entry_key = (key, kind)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            self._entries[entry_key] = [display, 1]
+            if keep_sorted:
+                bisect.insort(self._keys, entry_key)
+            else:
+                self._keys.append(entry_key)
+        else:
+            entry[1] += 1
+        self._update_cache(entry_key, increased=True)
+
+    def _remove_term(self, key, kind):
+        entry_key = (key, kind)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[entry_key]
+            idx = bisect.bisect_left(self._keys, entry_key)
+            if idx < len(self._keys) and self._keys[idx] == entry_key:
+                del self._keys[idx]
+        self._update_cache(entry_key, increased=False)
+
+    @staticmethod
+    def _rank_key(entries):
+        return lambda ek: (-entries[ek][1], ek[0], ek[1])
+
+    def _update_cache(self, entry_key, increased):
+        """条目计数变化后就地调整受影响前缀的Top-K缓存"""
+        if not self._top_cache:
+            return
+        key, kind = entry_key
+        rank_key = self._rank_key(self._entries)
+        for i in range(1, len(key) + 1):
+            for cache_key in ((key[:i], None), (key[:i], kind)):
+                ranked = self._top_cache.get(cache_key)
+                if ranked is None:
+                    continue
+                if entry_key in ranked:
+                    if not increased and len(ranked) >= CACHE_TOP_K:
+                        # 名次下降后可能被缓存外的条目超过，只能重新计算
+                        del self._top_cache[cache_key]
+                    elif entry_key not in self._entries:
+                        ranked.remove(entry_key)
+                    else:
+                        ranked.sort(key=rank_key)
+                elif increased:
+                    ranked.append(entry_key)
+                    ranked.sort(key=rank_key)
+                    del ranked[CACHE_TOP_K:]
+
+    def _add(self, prompt_id, name, translation, keep_sorted=True):
+        name_key = _normalize(name)
+        tag_keys = split_tags(translation)
+        if name_key:
+            self._add_term(name_key, KIND_NAME, ' '.join(name.split()), keep_sorted)
+        for tag in tag_keys:
+            self._add_term(tag, KIND_TAG, tag, keep_sorted)
+        self._by_id[prompt_id] = (name_key, tag_keys)
+
+    def _remove(self, prompt_id):
+        old = self._by_id.pop(prompt_id, None)
+        if old is None:
+            return
+        name_key, tag_keys = old
+        if name_key:
+            self._remove_term(name_key, KIND_NAME)
+        for tag in tag_keys:
+            self._remove_term(tag, KIND_TAG)
+
+    def upsert(self, prompt_id, name, translation):
+        """新增或更新一个词条的索引"""
+        with self._lock:
+            self._remove(prompt_id)
+            self._add(prompt_id, name, translation)
+
+    def remove(self, prompt_id):
+        """移除一个词条的索引"""
+        with self._lock:
+            self._remove(prompt_id)
+
+    def _on_prompts_changed(self, sender, upserted=(), deleted=(), reset=False, library=None):
+        if library is not None:
+            return
+        if reset:
+            self.rebuild()
+            return
+        for prompt in upserted:
+            self.upsert(prompt.id, prompt.name, prompt.translation)
+        for prompt_id in deleted:
+            self.remove(prompt_id)
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self._keys, (prefix,))
+        hi = bisect.bisect_left(self._keys, (prefix + '\U0010ffff',))
+        return lo, hi
+
+    def _ranked(self, prefix, kind, lo, hi, k):
+        candidates = (
+            entry_key for entry_key in self._keys[lo:hi]
+            if kind is None or entry_key[1] == kind
+        )
+        return heapq.nsmallest(k, candidates, key=self._rank_key(self._entries))
+
+    def suggest(self, prefix, limit=10, kind=None):
+        """
+        按前缀联想
+
+        Args:
+            prefix: 输入前缀
+            limit: 返回条数
+            kind: 'name'、'tag' 或 None（全部）
+
+        Returns:
+            [{'text', 'type', 'count'}, ...] 按出现次数降序
+        """
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            lo, hi = self._range(prefix)
+            if hi - lo > SCAN_LIMIT and limit <= CACHE_TOP_K:
+                cache_key = (prefix, kind)
+                ranked = self._top_cache.get(cache_key)
+                if ranked is None:
+                    ranked = self._ranked(prefix, kind, lo, hi, CACHE_TOP_K)
+                    self._top_cache[cache_key] = ranked
+                ranked = ranked[:limit]
+            else:
+                ranked = self._ranked(prefix, kind, lo, hi, limit)
+
+            return [
+                {
+                    'text': self._entries[entry_key][0],
+                    'type': entry_key[1],
+                    'count': self._entries[entry_key][1]
+                }
+                for entry_key in ranked
+            ]
+
+    def stats(self):
+        """索引规模"""
+        with self._lock:
+            return {
+                'entries': len(self._keys),
+                'prompts': len(self._by_id),
+                'cached_prefixes': len(self._top_cache)
+            }
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,342 @@
+"""
+监督模式（仅类Unix系统）
+监督进程持有监听套接字，启动 run.py 子进程作为工作进程并把套接字交给它；工作进程处理的请求数或内存超过上限时，
+或监督进程收到 SIGHUP 时，先启动新的工作进程，待其就绪后再让旧进程停止接受连接、处理完已有请求后退出，
+替换期间套接字始终在监听，请求不会被拒绝
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import selectors
+import threading
+import subprocess
+import psutil
+from app.config import Config, _config_path
+from app.utils.background import task_lock
+
+logger = logging.getLogger(__name__)
+
+READY = 'ready'
+RECYCLE = 'recycle'
+RESTART_DELAY = 1
+
+
+def supported():
+    return os.name == 'posix' and hasattr(signal, 'SIGHUP')
+
+
+class WorkerProcess:
+    """监督进程眼中的一个工作进程"""
+
+    def __init__(self, proc, status_fd, address):
+        self.proc = proc
+        self.status_fd = status_fd
+        self.address = address
+        self.ready = False
+        self.drain_started = None
+        self._buffer = b''
+
+    @property
+    def pid(self):
+        return self.proc.pid
+
+    def read_messages(self):
+        """读取工作进程发来的状态行，管道已关闭时返回None"""
+        data = os.read(self.status_fd, 4096)
+        if not data:
+            return None
+        *lines, self._buffer = (self._buffer + data).split(b'\n')
+        return [line.decode('utf-8').strip() for line in lines]
+
+    def drain(self):
+        if self.drain_started is None:
+            self.drain_started = time.monotonic()
+            self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def _signal(self, signum):
+        try:
+            self.proc.send_signal(signum)
+        except ProcessLookupError:
+            pass
+
+
+class Supervisor:
+    """监督进程"""
+
+    def __init__(self, args, worker_args):
+        """
+        Args:
+            args: run.py 的命令行参数（host、port）
+            worker_args: 原样传给工作进程的其他参数
+        """
+        self.host = args.host
+        self.port = args.port
+        # 启动时使用的是 config.json 中的地址，则重新加载时跟随配置文件变化（例如 PUT /config 修改端口）
+        self.follow_config = (args.host, args.port) == (Config.SERVER_HOST, Config.SERVER_PORT)
+        self.worker_args = worker_args
+        self.drain_timeout = Config.SUPERVISOR_DRAIN_TIMEOUT
+        self.sockets = {}
+        self.active = None
+        self.pending = None
+        self.draining = []
+        self.restart_at = None
+        self._reload = False
+        self._stop = False
+        self._selector = selectors.DefaultSelector()
+
+    def _listen(self, address):
+        sock = self.sockets.get(address)
+        if sock is None:
+            sock = socket.create_server(address, backlog=1024, reuse_port=False)
+            sock.set_inheritable(True)
+            self.sockets[address] = sock
+            logger.info('监听 http://%s:%d', *address)
+        return sock
+
+    def _spawn(self):
+        address = (self.host, self.port)
+        sock = self._listen(address)
+        status_read, status_write = os.pipe()
+        command = [
+            sys.executable, os.path.abspath(sys.argv[0]),
+            '--host', self.host, '--port', str(self.port),
+            *self.worker_args,
+            '--worker-fd', str(sock.fileno()), '--status-fd', str(status_write)
+        ]
+        proc = subprocess.Popen(command, pass_fds=(sock.fileno(), status_write))
+        os.close(status_write)
+
+        worker = WorkerProcess(proc, status_read, address)
+        self._selector.register(status_read, selectors.EVENT_READ, worker)
+        self.pending = worker
+        logger.info('启动工作进程 %d', worker.pid)
+
+    def _config_address(self):
+        try:
+            with open(_config_path, 'r', encoding='utf-8') as f:
+                server = json.load(f)['server']
+            return server['host'], int(server['port'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning('读取配置文件失败，沿用当前地址: %s', e)
+            return self.host, self.port
+
+    def _replace(self, reason):
+        """启动替换的工作进程（已有进程在启动中时忽略）"""
+        if self.pending is not None or self._stop:
+            return
+        if self.follow_config:
+            self.host, self.port = self._config_address()
+        logger.info('替换工作进程: %s', reason)
+        try:
+            self._spawn()
+        except OSError as e:
+            logger.error('启动工作进程失败: %s', e)
+            self.restart_at = time.monotonic() + RESTART_DELAY
+
+    def _close_status(self, worker):
+        if worker.status_fd in self._selector.get_map():
+            self._selector.unregister(worker.status_fd)
+            os.close(worker.status_fd)
+
+    def _on_message(self, worker, message):
+        if message == READY and worker is self.pending:
+            worker.ready = True
+            self.pending = None
+            old, self.active = self.active, worker
+            logger.info('工作进程 %d 已就绪', worker.pid)
+            if old is not None:
+                old.drain()
+                self.draining.append(old)
+        elif message.startswith(RECYCLE) and worker is self.active:
+            self._replace(f'工作进程 {worker.pid} {message[len(RECYCLE):].strip()}')
+
+    def _reap(self):
+        for worker in [self.active, self.pending, *self.draining]:
+            if worker is None or worker.proc.poll() is None:
+                continue
+            self._close_status(worker)
+
+            if worker in self.draining:
+                self.draining.remove(worker)
+                logger.info('工作进程 %d 已退出', worker.pid)
+            elif worker is self.pending:
+                self.pending = None
+                logger.error('工作进程 %d 启动失败（退出码 %s）', worker.pid, worker.proc.returncode)
+                if self.active is None:
+                    self.restart_at = time.monotonic() + RESTART_DELAY
+            elif worker is self.active:
+                self.active = None
+                logger.error('工作进程 %d 意外退出（退出码 %s）', worker.pid, worker.proc.returncode)
+                self._replace('工作进程意外退出')
+
+        # 不再被任何工作进程使用的旧地址（端口已变更）关闭监听
+        in_use = {w.address for w in [self.active, self.pending, *self.draining] if w is not None}
+        for address in list(self.sockets):
+            if address not in in_use and address != (self.host, self.port):
+                self.sockets.pop(address).close()
+                logger.info('停止监听 http://%s:%d', *address)
+
+    def _kill_stragglers(self):
+        now = time.monotonic()
+        for worker in self.draining:
+            if worker.drain_started is not None and now - worker.drain_started > self.drain_timeout + 5:
+                logger.warning('工作进程 %d 超时未退出，强制结束', worker.pid)
+                worker.kill()
+
+    def _handle_hup(self, signum, frame):
+        self._reload = True
+
+    def _handle_stop(self, signum, frame):
+        self._stop = True
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._handle_hup)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        self._spawn()
+        while not self._stop:
+            for key, _ in self._selector.select(timeout=1):
+                worker = key.data
+                messages = worker.read_messages()
+                if messages is None:
+                    self._close_status(worker)
+                    continue
+                for message in messages:
+                    self._on_message(worker, message)
+            if self._reload:
+                self._reload = False
+                self._replace('收到 SIGHUP')
+            if self.restart_at is not None and time.monotonic() >= self.restart_at:
+                self.restart_at = None
+                self._replace('重试启动')
+            self._reap()
+            self._kill_stragglers()
+
+        self._shutdown()
+
+    def _shutdown(self):
+        workers = [w for w in [self.active, self.pending, *self.draining] if w is not None]
+        logger.info('停止 %d 个工作进程', len(workers))
+        for worker in workers:
+            worker.drain()
+        deadline = time.monotonic() + self.drain_timeout
+        for worker in workers:
+            try:
+                worker.proc.wait(timeout=max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                worker.proc.wait()
+        for sock in self.sockets.values():
+            sock.close()
+
+
+class WorkerServer:
+    """工作进程：在继承的套接字上运行Waitress，超过上限时请求替换，收到SIGTERM后排空退出"""
+
+    def __init__(self, app, listen_fd, status_fd, threads):
+        self.app = app
+        self.threads = threads
+        self.max_requests = Config.SUPERVISOR_MAX_REQUESTS
+        self.max_rss = Config.SUPERVISOR_MAX_RSS_MB * 1024 * 1024
+        self.check_interval = Config.SUPERVISOR_CHECK_INTERVAL
+        self.drain_timeout = Config.SUPERVISOR_DRAIN_TIMEOUT
+        self.requests = 0
+        self.draining = False
+        self._recycle_requested = False
+        self._lock = threading.Lock()
+        self._parent = os.getppid()
+        self._socket = socket.socket(fileno=listen_fd)
+        self._status = os.fdopen(status_fd, 'w', encoding='utf-8', buffering=1)
+
+        wsgi_app = app.wsgi_app
+
+        def counted(environ, start_response):
+            with self._lock:
+                self.requests += 1
+            return wsgi_app(environ, start_response)
+        app.wsgi_app = counted
+
+    def _send(self, message):
+        try:
+            self._status.write(message + '\n')
+        except (OSError, ValueError):
+            pass
+
+    def _check_limits(self):
+        if self._recycle_requested:
+            return
+        reason = None
+        if self.max_requests and self.requests >= self.max_requests:
+            reason = f'已处理{self.requests}个请求'
+        elif self.max_rss:
+            rss = psutil.Process().memory_info().rss
+            if rss >= self.max_rss:
+                reason = f'内存占用{rss // (1024 * 1024)}MB'
+        if reason:
+            self._recycle_requested = True
+            logger.info('%s，请求监督进程替换', reason)
+            self._send(f'{RECYCLE} {reason}')
+
+    def _handle_term(self, signum, frame):
+        self.draining = True
+
+    def serve(self):
+        from waitress.server import create_server
+
+        # Ctrl+C 会发给整个进程组，由监督进程统一安排退出
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, self._handle_term)
+
+        server = create_server(self.app, sockets=[self._socket], threads=self.threads)
+        self._send(READY)
+
+        # 排空依赖Waitress服务器对象的内部属性（_map、accepting、active_channels 及通道状态），
+        # 公开的 run()/close() 只能立即关闭全部连接，因此 requirements.txt 中固定了Waitress的次版本
+
+        next_check = time.monotonic() + self.check_interval
+        drain_deadline = None
+        handover = None
+        while True:
+            server.asyncore.loop(timeout=1, map=server._map, count=1)
+            now = time.monotonic()
+
+            if not self.draining and os.getppid() != self._parent:
+                logger.warning('监督进程已退出')
+                self.draining = True
+
+            if not self.draining:
+                if now >= next_check:
+                    next_check = now + self.check_interval
+                    self._check_limits()
+                continue
+
+            if drain_deadline is None:
+                drain_deadline = now + self.drain_timeout
+                # 停止接受新连接，之后的连接由新的工作进程接受；
+                # 全库后台任务在进行中的一次结束后交给新的工作进程，等待期间照常处理已有连接
+                server.accepting = False
+                handover = threading.Thread(target=task_lock.release, name='task-handover')
+                handover.start()
+                logger.info('停止接受新连接，等待%d个连接完成', len(server.active_channels))
+
+            # 空闲的长连接直接关闭，处理中的连接在响应发送完毕后关闭
+            for channel in list(server.active_channels.values()):
+                if not channel.requests and channel.request is None and not channel.total_outbufs_len:
+                    channel.will_close = True
+
+            if not server.active_channels or now >= drain_deadline:
+                break
+
+        server.task_dispatcher.shutdown()
+        if handover is not None and handover.is_alive():
+            logger.info('等待进行中的后台任务结束')
+            handover.join()
+        logger.info('工作进程退出，共处理%d个请求', self.requests)
@@ -0,0 +1,153 @@
+"""
+词条标签索引工具
+把 Prompt.translation 中逗号分隔的标签拆分、去空白、转小写后写入 prompt_tags 表，
+同时维护由标签集合计算的近似重复检测签名（prompt_signatures 表）
+"""
+import re
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from app.models import db, Prompt, PromptTag
+from app.utils.duplicates import add_signatures, remove_signatures, rebuild_signatures
+
+TAG_SEPARATOR = re.compile(r'[,，]')
+MAX_TAG_LENGTH = 200
+# 单条SQL中IN列表的最大长度，低于SQLite的绑定变量上限
+ID_CHUNK_SIZE = 500
+REBUILD_BATCH_SIZE = 1000
+
+
+def split_tags(translation):
+    """
+    拆分译文为标签列表
+
+    Args:
+        translation: 逗号分隔的标签文本
+
+    Returns:
+        去重后的标签列表（保持原顺序）
+    """
+    tags = []
+    seen = set()
+    for part in TAG_SEPARATOR.split(translation or ''):
+        tag = ' '.join(part.split()).lower()[:MAX_TAG_LENGTH]
+        if tag and tag not in seen:
+            seen.add(tag)
+            tags.append(tag)
+    return tags
+
+
+def _chunks(items, size=ID_CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def remove_prompt_tags(ids):
+    """在当前事务中删除指定词条的标签和签名"""
+    for chunk in _chunks(ids):
+        PromptTag.query.filter(PromptTag.prompt_id.in_(chunk)).delete(synchronize_session=False)
+    remove_signatures(ids)
+
+
+def sync_prompt_tags(prompts):
+    """
+    在当前事务中刷新给定词条的标签
+
+    Args:
+        prompts: 已flush（拥有id）的 Prompt 对象列表
+    """
+    prompts = [p for p in prompts if p.id is not None]
+    if not prompts:
+        return
+
+    remove_prompt_tags([p.id for p in prompts])
+    tags_by_id = {p.id: split_tags(p.translation) for p in prompts}
+    rows = [
+        {'prompt_id': prompt_id, 'tag': tag}
+        for prompt_id, tags in tags_by_id.items()
+        for tag in tags
+    ]
+    if rows:
+        db.session.execute(PromptTag.__table__.insert(), rows)
+    add_signatures(tags_by_id)
+
+
+def rebuild_prompt_tags():
+    """
+    在当前事务中根据 prompts 表重建全部标签（签名随后根据新标签重建）
+
+    Returns:
+        写入的标签行数
+    """
+    PromptTag.query.delete(synchronize_session=False)
+
+    total = 0
+    rows = []
+    for prompt_id, translation in db.session.query(Prompt.id, Prompt.translation).yield_per(REBUILD_BATCH_SIZE):
+        rows.extend({'prompt_id': prompt_id, 'tag': tag} for tag in split_tags(translation))
+        if len(rows) >= REBUILD_BATCH_SIZE:
+            db.session.execute(PromptTag.__table__.insert(), rows)
+            total += len(rows)
+            rows = []
+    if rows:
+        db.session.execute(PromptTag.__table__.insert(), rows)
+        total += len(rows)
+    rebuild_signatures()
+    return total
+
+
+def ensure_prompt_tags():
+    """启动时检查标签索引，词条存在但索引为空时重建"""
+    has_prompts = db.session.query(Prompt.id).first() is not None
+    has_tags = db.session.query(PromptTag.prompt_id).first() is not None
+    if has_prompts and not has_tags:
+        rebuild_prompt_tags()
+        db.session.commit()
+
+
+def tag_counts(limit=100, category=None):
+    """
+    统计标签出现次数（不计已软删除、尚未清理的词条）
+
+    Returns:
+        [(tag, count), ...] 按次数降序
+    """
+    count = func.count(PromptTag.prompt_id).label('count')
+    query = db.session.query(PromptTag.tag, count) \
+        .join(Prompt, Prompt.id == PromptTag.prompt_id) \
+        .filter(Prompt.deleted_at.is_(None))
+    if category:
+        query = query.filter(Prompt.category == category)
+    return query.group_by(PromptTag.tag).order_by(count.desc(), PromptTag.tag.asc()).limit(limit).all()
+
+
+def prompt_ids_with_tags(tags):
+    """
+    包含全部给定标签的词条id子查询
+
+    Args:
+        tags: 已规范化的标签列表
+    """
+    return db.session.query(PromptTag.prompt_id) \
+        .filter(PromptTag.tag.in_(tags)) \
+        .group_by(PromptTag.prompt_id) \
+        .having(func.count(PromptTag.tag) == len(tags))
+
+
+def related_prompt_ids(prompt_id, limit=20):
+    """
+    查找与指定词条共享标签的词条（不含已软删除、尚未清理的词条）
+
+    Returns:
+        [(prompt_id, shared_count), ...] 按共享标签数降序
+    """
+    source = aliased(PromptTag)
+    other = aliased(PromptTag)
+    shared = func.count(other.tag).label('shared')
+    return db.session.query(other.prompt_id, shared) \
+        .join(source, source.tag == other.tag) \
+        .join(Prompt, Prompt.id == other.prompt_id) \
+        .filter(source.prompt_id == prompt_id, other.prompt_id != prompt_id, Prompt.deleted_at.is_(None)) \
+        .group_by(other.prompt_id) \
+        .order_by(shared.desc(), other.prompt_id.desc()) \
+        .limit(limit).all()
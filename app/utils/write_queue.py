@@ -0,0 +1,251 @@
+"""
+单写线程组提交
+写接口把写操作放入有界队列并等待结果，由专门的写线程执行；同时到达的多个操作合并在一个事务中提交（组提交），
+避免多个线程争抢SQLite写锁，也把每个请求一次的fsync合并为每批一次
+"""
+import time
+import queue
+import logging
+import threading
+from itertools import groupby
+from collections import namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from app.models import db, Prompt
+from app.utils.background import background_enabled
+from app.utils.libraries import libraries
+from app.utils.response import error_response
+from app.utils.signals import notify_prompts_changed
+
+logger = logging.getLogger(__name__)
+
+# 写操作的返回值
+#   value: 返回给调用方的结果，需在提交前算好（提交后对象过期）
+#   upserted / deleted: 新增或更新的 Prompt 对象、被删除的词条id，提交后合并为一次变更通知
+WriteResult = namedtuple('WriteResult', ['value', 'upserted', 'deleted'], defaults=((), ()))
+
+# 提交后刷新对象时IN列表的最大长度，低于SQLite的绑定变量上限
+REFRESH_CHUNK_SIZE = 500
+
+
+class WriteQueueFull(Exception):
+    """写队列已满"""
+
+
+class _Operation:
+    __slots__ = ('func', 'args', 'kwargs', 'library', 'future')
+
+    def __init__(self, func, args, kwargs, library=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.library = library
+        self.future = Future()
+
+
+class WriteQueue:
+    """单写线程与有界写队列"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.max_batch = 64
+        self.max_delay = 0.002
+        self.retry_after = 1
+        self.batches = 0
+        self.operations = 0
+        self.largest_batch = 0
+        self.split_batches = 0
+        self.failed = 0
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # 写线程执行每批操作时持有；不能在写线程中执行的写入（替换数据库文件）持有它以暂停写线程
+        self._exclusive = threading.RLock()
+
+    def init_app(self, app):
+        """按配置创建队列并启动写线程"""
+        self.app = app
+        app.extensions['write_queue'] = self
+        self.enabled = app.config['WRITE_QUEUE_ENABLED']
+        self.max_batch = max(int(app.config['WRITE_QUEUE_MAX_BATCH']), 1)
+        self.max_delay = max(float(app.config['WRITE_QUEUE_MAX_DELAY_MS']), 0) / 1000
+        self._queue = queue.Queue(maxsize=max(int(app.config['WRITE_QUEUE_SIZE']), 1))
+
+        # 测试和脚本中不启动线程，写操作在调用线程中直接执行
+        if self.enabled and background_enabled(app):
+            self._thread = threading.Thread(target=self._run, name='writer', daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def submit(self, func, *args, **kwargs):
+        """
+        执行一个写操作并等待提交
+
+        Args:
+            func: 在当前会话中执行写入（不提交）的函数，返回 WriteResult 或普通结果
+
+        Returns:
+            func 返回的结果（WriteResult 时为其 value）
+
+        Raises:
+            WriteQueueFull: 队列已满
+            func 或提交时抛出的异常
+        """
+        return self._submit(_Operation(func, args, kwargs))
+
+    def submit_library(self, name, func, *args, **kwargs):
+        """
+        在词条库 name 中执行一个写操作并等待提交，其余同 submit
+
+        同一批中相邻的同一词条库的操作在该词条库的一个事务中提交
+
+        Raises:
+            LibraryNotFound: 词条库不存在（例如已被删除）
+        """
+        return self._submit(_Operation(func, args, kwargs, library=name))
+
+    def _submit(self, op):
+        # 写线程内（例如变更订阅者）再提交写操作时直接执行，避免自己等自己
+        if not self.running or threading.current_thread() is self._thread:
+            with self._exclusive, self._session(op.library):
+                self._execute([op])
+        else:
+            try:
+                self._queue.put_nowait(op)
+            except queue.Full:
+                raise WriteQueueFull('写入队列已满') from None
+        return op.future.result()
+
+    @staticmethod
+    def _session(library):
+        """词条库的操作在该词条库的会话中执行，主词条库使用当前会话"""
+        return libraries.session(library) if library is not None else nullcontext()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        在写线程之外独占写入，例如替换数据库文件、释放连接池
+
+        期间写线程不执行任何操作，新的写操作照常排队，结束后按顺序执行；
+        持有期间不能再调用 submit 等待写线程（会互相等待）
+        """
+        with self._exclusive:
+            yield
+
+    def busy_response(self):
+        """队列已满时的503响应"""
+        response, code = error_response('写入繁忙，请稍后重试', 503)
+        response.status_code = code
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # 不同词条库的操作不能在同一事务中提交，按相邻的同一词条库拆开执行
+            for library, ops in groupby(batch, key=lambda op: op.library):
+                ops = list(ops)
+                try:
+                    with self._exclusive, self.app.app_context(), self._session(library):
+                        self._execute(ops)
+                except Exception as e:
+                    logger.exception('写线程执行失败')
+                    for op in ops:
+                        if not op.future.done():
+                            op.future.set_exception(e)
+
+    def _apply(self, batch):
+        """在一个事务中执行一批操作并提交，返回各操作的 WriteResult"""
+        results = []
+        upserted_ids, deleted_ids = [], []
+        try:
+            for op in batch:
+                result = op.func(*op.args, **op.kwargs)
+                if not isinstance(result, WriteResult):
+                    result = WriteResult(result)
+                results.append(result)
+                upserted_ids.extend(p.id for p in result.upserted)
+                deleted_ids.extend(result.deleted)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            db.session.info.pop('category_cache', None)
+            raise
+        return results, upserted_ids, deleted_ids
+
+    def _execute(self, batch):
+        try:
+            results, upserted_ids, deleted_ids = self._apply(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                with self._lock:
+                    self.failed += 1
+                batch[0].future.set_exception(e)
+                return
+            # 批内某个操作失败时整批回滚，再逐个执行，失败只影响该操作本身
+            with self._lock:
+                self.split_batches += 1
+            for op in batch:
+                self._execute([op])
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.operations += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        self._notify(results, upserted_ids, deleted_ids, batch[0].library)
+        for op, result in zip(batch, results):
+            op.future.set_result(result.value)
+
+    def _notify(self, results, upserted_ids, deleted_ids, library=None):
+        if not upserted_ids and not deleted_ids:
+            return
+        deleted = set(deleted_ids)
+        prompts = [p for r in results for p in r.upserted]
+        # 同一批内先写入后删除的词条只通知删除
+        upserted = {pid: p for p, pid in zip(prompts, upserted_ids) if pid not in deleted}
+        # 提交后对象已过期，分块查询刷新，避免订阅者逐行加载
+        ids = list(upserted)
+        for i in range(0, len(ids), REFRESH_CHUNK_SIZE):
+            Prompt.query.filter(Prompt.id.in_(ids[i:i + REFRESH_CHUNK_SIZE])).all()
+        notify_prompts_changed(upserted=list(upserted.values()), deleted=deleted_ids, library=library)
+
+    def status(self):
+        """队列深度与组提交统计"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self.running,
+                'queue_depth': self._queue.qsize() if self._queue else 0,
+                'queue_size': self._queue.maxsize if self._queue else 0,
+                'max_batch': self.max_batch,
+                'max_delay_ms': self.max_delay * 1000,
+                'batches': self.batches,
+                'operations': self.operations,
+                'avg_batch_size': round(self.operations / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'split_batches': self.split_batches,
+                'failed_operations': self.failed
+            }
+
+
+write_queue = WriteQueue()
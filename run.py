@@ -1,13 +1,124 @@
 """
 NaiBotAssistant 应用启动脚本
-支持Flask开发模式和Waitress生产模式
+支持Flask开发模式和Waitress生产模式，以及只读副本（从节点）模式、监督模式和ASGI模式
 """
+import os
 import sys
+import logging
 import argparse
 from app import create_app
 from app.config import Config
 
 
+def _apply_database_args(args):
+    """根据命令行参数调整数据库路径（需在创建应用前调用）"""
+    if args.follow and not args.db:
+        # 从节点使用独立的本地数据库副本，避免与主节点共用同一文件
+        db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+        root, ext = os.path.splitext(db_path)
+        args.db = f'{root}_follower_{args.port}{ext}'
+    
+    if args.db:
+        Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(args.db)
+    
+    if args.follow:
+        # 备份由主节点负责
+        Config.AUTO_BACKUP = False
+
+
+def _init_follower(app, args):
+    """从节点模式下启动复制"""
+    if not args.follow:
+        return
+    from app.utils.replication import follower
+    follower.init_app(app, args.follow, write_mode=args.follow_writes)
+
+
+def _thread_count():
+    """工作线程数：不少于准入控制各类别并发与排队名额之和，保证排队的请求不会挤占其他类别"""
+    from app.utils.admission import admission
+    if not admission.enabled:
+        return Config.SERVER_THREADS
+    return max(Config.SERVER_THREADS, admission.thread_capacity())
+
+
+def _worker_args(args):
+    """监督模式下原样传给工作进程的参数"""
+    worker_args = []
+    if args.db:
+        worker_args += ['--db', args.db]
+    if args.follow:
+        worker_args += ['--follow', args.follow, '--follow-writes', args.follow_writes]
+    return worker_args
+
+
+def _run_supervisor(args):
+    """监督模式：监督进程持有监听套接字，负责启动、替换工作进程"""
+    from app.utils.supervisor import Supervisor, supported
+    if args.dev:
+        print("错误: 监督模式不能与开发模式同时使用")
+        sys.exit(1)
+    if not supported():
+        print("错误: 监督模式仅支持类Unix系统")
+        sys.exit(1)
+    
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format=Config.LOG_FORMAT)
+    print(f"""
+╔════════════════════════════════════════════════════════════╗
+║         NaiBotAssistant - 生产模式（监督）                 ║
+╚════════════════════════════════════════════════════════════╝
+  应用名称: {Config.APP_NAME}
+  版本号:   {Config.VERSION}
+  运行模式: 生产模式 (Waitress，监督进程 {os.getpid()}){_follow_banner(args)}
+  访问地址: http://{args.host}:{args.port}
+  API文档:  http://{args.host}:{args.port}/api/v1/health
+  
+  提示: 工作进程超过请求数或内存上限时自动替换；
+        kill -HUP {os.getpid()} 平滑重启并重新读取监听地址
+╔════════════════════════════════════════════════════════════╗
+        """)
+    Supervisor(args, _worker_args(args)).run()
+
+
+def _run_asgi(args):
+    """ASGI模式：事件循环处理连接，长轮询和慢速传输不占用工作线程"""
+    if args.dev or args.supervise:
+        print("错误: ASGI模式不能与开发模式或监督模式同时使用")
+        sys.exit(1)
+    try:
+        import uvicorn
+    except ImportError:
+        print("错误: ASGI模式需要uvicorn（可选依赖）。请运行: pip install -r requirements-asgi.txt")
+        sys.exit(1)
+    from app.asgi import AsgiApp
+    
+    app = create_app('production')
+    _init_follower(app, args)
+    threads = _thread_count()
+    
+    print(f"""
+╔════════════════════════════════════════════════════════════╗
+║         NaiBotAssistant - 生产模式（ASGI）                 ║
+╚════════════════════════════════════════════════════════════╝
+  应用名称: {Config.APP_NAME}
+  版本号:   {Config.VERSION}
+  运行模式: 生产模式 (Uvicorn，{threads}个工作线程){_follow_banner(args)}
+  访问地址: http://{args.host}:{args.port}
+  API文档:  http://{args.host}:{args.port}/api/v1/health
+  
+  提示: 变更订阅的长轮询在事件循环中等待，不占用工作线程
+╔════════════════════════════════════════════════════════════╗
+        """)
+    uvicorn.run(AsgiApp(app, threads), host=args.host, port=args.port, log_level=Config.LOG_LEVEL.lower())
+
+
+def _follow_banner(args):
+    if not args.follow:
+        return ''
+    return f"""
+  复制模式: 只读副本，主节点 {args.follow}，写请求{'转发' if args.follow_writes == 'forward' else '拒绝'}"""
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='NaiBotAssistant 应用启动脚本')
@@ -28,18 +139,59 @@ def main():
         help=f'服务器端口 (默认: {Config.SERVER_PORT})'
     )
     
+    parser.add_argument(
+        '--db',
+        default=None,
+        help='数据库文件路径 (默认使用 config.json 中的配置)'
+    )
+    parser.add_argument(
+        '--follow',
+        metavar='LEADER_URL',
+        default=None,
+        help='以只读副本模式运行，从主节点复制数据 (例如 http://127.0.0.1:15252)'
+    )
+    parser.add_argument(
+        '--follow-writes',
+        choices=['reject', 'forward'],
+        default='reject',
+        help='只读副本收到写请求时的处理方式 (默认: reject)'
+    )
+    parser.add_argument(
+        '--supervise',
+        action='store_true',
+        help='监督模式 (工作进程按请求数或内存上限自动替换，SIGHUP平滑重启，仅类Unix系统)'
+    )
+    parser.add_argument(
+        '--asgi',
+        action='store_true',
+        help='ASGI模式 (使用Uvicorn，长轮询和慢速上传下载不占用工作线程，需要安装uvicorn)'
+    )
+    # 监督模式内部使用：继承的监听套接字和状态管道
+    parser.add_argument('--worker-fd', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--status-fd', type=int, default=None, help=argparse.SUPPRESS)
+    
     args = parser.parse_args()
+    _apply_database_args(args)
+    
+    if args.asgi:
+        _run_asgi(args)
+        return
+    
+    if args.supervise:
+        _run_supervisor(args)
+        return
     
     # 创建应用
     if args.dev:
         app = create_app('development')
+        _init_follower(app, args)
         print(f"""
 ╔════════════════════════════════════════════════════════════╗
 ║         NaiBotAssistant - 开发模式                         ║
 ╚════════════════════════════════════════════════════════════╝
   应用名称: {Config.APP_NAME}
   版本号:   {Config.VERSION}
-  运行模式: 开发模式 (Flask)
+  运行模式: 开发模式 (Flask){_follow_banner(args)}
   访问地址: http://{args.host}:{args.port}
   API文档:  http://{args.host}:{args.port}/api/v1/health
   
@@ -56,20 +208,27 @@ def main():
             sys.exit(1)
         
         app = create_app('production')
+        _init_follower(app, args)
+        
+        if args.worker_fd is not None:
+            from app.utils.supervisor import WorkerServer
+            WorkerServer(app, args.worker_fd, args.status_fd, _thread_count()).serve()
+            return
+        
         print(f"""
 ╔════════════════════════════════════════════════════════════╗
 ║         NaiBotAssistant - 生产模式                         ║
 ╚════════════════════════════════════════════════════════════╝
   应用名称: {Config.APP_NAME}
   版本号:   {Config.VERSION}
-  运行模式: 生产模式 (Waitress)
+  运行模式: 生产模式 (Waitress){_follow_banner(args)}
   访问地址: http://{args.host}:{args.port}
   API文档:  http://{args.host}:{args.port}/api/v1/health
   
   提示: 生产模式使用Waitress WSGI服务器，性能更好
 ╔════════════════════════════════════════════════════════════╗
         """)
-        serve(app, host=args.host, port=args.port, threads=4)
+        serve(app, host=args.host, port=args.port, threads=_thread_count())
 
 
 if __name__ == '__main__':
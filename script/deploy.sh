@@ -81,7 +81,8 @@ After=network.target
 Type=simple
 User=root
 WorkingDirectory=${INSTALL_DIR}
-ExecStart=${PYTHON_CMD} ${INSTALL_DIR}/run.py --port ${port}
+ExecStart=${PYTHON_CMD} ${INSTALL_DIR}/run.py --port ${port} --supervise
+ExecReload=/bin/kill -HUP \$MAINPID
 Restart=always
 RestartSec=5
 
@@ -496,10 +496,10 @@ class NaiBotAssistant {
 
         try {
             const url = category 
-                ? `/api/v1/prompts?category=${encodeURIComponent(category)}&limit=200&sort=name_asc` 
-                : '/api/v1/prompts?limit=200&sort=name_asc';
+                ? `/api/v1/prompts?category=${encodeURIComponent(category)}&limit=200&sort=name_asc&format=columnar` 
+                : '/api/v1/prompts?limit=200&sort=name_asc&format=columnar';
             const result = await this.apiCall(url);
-            this.allCombinePrompts = result.data.prompts || [];
+            this.allCombinePrompts = decodeColumnar(result.data.prompts);
             
             this.renderCombinePrompts(this.allCombinePrompts);
         } catch (error) {
@@ -672,11 +672,11 @@ class NaiBotAssistant {
         try {
             // 从LAPI获取词条
             const url = category
-                ? `/api/v1/prompts?category=${encodeURIComponent(category)}&page=${this.currentPageNum}&limit=${this.pageSize}&sort=name_asc`
-                : `/api/v1/prompts?page=${this.currentPageNum}&limit=${this.pageSize}&sort=name_asc`;
+                ? `/api/v1/prompts?category=${encodeURIComponent(category)}&page=${this.currentPageNum}&limit=${this.pageSize}&sort=name_asc&format=columnar`
+                : `/api/v1/prompts?page=${this.currentPageNum}&limit=${this.pageSize}&sort=name_asc&format=columnar`;
 
             const result = await this.apiCall(url);
-            const prompts = result.data.prompts;
+            const prompts = decodeColumnar(result.data.prompts);
             const pagination = result.data.pagination;
 
             // 更新分页信息
@@ -1137,6 +1137,33 @@ class NaiBotAssistant {
     }
 }
 
+// 还原 format=columnar 的列式响应为对象数组（已是数组时原样返回）
+function decodeColumnar(table) {
+    if (!table || Array.isArray(table)) return table || [];
+
+    const columns = table.columns;
+    const dictionaries = table.dictionaries || {};
+    const timestamps = new Set(table.timestamps || []);
+    const decoders = columns.map(column => {
+        if (dictionaries[column]) {
+            const values = dictionaries[column];
+            return value => (value === null ? null : values[value]);
+        }
+        if (timestamps.has(column)) {
+            return value => (value === null ? null : new Date(value).toISOString());
+        }
+        return value => value;
+    });
+
+    return table.rows.map(row => {
+        const item = {};
+        for (let i = 0; i < columns.length; i++) {
+            item[columns[i]] = decoders[i](row[i]);
+        }
+        return item;
+    });
+}
+
 // 全局函数，供HTML调用
 function showPage(pageName) {
     if (window.naibotApp) {
@@ -0,0 +1,31 @@
+"""
+测试公共夹具：每个测试使用临时目录中的独立数据库，不启动后台线程
+"""
+import pytest
+from app import create_app
+from app.config import Config, config
+from app.models import db
+
+
+class TestingConfig(Config):
+    """测试环境配置"""
+    TESTING = True
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', 'sqlite:///' + str(tmp_path / 'test.db'))
+    for name in ('BACKUP_TEMP_DIR', 'BACKUP_SNAPSHOT_DIR', 'LIBRARY_DIR', 'EXPORT_CACHE_DIR'):
+        monkeypatch.setattr(Config, name, str(tmp_path / name.lower()))
+    monkeypatch.setitem(config, 'testing', TestingConfig)
+
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
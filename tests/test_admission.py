@@ -0,0 +1,38 @@
+"""
+准入控制测试
+"""
+import time
+import threading
+from app.utils.admission import admission, INTERACTIVE, LONGPOLL
+
+
+def test_long_polls_do_not_block_interactive_requests(app):
+    interactive = admission.classes[INTERACTIVE]
+    longpoll = admission.classes[LONGPOLL]
+    waiters = interactive.limit + interactive.queue + 2
+    results = []
+
+    def subscribe():
+        response = app.test_client().get('/api/v1/changes?since=0&timeout=10')
+        results.append(response.status_code)
+
+    threads = [threading.Thread(target=subscribe) for _ in range(waiters)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while longpoll.active < waiters and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert longpoll.active == waiters
+    assert interactive.active == 0
+
+    client = app.test_client()
+    for _ in range(interactive.limit + 1):
+        assert client.get('/api/v1/prompts').status_code == 200
+
+    # 新的变更唤醒全部长轮询
+    response = client.post('/api/v1/prompts', json={'category': '测试', 'name': 'p', 'translation': 't'})
+    assert response.status_code == 201
+    for thread in threads:
+        thread.join(timeout=5)
+    assert results == [200] * waiters
+    assert longpoll.active == 0
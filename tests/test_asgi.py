@@ -0,0 +1,67 @@
+"""
+ASGI入口测试（不依赖uvicorn，直接调用ASGI应用）
+"""
+import json
+import asyncio
+from app.asgi import AsgiApp
+from app.config import Config
+
+
+def _lines(records):
+    return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+
+
+def _scope(method, path, headers=()):
+    return {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'headers': [(b'content-type', b'application/x-ndjson'), *headers]
+    }
+
+
+def _run(asgi, scope, receive):
+    sent = []
+    first_ack = asyncio.Event()
+
+    async def send(message):
+        sent.append(message)
+        if message.get('body'):
+            first_ack.set()
+
+    async def main():
+        await asyncio.wait_for(asgi(scope, lambda: receive(first_ack), send), timeout=10)
+
+    asyncio.run(main())
+    return sent
+
+
+def test_stream_import_acks_before_body_ends(app, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAM_BATCH_SIZE', 2)
+    asgi = AsgiApp(app, threads=2)
+    first = _lines([{'category': '导入', 'name': f'a{i}', 'translation': 'x'} for i in range(2)])
+    rest = _lines([{'category': '导入', 'name': 'b', 'translation': 'y'}])
+    messages = iter([first, rest])
+
+    async def receive(first_ack):
+        chunk = next(messages)
+        if chunk is rest:
+            # 第一批的确认发出前不再发送请求体，整体读完再处理时会在这里超时
+            await first_ack.wait()
+            return {'type': 'http.request', 'body': chunk, 'more_body': False}
+        return {'type': 'http.request', 'body': chunk, 'more_body': True}
+
+    sent = _run(asgi, _scope('POST', '/api/v1/prompts/stream'), receive)
+    assert sent[0]['status'] == 200
+    acks = [json.loads(line) for m in sent if m.get('body') for line in m['body'].splitlines()]
+    assert acks[0]['batch'] == 1 and acks[0]['inserted'] == 2
+    assert acks[-1] == {'done': True, 'received': 3, 'inserted': 3, 'updated': 0, 'skipped': 0}
+
+
+def test_stream_import_declared_length_too_large(app, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAM_MAX_BODY_SIZE', 10)
+    asgi = AsgiApp(app, threads=2)
+
+    async def receive(first_ack):
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    sent = _run(asgi, _scope('POST', '/api/v1/prompts/stream', [(b'content-length', b'100')]), receive)
+    assert sent[0]['status'] == 413
@@ -0,0 +1,33 @@
+"""
+自动备份测试：备份历史经写队列记录
+"""
+from app.models import BackupHistory
+from app.utils.auto_backup import backup_scheduler
+from app.utils.write_queue import write_queue, WriteQueueFull
+
+
+def test_backup_history_goes_through_write_queue(app, client, monkeypatch):
+    client.post('/api/v1/prompts', json={'category': '角色', 'name': '少女', 'translation': '1girl'})
+    submitted = []
+    submit = write_queue.submit
+
+    def spy(func, *args, **kwargs):
+        submitted.append(func.__name__)
+        return submit(func, *args, **kwargs)
+
+    monkeypatch.setattr(write_queue, 'submit', spy)
+    with app.app_context():
+        result = backup_scheduler.run_backup()
+        assert result['error'] is None and result['prompt_count'] == 1
+        assert submitted == ['_record_history']
+        history = BackupHistory.query.filter_by(operation='auto_backup').one()
+        assert (history.filename, history.imported_count) == (result['snapshot_id'], 1)
+
+    # 写队列已满时快照照常完成，只是不记录历史
+    def full(func, *args, **kwargs):
+        raise WriteQueueFull()
+
+    monkeypatch.setattr(write_queue, 'submit', full)
+    with app.app_context():
+        assert backup_scheduler.run_backup()['error'] is None
+        assert BackupHistory.query.filter_by(operation='auto_backup').count() == 1
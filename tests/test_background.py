@@ -0,0 +1,48 @@
+"""
+全库后台任务进程锁测试
+"""
+import threading
+import pytest
+from app.utils import background
+from app.utils.background import TaskLock
+
+pytestmark = pytest.mark.skipif(background.fcntl is None, reason='需要文件锁')
+
+
+def _lock(path):
+    lock = TaskLock()
+    lock.path = str(path)
+    return lock
+
+
+def test_release_waits_for_running_task(tmp_path):
+    path = tmp_path / 'test.db.tasks.lock'
+    old, new = _lock(path), _lock(path)
+    started, finish = threading.Event(), threading.Event()
+
+    def task():
+        with old.hold() as allowed:
+            assert allowed
+            started.set()
+            finish.wait(5)
+
+    worker = threading.Thread(target=task)
+    worker.start()
+    started.wait(5)
+
+    handover = threading.Thread(target=old.release)
+    handover.start()
+    handover.join(0.2)
+    # 旧进程的任务还在执行：不再开始新任务，锁也不交出
+    assert handover.is_alive()
+    with old.hold() as allowed:
+        assert not allowed
+    with new.hold() as allowed:
+        assert not allowed
+
+    finish.set()
+    worker.join(5)
+    handover.join(5)
+    assert not handover.is_alive()
+    with new.hold() as allowed:
+        assert allowed
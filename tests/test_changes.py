@@ -0,0 +1,98 @@
+"""
+变更订阅接口测试
+"""
+from app.config import Config
+from app.models import db, ChangeLog
+from app.utils.changes import append_entries, latest_version, oldest_version
+
+
+def _create(client, name):
+    response = client.post('/api/v1/prompts', json={'category': '测试', 'name': name, 'translation': name})
+    assert response.status_code == 201
+
+
+def test_since_zero_without_pruning(client):
+    for i in range(3):
+        _create(client, f'p{i}')
+
+    data = client.get('/api/v1/changes?since=0').get_json()['data']
+    assert [c['operation'] for c in data['changes']] == ['insert'] * 3
+    assert data['reset_required'] is False
+
+
+def test_since_zero_after_pruning_requires_reset(app, client):
+    for i in range(5):
+        _create(client, f'p{i}')
+
+    # 模拟按保留数量清理：最早的两条记录已被删除
+    with app.app_context():
+        ChangeLog.query.filter(ChangeLog.version <= 2).delete()
+        db.session.commit()
+
+    data = client.get('/api/v1/changes?since=0').get_json()['data']
+    assert data['reset_required'] is True
+    assert data['latest_version'] == 5
+
+    # 从仍保留的版本继续同步不需要重置
+    data = client.get('/api/v1/changes?since=2').get_json()['data']
+    assert data['reset_required'] is False
+    assert [c['version'] for c in data['changes']] == [3, 4, 5]
+
+
+def test_soft_delete_records_change_at_mark_time(app, client):
+    for i in range(3):
+        _create(client, f'p{i}')
+    ids = [p['id'] for p in client.get('/api/v1/prompts').get_json()['data']['prompts']]
+
+    response = client.delete('/api/v1/prompts/batch', json={'ids': ids[:2], 'soft': True})
+    assert response.get_json()['data']['deleted_count'] == 2
+
+    data = client.get('/api/v1/changes?since=3').get_json()['data']
+    assert sorted(c['prompt_id'] for c in data['changes'] if c['operation'] == 'delete') == sorted(ids[:2])
+
+    # 清理时不再重复记录
+    with app.app_context():
+        assert app.extensions['purge_worker'].purge() == 2
+    assert client.get('/api/v1/changes?since=5').get_json()['data']['changes'] == []
+
+
+def test_category_rename_records_single_change(client):
+    for i in range(5):
+        _create(client, f'p{i}')
+    category_id = client.get('/api/v1/categories').get_json()['data'][0]['id']
+
+    response = client.put(f'/api/v1/categories/{category_id}', json={'name': '新分类'})
+    assert response.status_code == 200
+
+    changes = client.get('/api/v1/changes?since=5').get_json()['data']['changes']
+    assert len(changes) == 1
+    assert changes[0]['operation'] == 'category'
+    assert changes[0]['category_id'] == category_id
+    assert changes[0]['category'] == '新分类'
+    assert changes[0]['previous_category'] == '测试'
+
+
+def test_category_merge_records_single_change(client):
+    _create(client, 'a')
+    client.post('/api/v1/prompts', json={'category': '目标', 'name': 'b', 'translation': 'b'})
+    categories = {c['name']: c['id'] for c in client.get('/api/v1/categories').get_json()['data']}
+
+    response = client.put(f'/api/v1/categories/{categories["测试"]}', json={'name': '目标'})
+    assert response.get_json()['data']['merged_count'] == 1
+
+    changes = client.get('/api/v1/changes?since=2').get_json()['data']['changes']
+    assert [(c['operation'], c['category_id'], c['previous_category']) for c in changes] == \
+        [('category', categories['目标'], '测试')]
+
+
+def test_follower_append_prunes_old_entries(app, monkeypatch):
+    monkeypatch.setattr(Config, 'CHANGE_LOG_RETENTION', 500)
+    with app.app_context():
+        for start in range(1, 2401, 400):
+            append_entries([
+                {'version': v, 'operation': 'insert', 'prompt_id': v} for v in range(start, start + 400)
+            ])
+            db.session.commit()
+        # 追加到版本2000时跨过清理点，删除版本1500及之前的记录
+        assert oldest_version() == 1501
+        assert latest_version() == 2400
@@ -0,0 +1,84 @@
+"""
+近似重复检测测试：MinHash签名随写入维护，按标签集合的Jaccard相似度分组
+"""
+from app.config import Config
+from app.models import db, PromptSignature
+from app.utils.duplicates import NUM_BANDS
+
+BASE_TAGS = ['1girl', 'solo', 'long hair', 'smile', 'school uniform', 'outdoors', 'cherry blossoms', 'looking at viewer', 'blue sky']
+
+
+def _create(client, name, tags, category='角色', **extra):
+    return client.post('/api/v1/prompts', json={
+        'category': category, 'name': name, 'translation': ', '.join(tags), **extra
+    })
+
+
+def _duplicates(client, query=''):
+    response = client.get(f'/api/v1/prompts/duplicates{query}')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def _group_ids(data):
+    return [sorted(p['id'] for p in group['prompts']) for group in data['groups']]
+
+
+def test_near_duplicates_are_grouped(app, client):
+    original = _create(client, '原版', BASE_TAGS).get_json()['data']['id']
+    # 大小写、空格与顺序不同，规范化后标签集合相同
+    reordered = _create(client, '换序', [t.upper() + ' ' for t in reversed(BASE_TAGS)]).get_json()['data']['id']
+    # 多一个标签：Jaccard 9/10
+    extended = _create(client, '加标签', BASE_TAGS + ['hat'], category='场景').get_json()['data']['id']
+    _create(client, '无关', ['landscape', 'mountain', 'river', 'sunset', 'no humans'])
+
+    data = _duplicates(client)
+    assert _group_ids(data) == [sorted([original, reordered, extended])]
+    assert data['group_count'] == 1 and data['complete'] is True
+    similarities = {tuple(sorted(p['ids'])): p['similarity'] for p in data['groups'][0]['pairs']}
+    assert similarities[tuple(sorted([original, reordered]))] == 1.0
+
+    # 阈值高于 9/10 时只剩完全相同的一对
+    assert _group_ids(_duplicates(client, '?threshold=0.95')) == [sorted([original, reordered])]
+    # 按分类筛选时另一分类的词条不参与比较
+    assert _group_ids(_duplicates(client, '?category=场景')) == []
+    assert _group_ids(_duplicates(client, '?category=角色')) == [sorted([original, reordered])]
+
+    for threshold in ('0', '1.5', 'abc'):
+        assert client.get(f'/api/v1/prompts/duplicates?threshold={threshold}').status_code == 400
+
+
+def test_signatures_follow_updates_and_deletes(app, client):
+    first = _create(client, '一', BASE_TAGS).get_json()['data']['id']
+    second = _create(client, '二', BASE_TAGS).get_json()['data']['id']
+    with app.app_context():
+        assert db.session.query(PromptSignature).filter_by(prompt_id=first).count() == NUM_BANDS
+    assert _group_ids(_duplicates(client)) == [[first, second]]
+
+    # 修改标签后不再相似
+    response = client.put(f'/api/v1/prompts/{second}', json={
+        'category': '角色', 'name': '二', 'translation': 'landscape, mountain, river'
+    })
+    assert response.status_code == 200
+    assert _group_ids(_duplicates(client)) == []
+
+    # 改回后重新成组，删除后签名随之删除
+    client.put(f'/api/v1/prompts/{second}', json={'category': '角色', 'name': '二', 'translation': ', '.join(BASE_TAGS)})
+    assert _group_ids(_duplicates(client)) == [[first, second]]
+    assert client.delete(f'/api/v1/prompts/{second}').status_code == 200
+    with app.app_context():
+        assert db.session.query(PromptSignature).filter_by(prompt_id=second).count() == 0
+    assert _group_ids(_duplicates(client)) == []
+
+
+def test_create_rejects_duplicates_when_enabled(app, client, monkeypatch):
+    monkeypatch.setattr(Config, 'DUPLICATE_CHECK_ON_CREATE', True)
+    existing = _create(client, '原版', BASE_TAGS).get_json()['data']['id']
+
+    response = _create(client, '副本', list(reversed(BASE_TAGS)))
+    assert response.status_code == 409
+    assert [(p['id'], p['similarity']) for p in response.get_json()['errors']] == [(existing, 1.0)]
+
+    # 相似度低于创建阈值（0.9）的不拦截
+    assert _create(client, '部分相同', BASE_TAGS[:6] + ['hat', 'dress']).status_code == 201
+    assert _create(client, '副本', BASE_TAGS, allow_duplicate=True).status_code == 201
@@ -0,0 +1,27 @@
+"""
+词条片段缓存测试
+"""
+import json
+from datetime import timedelta
+from app.models import db, Prompt
+from app.utils.fragment_cache import fragment_cache
+
+
+def test_row_updated_between_queries_is_kept(app, client):
+    client.post('/api/v1/prompts', json={'category': '测试', 'name': 'a', 'translation': 'old'})
+
+    with app.app_context():
+        prompt = Prompt.query.one()
+        stale_row = (prompt.id, prompt.updated_at)
+        # 模拟读取页内 (id, updated_at) 之后、加载行之前词条被更新
+        prompt.translation = 'new'
+        prompt.updated_at = prompt.updated_at + timedelta(seconds=1)
+        db.session.commit()
+
+        fragments = fragment_cache.fragments([stale_row])
+        assert [json.loads(f)['translation'] for f in fragments] == ['new']
+
+        # 缓存的是实际读到的版本
+        hits = fragment_cache.hits
+        assert fragment_cache.fragments([(prompt.id, prompt.updated_at)]) == fragments
+        assert fragment_cache.hits == hits + 1
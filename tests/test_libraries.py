@@ -0,0 +1,38 @@
+"""
+词条库写接口测试
+"""
+from app.models import db, Prompt, PromptTag, PromptSignature, ChangeLog
+from app.utils.libraries import libraries
+from app.utils.suggest import suggest_index
+
+
+def test_library_writes_maintain_derived_data(app, client):
+    assert client.post('/api/v1/libraries', json={'name': 'extra'}).status_code == 201
+
+    response = client.post('/api/v1/libraries/extra/prompts', json={
+        'category': '角色', 'name': '校服少女', 'translation': '1girl, school uniform'
+    })
+    assert response.status_code == 201
+    prompt_id = response.get_json()['data']['id']
+
+    response = client.put(f'/api/v1/libraries/extra/prompts/{prompt_id}', json={
+        'category': '角色', 'name': '校服少女', 'translation': '1girl, school uniform, smile'
+    })
+    assert response.get_json()['data']['translation'] == '1girl, school uniform, smile'
+
+    with app.app_context(), libraries.session('extra'):
+        tags = {t for (t,) in db.session.query(PromptTag.tag).filter_by(prompt_id=prompt_id)}
+        assert tags == {'1girl', 'school uniform', 'smile'}
+        assert db.session.query(PromptSignature).filter_by(prompt_id=prompt_id).count() > 0
+        assert [c.operation for c in ChangeLog.query.order_by(ChangeLog.version)] == ['insert', 'update']
+
+    # 主词条库的内存索引不受词条库写入影响
+    assert suggest_index.suggest('校服') == []
+    with app.app_context():
+        assert db.session.get(Prompt, prompt_id) is None
+
+    assert client.delete(f'/api/v1/libraries/extra/prompts/{prompt_id}').status_code == 200
+    assert client.delete(f'/api/v1/libraries/extra/prompts/{prompt_id}').status_code == 404
+    with app.app_context(), libraries.session('extra'):
+        assert db.session.query(PromptTag).filter_by(prompt_id=prompt_id).count() == 0
+        assert ChangeLog.query.order_by(ChangeLog.version.desc()).first().operation == 'delete'
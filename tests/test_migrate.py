@@ -0,0 +1,95 @@
+"""
+启动迁移测试：旧版数据库（prompts.category 字符串列）迁移到分类表
+"""
+import sqlite3
+from sqlalchemy import create_engine, inspect, text
+from app.utils.migrate import prepare_database, CATEGORY_BATCH_SIZE
+
+# 初始版本的表结构
+BASELINE_SCHEMA = '''
+CREATE TABLE prompts (
+    id INTEGER NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    translation TEXT NOT NULL,
+    comment TEXT,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_prompts_category ON prompts (category);
+CREATE INDEX ix_prompts_name ON prompts (name);
+CREATE TABLE backup_history (
+    id INTEGER NOT NULL,
+    operation VARCHAR(50) NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    imported_count INTEGER,
+    timestamp DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+'''
+
+# 大小写不同、前后空格不同的分类名都是不同的分类，与旧版按字符串筛选的行为一致
+CATEGORY_NAMES = ['角色', '场景', 'Style', 'style', ' 角色', '角色']
+
+
+def _baseline_database(path, count):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    rows = [
+        (i, CATEGORY_NAMES[i % len(CATEGORY_NAMES)], f'n{i}', f'tag{i}, common', '',
+         f'2025-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}', '2025-01-02 00:00:00')
+        for i in range(1, count + 1)
+    ]
+    conn.executemany(
+        'INSERT INTO prompts (id, category, name, translation, comment, created_at, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+    )
+    conn.commit()
+    conn.close()
+    return {pid: category for pid, category, *_ in rows}
+
+
+def _snapshot(engine):
+    with engine.connect() as conn:
+        categories = dict(conn.execute(text('SELECT name, id FROM categories')).all())
+        prompts = dict(conn.execute(text('SELECT id, category_id FROM prompts')).all())
+    return categories, prompts
+
+
+def test_migrate_baseline_categories(app, tmp_path):
+    path = tmp_path / 'baseline.db'
+    # 多于一批，覆盖分批回填
+    original = _baseline_database(str(path), CATEGORY_BATCH_SIZE * 2 + 7)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        with app.app_context():
+            applied = prepare_database(engine)
+        assert 'prompts.category -> categories' in applied
+
+        categories, prompts = _snapshot(engine)
+        assert set(categories) == set(CATEGORY_NAMES)
+        assert len(categories) == 5
+
+        names_by_id = {category_id: name for name, category_id in categories.items()}
+        assert len(prompts) == len(original)
+        assert all(names_by_id[prompts[pid]] == name for pid, name in original.items())
+
+        columns = {c['name'] for c in inspect(engine).get_columns('prompts')}
+        assert 'category' not in columns
+        assert {'category_id', 'deleted_at'} <= columns
+        indexes = {i['name'] for i in inspect(engine).get_indexes('prompts')}
+        assert 'ix_prompts_category' not in indexes
+        assert 'ix_prompts_category_id' in indexes
+
+        # 分类的创建时间取该分类最早的词条
+        with engine.connect() as conn:
+            created = conn.execute(text("SELECT created_at FROM categories WHERE name = '场景'")).scalar()
+        assert str(created).startswith('2025-01-01 00:00:01')
+
+        # 再次启动不做任何迁移，数据不变
+        with app.app_context():
+            assert prepare_database(engine) == []
+        assert _snapshot(engine) == (categories, prompts)
+    finally:
+        engine.dispose()
@@ -0,0 +1,71 @@
+"""
+NDJSON流式导入测试
+"""
+import io
+import json
+import sqlite3
+from sqlalchemy import event
+from app.config import Config
+from app.models import db
+from app.utils import ndjson
+
+
+def _ndjson(records):
+    return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+
+
+def _import(client, records):
+    response = client.post('/api/v1/prompts/stream', data=_ndjson(records), content_type='application/x-ndjson')
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_larger_than_sqlite_variable_limit(app, client, monkeypatch):
+    # 按旧版SQLite默认的绑定变量上限（999）限制连接，一批的名称数超过该上限
+    with app.app_context():
+        event.listen(
+            db.engine, 'connect',
+            lambda conn, record: conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        )
+        db.engine.dispose()
+    monkeypatch.setattr(Config, 'STREAM_BATCH_SIZE', 3000)
+    records = [{'category': '导入', 'name': f'n{i}', 'translation': f't{i}'} for i in range(2000)]
+
+    acks = _import(client, records)
+    assert acks[-1] == {'done': True, 'received': 2000, 'inserted': 2000, 'updated': 0, 'skipped': 0}
+
+    acks = _import(client, records[:10] + [{'category': '导入', 'name': 'new', 'translation': 'x'}])
+    assert acks[-1]['inserted'] == 1
+    assert acks[-1]['updated'] == 10
+
+
+def test_import_records_changes(client):
+    acks = _import(client, [{'category': '导入', 'name': 'a', 'translation': 'x'}, {'id': 'bad'}])
+    assert acks[0]['inserted'] == 1
+    assert len(acks[0]['errors']) == 1
+
+    changes = client.get('/api/v1/changes?since=0').get_json()['data']['changes']
+    assert [c['operation'] for c in changes] == ['insert']
+
+
+def test_iter_lines_across_chunks(monkeypatch):
+    monkeypatch.setattr(ndjson, 'READ_CHUNK_SIZE', 4)
+    monkeypatch.setattr(Config, 'STREAM_MAX_LINE_SIZE', 10)
+    body = b'ab\n0123456789\n\nlong line over limit\nx\n01234567890'
+    assert list(ndjson.iter_lines(io.BytesIO(body))) == [b'ab', b'0123456789', b'', None, b'x', None]
+    assert list(ndjson.iter_lines(io.BytesIO(b'tail'))) == [b'tail']
+
+    monkeypatch.setattr(Config, 'STREAM_MAX_LINE_SIZE', 0)
+    assert list(ndjson.iter_lines(io.BytesIO(body))) == body.split(b'\n')
+
+
+def test_import_skips_lines_over_limit(client, monkeypatch):
+    monkeypatch.setattr(Config, 'STREAM_MAX_LINE_SIZE', 200)
+    records = [
+        {'category': '导入', 'name': 'a', 'translation': 'x'},
+        {'category': '导入', 'name': 'b', 'translation': 'x' * 300},
+        {'category': '导入', 'name': 'c', 'translation': 'y'}
+    ]
+    acks = _import(client, records)
+    assert acks[0]['inserted'] == 2
+    assert acks[0]['errors'] == [{'line': 2, 'error': '行超过200字节'}]
+    assert acks[-1]['skipped'] == 1
@@ -0,0 +1,67 @@
+"""
+软删除测试：标记后对各查询不可见，后台清理后连同派生数据一起删除
+"""
+import json
+from app.models import db, Prompt, PromptTag, PromptSignature
+
+
+def _create(client, name, translation, category='角色'):
+    response = client.post('/api/v1/prompts', json={'category': category, 'name': name, 'translation': translation})
+    assert response.status_code == 201
+    return response.get_json()['data']['id']
+
+
+def _data(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_soft_deleted_prompts_are_hidden_then_purged(app, client):
+    kept = _create(client, '保留', 'keep tag, shared tag')
+    hidden = _create(client, '隐藏少女', 'hidden tag, shared tag', category='场景')
+
+    response = client.delete('/api/v1/prompts/batch', json={'ids': [hidden], 'soft': True})
+    assert response.get_json()['data'] == {'deleted_count': 1, 'soft': True}
+
+    # 各查询通过 do_orm_execute 钩子排除已标记的词条
+    assert [p['id'] for p in _data(client, '/api/v1/prompts')['prompts']] == [kept]
+    assert client.get(f'/api/v1/prompts/{hidden}').status_code == 404
+    assert _data(client, '/api/v1/prompts/search?keyword=隐藏')['prompts'] == []
+    assert [c['name'] for c in _data(client, '/api/v1/categories')] == ['角色']
+    tags = {t['tag']: t['count'] for t in _data(client, '/api/v1/tags')}
+    assert 'hidden tag' not in tags and tags['shared tag'] == 1
+    assert [p['id'] for p in _data(client, '/api/v1/tags/prompts?tag=shared tag')['prompts']] == [kept]
+    assert _data(client, '/api/v1/prompts/suggest?prefix=隐藏') == []
+    exported = [json.loads(line) for line in client.get('/api/v1/prompts/stream').get_data(as_text=True).splitlines()]
+    assert [p['id'] for p in exported] == [kept]
+
+    # 再次标记不重复计数
+    response = client.delete('/api/v1/prompts/batch', json={'ids': [hidden], 'soft': True})
+    assert response.get_json()['data']['deleted_count'] == 0
+
+    with app.app_context():
+        assert db.session.get(Prompt, hidden) is None
+        row = Prompt.query.filter_by(id=hidden).execution_options(include_deleted=True).one()
+        assert row.deleted_at is not None
+        assert app.extensions['purge_worker'].pending_count() == 1
+
+        assert app.extensions['purge_worker'].purge() == 1
+        assert Prompt.query.filter_by(id=hidden).execution_options(include_deleted=True).first() is None
+        assert PromptTag.query.filter_by(prompt_id=hidden).count() == 0
+        assert PromptSignature.query.filter_by(prompt_id=hidden).count() == 0
+        assert PromptTag.query.filter_by(prompt_id=kept).count() == 2
+        assert app.extensions['purge_worker'].pending_count() == 0
+
+
+def test_soft_delete_by_filter(app, client):
+    for i in range(3):
+        _create(client, f'旧{i}', f'tag{i}', category='旧分类')
+    kept = _create(client, '新', 'tag')
+
+    response = client.delete('/api/v1/prompts/by-filter', json={'category': '旧分类', 'soft': True})
+    assert response.get_json()['data']['deleted_count'] == 3
+    assert [p['id'] for p in _data(client, '/api/v1/prompts')['prompts']] == [kept]
+
+    with app.app_context():
+        assert app.extensions['purge_worker'].purge() == 3